@@ -0,0 +1,162 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmarks JSON decoding of large lists in the Kubernetes client.
+
+Starts a local stand-in for the Kubernetes API server that returns a single
+large page of pods, and iterates over it with the standard library codec,
+with the fastest installed codec, and with incremental decoding, reporting
+the time per list and the peak memory allocated while iterating.
+
+    python benchmarks/codec.py --pods 5000 --runs 5
+"""
+
+import argparse
+import json
+import threading
+import time
+import tracemalloc
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+from noel import codec
+from noel.kubernetes import Kubernetes
+
+
+def make_pod(n):
+    name = 'app-{}-{:05d}'.format(n % 50, n)
+    return {
+        'metadata': {
+            'name': name,
+            'namespace': 'noelapp',
+            'uid': '6f1d2c9e-{:04x}-11e6-8b6f-42010af00002'.format(n % 65536),
+            'resourceVersion': str(100000 + n),
+            'creationTimestamp': '2016-05-01T12:00:00Z',
+            'labels': {
+                'noel-app': 'app-{}'.format(n % 50),
+                'build-version': '{:08x}'.format(n)},
+            'annotations': {'kubernetes.io/created-by': 'x' * 200},
+        },
+        'spec': {
+            'containers': [{
+                'name': 'app',
+                'image': 'gcr.io/project/app-{}:{:08x}'.format(n % 50, n),
+                'ports': [{'containerPort': 8080, 'protocol': 'TCP'}],
+                'env': [
+                    {'name': 'VAR_{}'.format(i), 'value': str(i * 1.5)}
+                    for i in range(10)],
+                'resources': {'requests': {'cpu': '100m'}},
+            }],
+            'nodeName': 'node-{}'.format(n % 20),
+        },
+        'status': {
+            'phase': 'Running',
+            'podIP': '10.0.{}.{}'.format(n // 256 % 256, n % 256),
+            'conditions': [
+                {'type': 'Ready', 'status': 'True'}],
+        },
+    }
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = self.server.body
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, body):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StandInHandler)
+        self.body = body
+
+
+def run(name, k8s, runs):
+    count = 0
+    start = time.time()
+
+    for _ in range(runs):
+        for _ in k8s.iter_pods():
+            count += 1
+
+    elapsed = time.time() - start
+
+    tracemalloc.start()
+    for _ in k8s.iter_pods():
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print('{:<22} items: {:>7}  per list: {:>8.1f}ms  peak: {:>7.1f}MiB'.format(
+        name, count // runs, elapsed / runs * 1000, peak / 1024.0 / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pods', type=int, default=5000)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    body = json.dumps({
+        'kind': 'PodList',
+        'metadata': {'resourceVersion': '1'},
+        'items': [make_pod(n) for n in range(args.pods)]
+    }).encode('utf-8')
+
+    server = StandInServer(body)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    api_root = 'http://127.0.0.1:{}'.format(server.server_address[1])
+    fast = codec.get_codec()
+
+    print('List size: {:.1f}MiB, fastest codec: {}, ijson: {}'.format(
+        len(body) / 1024.0 / 1024, fast.name,
+        codec.ijson.backend if codec.ijson else 'not installed'))
+
+    configs = [
+        ('json', codec.get_codec('json'), False),
+        (fast.name, fast, False),
+        ('incremental', fast, True),
+    ]
+
+    for name, list_codec, incremental in configs:
+        k8s = Kubernetes(
+            api_root, namespace='noelapp', metrics=None, codec=list_codec,
+            incremental_lists=incremental)
+        run(name, k8s, args.runs)
+        k8s.close()
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmarks connection reuse in the Kubernetes client.
+
+Starts a local stand-in for the Kubernetes API server and makes the same
+number of calls with one-off requests (how the client used to work) and with
+a pooled Kubernetes client, reporting the number of TCP connections the
+server accepted and the per-call latency for each.
+
+    python benchmarks/kubernetes_pool.py --calls 500
+"""
+
+import argparse
+import json
+import threading
+import time
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+import requests
+
+from noel.kubernetes import Kubernetes
+
+
+POD_LIST = json.dumps({
+    'kind': 'PodList',
+    'items': [
+        {'metadata': {'name': 'app-{}'.format(n)}} for n in range(10)]
+}).encode('utf-8')
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(POD_LIST)))
+        self.end_headers()
+        self.wfile.write(POD_LIST)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StandInHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+
+
+def run(name, server, call, calls):
+    server.connections = 0
+    start = time.time()
+
+    for _ in range(calls):
+        call()
+
+    elapsed = time.time() - start
+
+    print('{:<10} connections: {:>5}  reused: {:>5}  per call: {:.3f}ms'.format(
+        name,
+        server.connections,
+        calls - server.connections,
+        elapsed / calls * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=500)
+    args = parser.parse_args()
+
+    server = StandInServer()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    api_root = 'http://127.0.0.1:{}'.format(server.server_address[1])
+    k8s = Kubernetes(api_root, namespace='noelapp')
+
+    run('one-off', server,
+        lambda: requests.get(k8s._url('pods')).json(), args.calls)
+    run('pooled', server, k8s.pods, args.calls)
+
+    k8s.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
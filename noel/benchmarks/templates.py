@@ -0,0 +1,198 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmarks building the objects for one deploy.
+
+Compares noel.deployer.templates with the Jinja templates rendered to YAML
+and parsed again that it replaced, for an app with a config of the given
+number of keys. Reports the time to build the service, replication
+controller and config secret of one deploy. The legacy path needs jinja2
+and pyyaml.
+
+    python benchmarks/templates.py --keys 200 --runs 2000
+"""
+
+import argparse
+import time
+
+from jinja2 import Template
+import yaml
+
+from noel.deployer import templates
+
+try:
+    LOADER = yaml.CSafeLoader
+except AttributeError:
+    LOADER = None
+
+LEGACY_SERVICE_TMPL = Template('''\
+apiVersion: v1
+kind: Service
+metadata:
+  name: "{{name}}"
+  labels:
+    noel-app: "{{name}}"
+spec:
+  ports:
+  - port: 80
+    targetPort: 8080
+  selector:
+    noel-app: "{{name}}"
+''')
+
+LEGACY_RC_TMPL = Template('''\
+apiVersion: v1
+kind: ReplicationController
+metadata:
+  name: "{{name}}-{{build_version}}"
+spec:
+  replicas: {{replicas}}
+  template:
+    metadata:
+      labels:
+        noel-app: "{{name}}"
+        build-version: "{{build_version}}"
+    spec:
+      {% if settings.termination_grace_period is number %}
+      terminationGracePeriodSeconds: {{settings.termination_grace_period}}
+      {% endif %}
+      containers:
+      - name: noel-app
+        image: "{{image}}"
+        ports:
+        - containerPort: 8080
+        env:
+        - name: PORT
+          value: "8080"
+        {% if settings.readiness_path %}
+        readinessProbe:
+          httpGet:
+            path: "{{settings.readiness_path}}"
+            port: 8080
+          periodSeconds: 5
+        {% endif %}
+        {% if settings.liveness_path %}
+        livenessProbe:
+          httpGet:
+            path: "{{settings.liveness_path}}"
+            port: 8080
+          initialDelaySeconds: {{settings.liveness_delay}}
+        {% endif %}
+        {% if settings.warmup_path or settings.drain_seconds %}
+        lifecycle:
+          {% if settings.warmup_path %}
+          postStart:
+            httpGet:
+              path: "{{settings.warmup_path}}"
+              port: 8080
+          {% endif %}
+          {% if settings.drain_seconds %}
+          preStop:
+            exec:
+              command: ["sleep", "{{settings.drain_seconds}}"]
+          {% endif %}
+        {% endif %}
+        volumeMounts:
+        {% if config %}
+        - name: noelapp-config
+          mountPath: /var/noel/config
+          readOnly: true
+        {% endif %}
+      volumes:
+      {% if config %}
+      - name: noelapp-config
+        secret:
+          secretName: {{config.metadata.name}}
+      {% endif %}
+''')
+
+LEGACY_SECRET_TMPL = Template('''\
+apiVersion: v1
+kind: Secret
+metadata:
+  name: "{{name}}"
+  labels:
+    noel-app: "{{name}}"
+type: Opaque
+data:
+{% for k, v in data.items() %}
+  {{k}}: "{{v}}"
+{% endfor %}
+''')
+
+SETTINGS = {
+    'readiness_path': '/healthz',
+    'liveness_path': '/healthz',
+    'liveness_delay': 30,
+    'warmup_path': None,
+    'termination_grace_period': 30,
+    'drain_seconds': 5,
+}
+
+
+def legacy(config, loader):
+    load = (
+        (lambda text: yaml.load(text, Loader=loader)) if loader
+        else yaml.safe_load)
+
+    return [
+        load(LEGACY_SERVICE_TMPL.render(name='app')),
+        load(LEGACY_RC_TMPL.render(
+            name='app', build_version='v1-100', image='gcr.io/p/app:v1',
+            config=config, replicas=3, settings=SETTINGS)),
+        load(LEGACY_SECRET_TMPL.render(name='app', data=config['data'])),
+    ]
+
+
+def native(config):
+    return [
+        templates.app_service(name='app'),
+        templates.app_replicationcontroller(
+            name='app', build_version='v1-100', image='gcr.io/p/app:v1',
+            config=config, replicas=3, settings=SETTINGS),
+        templates.app_secret('app', config['data']),
+    ]
+
+
+def run(name, func, runs):
+    start = time.time()
+    for _ in range(runs):
+        func()
+    elapsed = time.time() - start
+
+    print('{:<28} per deploy: {:>9.1f}us'.format(
+        name, elapsed / runs * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--keys', type=int, default=200)
+    parser.add_argument('--runs', type=int, default=2000)
+    args = parser.parse_args()
+
+    config = {
+        'metadata': {'name': 'app', 'resourceVersion': '100'},
+        'data': {
+            'key-{}'.format(n): 'value-{}-'.format(n) * 4
+            for n in range(args.keys)},
+    }
+
+    run('jinja + yaml.safe_load', lambda: legacy(config, None), args.runs)
+    if LOADER:
+        run('jinja + CSafeLoader', lambda: legacy(config, LOADER), args.runs)
+    run('builders', lambda: native(config), args.runs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,458 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""An asyncio version of the barebones Kubernetes HTTP API client.
+
+AsyncKubernetes has the methods of noel.kubernetes.Kubernetes that the
+asyncio deployer (noel.deployer.aiodeployer) uses, including apply() and
+apply_many(), with the same retries and rate limiting, but every call is a
+coroutine and watches and log streams are async iterators. Watches resume
+like noel.watch.Watch, see noel.aiowatch. It doesn't have informers, the
+read cache or metrics. It needs Python 3.6+ and aiohttp, which is installed
+by ``pip install noel[async]``.
+"""
+
+import asyncio
+import time
+
+import aiohttp
+
+from noel import codec
+from noel.aiowatch import AsyncWatch
+from noel.kubernetes import (
+    ApplyResult, BaseKubernetes, DEFAULT_APPLY_CONCURRENCY,
+    DEFAULT_MAX_RETRIES, DEFAULT_PAGE_SIZE, DEFAULT_POOL_MAXSIZE,
+    DEFAULT_TIMEOUT, IDEMPOTENT_METHODS, KIND_COLLECTIONS, KubernetesError,
+    make_error, MAX_RETRY_DELAY_SECONDS, RETRY_BACKOFF_SECONDS,
+    RETRY_STATUSES)
+from noel.logger import logger
+from noel.ratelimit import backoff_delay, parse_retry_after
+
+
+def _as_params(params):
+    """aiohttp rejects None and bool query values, requests drops the former
+    and stringifies the latter."""
+    if not params:
+        return params
+
+    return {
+        k: str(v).lower() if isinstance(v, bool) else str(v)
+        for k, v in params.items()
+        if v is not None
+    }
+
+
+async def _raise_for_status(r):
+    if r.status >= 400:
+        raise make_error(r.status, str(r.url), await r.read(), r.reason)
+
+
+class AsyncKubernetes(BaseKubernetes):
+    """asyncio Kubernetes HTTP API client.
+
+    The client owns an aiohttp session; call ``await k8s.close()`` or use it
+    as an async context manager to release its connections. Bodies are
+    encoded with ``codec``, and requests are rate limited by
+    ``rate_limiter`` and retried up to ``max_retries`` times, as with
+    Kubernetes. A RateLimiter can be shared with Kubernetes clients.
+    """
+
+    def __init__(
+            self,
+            api_root,
+            namespace='default',
+            timeout=DEFAULT_TIMEOUT,
+            pool_maxsize=DEFAULT_POOL_MAXSIZE,
+            rate_limiter=None,
+            max_retries=DEFAULT_MAX_RETRIES,
+            codec=codec.DEFAULT_CODEC):
+        super(AsyncKubernetes, self).__init__(api_root, namespace)
+        if isinstance(timeout, tuple):
+            self._timeout = aiohttp.ClientTimeout(
+                sock_connect=timeout[0], sock_read=timeout[1])
+        else:
+            self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._pool_maxsize = pool_maxsize
+        self._rate_limiter = rate_limiter
+        self._max_retries = max_retries
+        self._codec = codec
+        self._session = None
+
+    def _get_session(self):
+        # The session has to be created inside the running event loop.
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._pool_maxsize),
+                headers={'Accept': 'application/json'},
+                timeout=self._timeout)
+        return self._session
+
+    async def close(self):
+        """Closes all pooled connections held by this client."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _throttle(self):
+        if self._rate_limiter:
+            await asyncio.sleep(self._rate_limiter.reserve())
+
+    async def _send(self, method, resource, params=None, data=None,
+                    headers=None):
+        """Sends a request and returns the response body. Requests are
+        retried like Kubernetes._request retries them."""
+        url = self._url(resource)
+        idempotent = method in IDEMPOTENT_METHODS
+        attempt = 0
+
+        while True:
+            await self._throttle()
+            can_retry = attempt < self._max_retries
+
+            try:
+                async with self._get_session().request(
+                        method, url, params=_as_params(params), data=data,
+                        headers=headers) as r:
+                    retryable = r.status in RETRY_STATUSES and (
+                        idempotent or r.status == 429)
+
+                    if not (can_retry and retryable):
+                        await _raise_for_status(r)
+                        return await r.read()
+
+                    delay = parse_retry_after(r.headers.get('Retry-After'))
+                    reason = r.status
+
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if not (can_retry and idempotent):
+                    raise
+                delay = None
+                reason = str(e) or type(e).__name__
+
+            if delay is None:
+                delay = backoff_delay(
+                    attempt, RETRY_BACKOFF_SECONDS, MAX_RETRY_DELAY_SECONDS)
+            delay = min(delay, MAX_RETRY_DELAY_SECONDS)
+
+            logger.debug('{} {} failed ({}), retrying in {:.1f}s.'.format(
+                method, url, reason, delay))
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _request(self, method, resource, params=None, data=None,
+                       headers=None):
+        if data is not None:
+            data = self._codec.dumps(data)
+
+        return self._codec.loads(await self._send(
+            method, resource, params=params, data=data, headers=headers))
+
+    async def _get(self, resource, params=None):
+        return await self._request('GET', resource, params=params)
+
+    async def _stream(self, resource, params=None, read_timeout=None,
+                      on_response=None):
+        """Yields the lines of a streaming response. Streams are
+        long-lived, so only the connect timeout applies, and
+        ``read_timeout``, the most seconds to wait for more data."""
+        url = self._url(resource)
+        timeout = aiohttp.ClientTimeout(
+            sock_connect=self._timeout.sock_connect, sock_read=read_timeout)
+
+        await self._throttle()
+
+        async with self._get_session().get(
+                url, params=_as_params(params), timeout=timeout) as r:
+            await _raise_for_status(r)
+
+            # Called with the response, so that it can be closed to end the
+            # stream.
+            if on_response:
+                on_response(r)
+
+            async for line in r.content:
+                line = line.rstrip(b'\r\n')
+                if line:
+                    yield line.decode('utf-8')
+
+    def _watch(self, resource, params=None, **kwargs):
+        """Returns a noel.aiowatch.AsyncWatch on the given collection.
+        Keyword arguments are passed to AsyncWatch."""
+        return AsyncWatch(self, resource, params, **kwargs)
+
+    async def _post(self, resource, data, params=None):
+        return await self._request('POST', resource, params=params, data=data)
+
+    async def _put(self, resource, data, params=None):
+        return await self._request('PUT', resource, params=params, data=data)
+
+    async def _patch(self, resource, data, params=None):
+        return await self._request(
+            'PATCH',
+            resource,
+            params=params,
+            data=data,
+            headers={'content-type': 'application/merge-patch+json'})
+
+    async def _delete(self, resource, params=None):
+        return await self._request('DELETE', resource, params=params)
+
+    async def _delete_collection(self, resource, label_selector,
+                                 propagation_policy=None, params=None):
+        if not label_selector:
+            raise ValueError('A label selector is required.')
+
+        params = dict(params or {})
+        params['labelSelector'] = label_selector
+        if propagation_policy:
+            params['propagationPolicy'] = propagation_policy
+
+        return await self._request('DELETE', resource, params=params)
+
+    async def apply(self, spec, on_conflict='replace'):
+        """Creates an object from its spec, or if it already exists either
+        replaces it or leaves it as it is. See Kubernetes.apply."""
+        if on_conflict not in ('replace', 'skip'):
+            raise ValueError('Unknown on_conflict {}'.format(on_conflict))
+
+        kind = spec['kind']
+        name = spec['metadata']['name']
+        collection = KIND_COLLECTIONS[kind]
+        start = time.time()
+
+        try:
+            try:
+                result = await self._post(collection, spec)
+                action = 'created'
+            except KubernetesError as e:
+                if e.httperror.response.status_code != 409:
+                    raise
+                elif on_conflict == 'skip':
+                    result, action = None, 'unchanged'
+                else:
+                    result = await self._replace(collection, spec)
+                    action = 'replaced'
+        except (KubernetesError, aiohttp.ClientError,
+                asyncio.TimeoutError) as e:
+            return ApplyResult(
+                kind, name, 'failed', None, time.time() - start, e)
+
+        return ApplyResult(
+            kind, name, action, result, time.time() - start, None)
+
+    async def _replace(self, collection, spec):
+        resource = '{}/{}'.format(collection, spec['metadata']['name'])
+        existing = await self._get(resource)
+
+        spec = dict(spec)
+        spec['metadata'] = dict(
+            spec['metadata'],
+            resourceVersion=existing['metadata']['resourceVersion'])
+
+        # A service's cluster IP can't be changed once it's allocated.
+        cluster_ip = existing.get('spec', {}).get('clusterIP')
+        if spec['kind'] == 'Service' and cluster_ip:
+            spec['spec'] = dict(spec['spec'], clusterIP=cluster_ip)
+
+        return await self._put(resource, spec)
+
+    async def apply_many(self, groups, concurrency=DEFAULT_APPLY_CONCURRENCY,
+                         on_conflict='replace'):
+        """Applies groups of object specs, each group once the one before it
+        is done. See Kubernetes.apply_many."""
+        semaphore = asyncio.Semaphore(concurrency)
+        results = []
+
+        async def apply(spec):
+            async with semaphore:
+                return await self.apply(spec, on_conflict=on_conflict)
+
+        for group in groups:
+            group_results = await asyncio.gather(
+                *[apply(spec) for spec in group])
+            results.extend(group_results)
+
+            if any(result.error for result in group_results):
+                break
+
+        return results
+
+    async def _iter(self, resource, page_size=DEFAULT_PAGE_SIZE,
+                    params=None):
+        params = dict(params or {})
+        params['limit'] = page_size
+
+        while True:
+            result = await self._get(resource, params=params)
+
+            for item in result.get('items') or []:
+                yield item
+
+            token = result.get('metadata', {}).get('continue')
+
+            if not token:
+                return
+
+            params['continue'] = token
+
+    async def pods(self, params=None):
+        return await self._get('pods', params=params)
+
+    def iter_pods(self, page_size=DEFAULT_PAGE_SIZE, params=None):
+        return self._iter('pods', page_size, params=params)
+
+    async def services(self, params=None):
+        return await self._get('services', params=params)
+
+    def iter_services(self, page_size=DEFAULT_PAGE_SIZE, params=None):
+        return self._iter('services', page_size, params=params)
+
+    async def replicationcontrollers(self, params=None):
+        return await self._get('replicationcontrollers', params=params)
+
+    def iter_replicationcontrollers(self, page_size=DEFAULT_PAGE_SIZE,
+                                    params=None):
+        return self._iter('replicationcontrollers', page_size, params=params)
+
+    def iter_events(self, page_size=DEFAULT_PAGE_SIZE, params=None):
+        return self._iter('events', page_size, params=params)
+
+    def iter_limitranges(self, page_size=DEFAULT_PAGE_SIZE, params=None):
+        return self._iter('limitranges', page_size, params=params)
+
+    def iter_resourcequotas(self, page_size=DEFAULT_PAGE_SIZE, params=None):
+        return self._iter('resourcequotas', page_size, params=params)
+
+    def logs(self, name, container=None, follow=None, lines=None,
+             params=None):
+        params = dict(params or {})
+
+        params.update({
+            'container': container,
+            'follow': follow,
+            'tailLines': lines
+        })
+
+        return self._stream('pods/{}/log'.format(name), params=params)
+
+    async def proxy_pod(self, name, path, port=None, method='GET', data=None,
+                        params=None):
+        """Sends a request to a pod through the API server's proxy and
+        returns the response body."""
+        target = '{}:{}'.format(name, port) if port else name
+        body = await self._send(
+            method,
+            'pods/{}/proxy/{}'.format(target, path.lstrip('/')),
+            params=params,
+            data=data)
+        return body.decode('utf-8')
+
+    async def get_service(self, name, params=None):
+        return await self._get('services/' + name, params=params)
+
+    async def create_service(self, spec, params=None):
+        return await self._post('services', spec, params=params)
+
+    async def patch_service(self, name, patch, params=None):
+        return await self._patch('services/' + name, patch, params=params)
+
+    async def get_replicationcontroller(self, name, params=None):
+        return await self._get(
+            'replicationcontrollers/' + name, params=params)
+
+    async def create_replicationcontroller(self, spec, params=None):
+        return await self._post('replicationcontrollers', spec, params=params)
+
+    async def patch_replicationcontroller(self, name, patch, params=None):
+        return await self._patch(
+            'replicationcontrollers/' + name, patch, params=params)
+
+    async def scale(self, name, replicas, params=None):
+        return await self._patch(
+            'replicationcontrollers/{}'.format(name),
+            {"spec": {"replicas": replicas}},
+            params=params)
+
+    async def get_horizontalpodautoscaler(self, name, params=None):
+        return await self._get(
+            'horizontalpodautoscalers/' + name, params=params)
+
+    async def patch_horizontalpodautoscaler(self, name, patch, params=None):
+        return await self._patch(
+            'horizontalpodautoscalers/' + name, patch, params=params)
+
+    async def delete_horizontalpodautoscalers(self, label_selector,
+                                              params=None):
+        return await self._delete_collection(
+            'horizontalpodautoscalers', label_selector, params=params)
+
+    async def get_daemonset(self, name, params=None):
+        return await self._get('daemonsets/' + name, params=params)
+
+    async def delete_daemonset(self, name, propagation_policy='Background',
+                               params=None):
+        params = dict(params or {})
+        params['propagationPolicy'] = propagation_policy
+        return await self._delete('daemonsets/' + name, params=params)
+
+    async def delete_service(self, name, params=None):
+        return await self._delete('services/{}'.format(name), params=params)
+
+    async def delete_replicationcontroller(self, name, params=None):
+        return await self._delete(
+            'replicationcontrollers/{}'.format(name), params=params)
+
+    async def delete_replicationcontrollers(
+            self, label_selector, propagation_policy='Background',
+            params=None):
+        return await self._delete_collection(
+            'replicationcontrollers', label_selector,
+            propagation_policy=propagation_policy, params=params)
+
+    async def delete_pods(self, label_selector, params=None):
+        return await self._delete_collection(
+            'pods', label_selector, params=params)
+
+    async def get_secret(self, name, params=None):
+        r = await self._get('secrets/' + name, params=params)
+        # The API server leaves out empty data.
+        r['data'] = self.decode_secret_data(r.get('data') or {})
+        return r
+
+    async def create_secret(self, spec, params=None):
+        spec['data'] = self.encode_secret_data(spec['data'])
+        return await self._post('secrets', spec, params=params)
+
+    async def replace_secret(self, spec, params=None):
+        name = spec['metadata']['name']
+        spec['data'] = self.encode_secret_data(spec['data'])
+        return await self._put(
+            'secrets/{}'.format(name), spec, params=params)
+
+    async def delete_secret(self, name, params=None):
+        return await self._delete('secrets/{}'.format(name), params=params)
+
+    async def delete_secrets(self, label_selector, params=None):
+        return await self._delete_collection(
+            'secrets', label_selector, params=params)
+
+    def watch_secrets(self, params=None, **kwargs):
+        return self._watch('secrets', params=params, **kwargs)
@@ -0,0 +1,202 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""An asyncio version of noel.watch.Watch, for AsyncKubernetes clients."""
+
+import asyncio
+import time
+
+import aiohttp
+
+from noel.kubernetes import KubernetesError
+from noel.logger import logger
+from noel.ratelimit import backoff_delay
+from noel.watch import (
+    DEFAULT_TIMEOUT_SECONDS, is_expired, MAX_BACKOFF_SECONDS,
+    MIN_BACKOFF_SECONDS, READ_TIMEOUT_MARGIN_SECONDS, WatchExpired)
+
+
+class AsyncWatch(object):
+    """An endless, resumable async iterator of watch events for a
+    collection, which behaves like noel.watch.Watch.
+
+    The collection is listed first unless ``resource_version`` is given,
+    and the watch resumes from the last resourceVersion it saw when the
+    server ends a request, relists when that version has expired, and backs
+    off after errors. Listed objects are passed to ``on_relist``, or else
+    yielded as ``ADDED`` events; bookmarks aren't yielded.
+    """
+
+    def __init__(self, k8s, resource, params=None, resource_version=None,
+                 on_relist=None, timeout_seconds=DEFAULT_TIMEOUT_SECONDS,
+                 max_backoff=MAX_BACKOFF_SECONDS):
+        self._k8s = k8s
+        self._resource = resource
+        self._params = dict(params or {})
+        self._on_relist = on_relist
+        self._timeout_seconds = timeout_seconds
+        self._max_backoff = max_backoff
+
+        self.resource_version = resource_version
+        self.last_contact = None
+        self._stopped = False
+        # Created in the event loop the watch runs in.
+        self._wakeup = None
+        self._response = None
+        self._failures = 0
+
+    def stop(self):
+        """Stops the watch, closing the current request so that the task
+        iterating over it doesn't have to wait for the next event."""
+        self._stopped = True
+
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self._response is not None:
+            self._response.close()
+
+    def _set_response(self, response):
+        self._response = response
+        self.last_contact = time.time()
+
+        # stop() may have missed it.
+        if self._stopped:
+            response.close()
+
+    def __aiter__(self):
+        return self._events()
+
+    async def _events(self):
+        self._wakeup = asyncio.Event()
+
+        while not self._stopped:
+            relisted = False
+
+            try:
+                if self.resource_version is None:
+                    relisted = True
+                    for event in await self._relist():
+                        yield event
+
+                async for event in self._stream():
+                    yield event
+
+                if self._stopped:
+                    return
+
+            except WatchExpired as e:
+                logger.info('Watch on {} expired at {}, relisting.'.format(
+                    self._resource, self.resource_version))
+                self.resource_version = None
+
+                # A version that expires straight after a list means the
+                # server is struggling, don't hammer it with lists.
+                if relisted:
+                    await self._backoff(e)
+
+            except asyncio.TimeoutError:
+                # Nothing, not even a bookmark, arrived in time, so the
+                # connection was most likely dropped without being closed.
+                logger.info('Watch on {} timed out, reconnecting.'.format(
+                    self._resource))
+
+            except (aiohttp.ClientError, KubernetesError, ValueError) as e:
+                if self._stopped:
+                    return
+                await self._backoff(e)
+
+    async def _relist(self):
+        params = {
+            k: v for k, v in self._params.items()
+            if k in ('labelSelector', 'fieldSelector')}
+
+        result = await self._k8s._get(self._resource, params=params)
+
+        self.resource_version = result['metadata']['resourceVersion']
+        self.last_contact = time.time()
+
+        if self._on_relist:
+            self._on_relist(result)
+            return []
+
+        return [
+            {'type': 'ADDED', 'object': obj}
+            for obj in result.get('items') or []]
+
+    async def _stream(self):
+        params = dict(self._params)
+        params.update({
+            'watch': 'true',
+            'resourceVersion': self.resource_version,
+            'timeoutSeconds': self._timeout_seconds,
+            'allowWatchBookmarks': 'true'
+        })
+
+        try:
+            lines = self._k8s._stream(
+                self._resource, params=params,
+                read_timeout=(
+                    self._timeout_seconds + READ_TIMEOUT_MARGIN_SECONDS),
+                on_response=self._set_response)
+
+            async for line in lines:
+                self.last_contact = time.time()
+
+                if self._stopped:
+                    return
+
+                event = self._k8s._codec.loads(line)
+                event_type = event.get('type')
+                obj = event.get('object') or {}
+
+                if event_type == 'ERROR':
+                    if is_expired(obj):
+                        raise WatchExpired(obj.get('message', '410 Gone'))
+                    raise ValueError('Watch error: {}'.format(obj))
+
+                self._failures = 0
+                version = obj.get('metadata', {}).get('resourceVersion')
+                if version:
+                    self.resource_version = version
+
+                if event_type == 'BOOKMARK':
+                    continue
+
+                yield event
+
+                if self._stopped:
+                    return
+
+        except KubernetesError as e:
+            # Some API servers reject an expired resourceVersion up front.
+            if e.httperror.response.status_code == 410:
+                raise WatchExpired(str(e))
+            raise
+
+        finally:
+            self._response = None
+
+    async def _backoff(self, error):
+        # Jitter keeps many watchers from reconnecting in lockstep.
+        delay = backoff_delay(
+            self._failures, MIN_BACKOFF_SECONDS, self._max_backoff)
+        self._failures += 1
+
+        logger.warning('Watch on {} failed ({}), retrying in {:.1f}s.'.format(
+            self._resource, error, delay))
+
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
@@ -22,7 +22,7 @@ from noel.builder import builder
 from noel.builder import remote
 from noel.builder import ssh_keys
 from noel.logger import logger
-from noel.kubernetes import Kubernetes
+from noel.kubernetes import connect
 
 
 def build_command(args):
@@ -43,7 +43,7 @@ def add_ssh_key_command(args):
     with open(os.path.expanduser(args.ssh_key), 'r') as f:
         ssh_key = f.read()
 
-    k8s = Kubernetes(args.kubernetes_url, namespace='noel')
+    k8s = connect(args.kubernetes_url, namespace='noel')
     ssh_keys.add_key(k8s, args.hostname, ssh_key)
 
     logger.info(
@@ -53,7 +53,7 @@ def add_ssh_key_command(args):
 def add_git_remote_command(args):
     """Adds the remote builder as a git remote to the current repository."""
 
-    k8s = Kubernetes(args.kubernetes_url, namespace='noel')
+    k8s = connect(args.kubernetes_url, namespace='noel')
     remote.add_builder_git_remote(k8s, args.app, args.remote_name)
 
     logger.info(
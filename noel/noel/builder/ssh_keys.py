@@ -18,20 +18,24 @@ The remote builer uses SSH keys to identify authorized users. The keys are
 stored in a Kubernetes secret.
 """
 
-import yaml
-
-from jinja2 import Template
-from pkg_resources import resource_string
-
+from noel.deployer.templates import validate
 from noel.kubernetes import KubernetesError
 
 
-SSH_KEY_SECRET_TMPL = Template(
-    resource_string(__name__, 'resources/ssh-key-secret.tmpl.yaml'))
-
-
 def ssh_key_secret_template(data, name='ssh-keys'):
-    return yaml.load(SSH_KEY_SECRET_TMPL.render(data=data, name=name))
+    spec = {
+        'apiVersion': 'v1',
+        'kind': 'Secret',
+        'metadata': {
+            'name': name,
+            'labels': {'type': 'ssh-keys'},
+        },
+        'type': 'Opaque',
+        'data': {key.lower(): value for key, value in data.items()},
+    }
+
+    validate(spec)
+    return spec
 
 
 def add_key(k8s, name, key):
@@ -44,7 +48,7 @@ def add_key(k8s, name, key):
         existing = None
 
     if existing:
-        keys = existing['data']
+        keys = existing.get('data') or {}
     else:
         keys = {}
 
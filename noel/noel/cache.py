@@ -0,0 +1,164 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A short-lived read cache for Kubernetes GET requests.
+
+A single CLI command often reads the same object several times, for example
+set-config reads the app's secret to update it and again to deploy it. With
+a ResponseCache, repeated GETs within ``ttl`` seconds are answered from
+memory, and concurrent identical GETs share a single request. Any write a
+client makes to a collection drops the cached responses for that collection.
+
+Responses are cached as raw bytes and decoded on every hit, so callers are
+free to modify what they get back.
+"""
+
+from collections import OrderedDict
+import threading
+import time
+
+DEFAULT_TTL = 5
+DEFAULT_MAX_ENTRIES = 256
+
+
+class _InFlight(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.content = None
+        self.error = None
+
+
+class ResponseCache(object):
+    """A thread-safe TTL and LRU cache of GET response bodies.
+
+    Entries are keyed by (collection, url, params); the collection is used to
+    invalidate every object and list in it at once. One cache can be shared
+    by several clients.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> (expiry, content), least recently used first.
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        # Bumped on every invalidation, so that requests that were in flight
+        # during a write don't store what they read before it.
+        self._generations = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, collection, url, params, fetch):
+        """Returns the cached content for a GET, calling ``fetch`` to make
+        the request if there's no fresh entry or identical request in
+        flight."""
+        key = (collection, url, tuple(sorted((params or {}).items())))
+
+        with self._lock:
+            entry = self._entries.pop(key, None)
+
+            if entry is not None and entry[0] > time.time():
+                self._entries[key] = entry
+                self.hits += 1
+                return entry[1]
+
+            in_flight = self._in_flight.get(key)
+
+            if in_flight is None:
+                in_flight = self._in_flight[key] = _InFlight()
+                generation = self._generations.get(collection, 0)
+                self.misses += 1
+                owner = True
+            else:
+                self.coalesced += 1
+                owner = False
+
+        if not owner:
+            in_flight.done.wait()
+            if in_flight.error is not None:
+                raise in_flight.error
+            return in_flight.content
+
+        try:
+            in_flight.content = fetch()
+        except Exception as e:
+            in_flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+                if (in_flight.error is None and
+                        generation == self._generations.get(collection, 0)):
+                    self._store(key, in_flight.content)
+            in_flight.done.set()
+
+        return in_flight.content
+
+    def _store(self, key, content):
+        self._entries[key] = (time.time() + self.ttl, content)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, collection):
+        """Drops every cached response for a collection."""
+        with self._lock:
+            self._generations[collection] = (
+                self._generations.get(collection, 0) + 1)
+
+            for key in [k for k in self._entries if k[0] == collection]:
+                del self._entries[key]
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'coalesced': self.coalesced,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries),
+            }
+
+    def summary(self):
+        """Returns a one line description of the round trips saved."""
+        stats = self.stats()
+        saved = stats['hits'] + stats['coalesced']
+        return (
+            'Saved {} of {} GET round trips ({} cached, {} coalesced, '
+            '{} invalidated).'.format(
+                saved, saved + stats['misses'], stats['hits'],
+                stats['coalesced'], stats['invalidations']))
+
+
+# The cache used by clients created with noel.kubernetes.connect(), if any.
+SHARED = None
+
+
+def enable(ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+    """Makes connect() give every client the same ResponseCache."""
+    global SHARED
+    SHARED = ResponseCache(ttl, max_entries)
+    return SHARED
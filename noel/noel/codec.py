@@ -0,0 +1,165 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""JSON encoding and decoding for the Kubernetes client.
+
+Decoding large list and watch responses can dominate the client's CPU time,
+so the codec uses the fastest JSON library that's installed (orjson, then
+ujson, then the standard library). With ijson installed, list responses can
+also be decoded incrementally, straight from the socket, one item at a time.
+Both are installed by ``pip install noel[speedups]``.
+"""
+
+import io
+import json
+
+try:
+    import ijson
+except ImportError:  # pragma: NO COVER
+    ijson = None
+
+
+class Codec(object):
+    """A JSON implementation. ``dumps`` may return text or bytes."""
+
+    def __init__(self, name, loads, dumps):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+
+    def __repr__(self):
+        return 'Codec({})'.format(self.name)
+
+
+def _stdlib_codec():
+    return Codec('json', json.loads, json.dumps)
+
+
+def _orjson_codec():
+    import orjson
+    return Codec('orjson', orjson.loads, orjson.dumps)
+
+
+def _ujson_codec():
+    import ujson
+    return Codec(
+        'ujson', ujson.loads,
+        lambda obj: ujson.dumps(obj, escape_forward_slashes=False))
+
+
+CODECS = {
+    'json': _stdlib_codec,
+    'orjson': _orjson_codec,
+    'ujson': _ujson_codec,
+}
+
+# Codecs to try, fastest first.
+PREFERENCE = ('orjson', 'ujson', 'json')
+
+
+def register(name, factory):
+    """Registers a codec factory, a callable that returns a Codec or raises
+    ImportError if the codec's library isn't installed."""
+    CODECS[name] = factory
+
+
+def get_codec(name=None):
+    """Returns the named codec, or the fastest installed codec."""
+    if name:
+        return CODECS[name]()
+
+    for name in PREFERENCE:
+        try:
+            return CODECS[name]()
+        except ImportError:
+            continue
+
+    return _stdlib_codec()
+
+
+DEFAULT_CODEC = get_codec()
+
+
+# How much of the start of a list response to keep for reading its metadata.
+HEAD_SIZE = 64 * 1024
+
+
+class _HeadRecorder(object):
+    """Wraps a file object, keeping a copy of the first bytes read from it."""
+
+    def __init__(self, fileobj, size=HEAD_SIZE):
+        self.head = b''
+        self._fileobj = fileobj
+        self._size = size
+
+    def read(self, size=-1):
+        data = self._fileobj.read(size)
+        if len(self.head) < self._size:
+            self.head += data[:self._size - len(self.head)]
+        return data
+
+
+def _head_metadata(head):
+    """Returns the list metadata found at the start of a list response."""
+    metadata = {}
+
+    try:
+        for prefix, event, value in ijson.parse(io.BytesIO(head)):
+            if prefix == 'items':
+                break
+            if prefix.startswith('metadata.') and value is not None:
+                metadata[prefix[len('metadata.'):]] = value
+    except ijson.IncompleteJSONError:
+        pass
+
+    return metadata
+
+
+class ListReader(object):
+    """Iterates over the items of a Kubernetes list response.
+
+    With ijson, items are decoded one at a time as the response is read from
+    ``fileobj``, so only one item is in memory at a time. Without it, the
+    response is read and decoded in one go. Either way, ``metadata`` holds
+    the list's metadata (such as the continue token) once iteration is done.
+
+    Incremental decoding relies on the API server writing a list's metadata
+    before its items, as it always does.
+    """
+
+    def __init__(self, fileobj, codec=DEFAULT_CODEC, incremental=True):
+        self.metadata = {}
+        self._fileobj = fileobj
+        self._codec = codec
+        self._incremental = incremental and ijson is not None
+
+    def __iter__(self):
+        if self._incremental:
+            return self._iter_incremental()
+        return self._iter_buffered()
+
+    def _iter_buffered(self):
+        result = self._codec.loads(self._fileobj.read())
+        self.metadata = result.get('metadata') or {}
+        return iter(result.get('items') or [])
+
+    def _iter_incremental(self):
+        recorder = _HeadRecorder(self._fileobj)
+
+        # ijson.items runs entirely in C with the yajl2_c backend, picking
+        # the metadata out of the parse events in Python would be much slower.
+        for item in ijson.items(recorder, 'items.item', use_float=True):
+            yield item
+
+        self.metadata = _head_metadata(recorder.head)
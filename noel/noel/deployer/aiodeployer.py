@@ -0,0 +1,306 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Awaitable versions of noel.deployer.deployer's deploys, deletes and
+config updates.
+
+These take a noel.aiokubernetes.AsyncKubernetes client instead of a
+Kubernetes client, so many applications can be deployed or changed
+concurrently from one event loop. Deploys work out what to do with
+noel.deployer.plan, as deployer.deploy_app does, and roll out with
+noel.deployer.aiorollout. See noel.deployer.deployer for what each function
+does.
+"""
+
+import asyncio
+import time
+
+from noel.kubernetes import KubernetesError
+from noel.deployer import (
+    aiorollout, deployer, plan, resources, rollout, settings, templates)
+from noel.deployer.deployer import (
+    DEFAULT_BATCH_CONCURRENCY, DEFAULT_RETAINED_VERSIONS, DeployResult,
+    MAX_UPDATE_ATTEMPTS, UPDATE_BACKOFF_SECONDS)
+from noel.logger import logger
+from noel.ratelimit import backoff_delay
+
+
+async def deploy_app(k8s, app, image=None, config=None, app_settings=None,
+                     max_surge=rollout.DEFAULT_MAX_SURGE,
+                     max_unavailable=rollout.DEFAULT_MAX_UNAVAILABLE,
+                     rollout_timeout=rollout.DEFAULT_TIMEOUT,
+                     force=False, fail_fast=False, readiness=None,
+                     retain=DEFAULT_RETAINED_VERSIONS):
+    """Deploys an application version, see deployer.deploy_app.
+    ``readiness`` is a started aiorollout.AsyncPodReadiness. Images aren't
+    pre-pulled or placed on their build node.
+    """
+    rcs = [rc async for rc in k8s.iter_replicationcontrollers(params={
+        'labelSelector': 'noel-app={}'.format(app)})]
+    current = plan.current_replication_controller(rcs)
+
+    if not image:
+        if not current:
+            raise ValueError(
+                "No replication controller found for {}".format(app))
+
+        image = plan.image_of(current)
+
+    if not config:
+        config = await get_config(k8s, app)
+
+    if not app_settings:
+        app_settings = await get_settings(k8s, app)
+
+    deploy = plan.plan_deploy(
+        app, rcs, image, config, app_settings, force=force,
+        max_surge=max_surge)
+
+    if deploy.deployed:
+        logger.info('{} is already deployed.'.format(
+            deploy.rc['metadata']['name']))
+        await retarget_autoscaler(k8s, app, deploy.rc['metadata']['name'])
+        return None, None
+
+    if deploy.rc_spec is None:
+        app_rc = deploy.rc
+        app_svc, = await apply(k8s, [[templates.app_service(name=app)]])
+
+    else:
+        if not resources.has_requests(app_settings):
+            logger.warning(
+                'App {} has no CPU or memory request, so its pods can be '
+                'scheduled onto full nodes. Set them with noel '
+                'resources.'.format(app))
+
+        app_svc, app_rc = await apply(k8s, [[
+            templates.app_service(name=app), deploy.rc_spec]])
+
+    await _roll_out(
+        k8s, app, app_rc, deploy.old_rcs, deploy.replicas,
+        max_surge=max_surge,
+        max_unavailable=max_unavailable,
+        timeout=rollout_timeout,
+        fail_fast=fail_fast,
+        readiness=readiness)
+
+    if deploy.old_rcs:
+        await k8s.patch_replicationcontroller(app_rc['metadata']['name'], {
+            'metadata': {'annotations': {plan.DEPLOYED_AT: plan.now()}}})
+
+    await k8s.delete_replicationcontrollers(plan.turndown_selector(
+        app, deploy.build_version, deploy.old_rcs, retain=retain))
+
+    return app_rc, app_svc
+
+
+async def deploy_apps(k8s, images, concurrency=DEFAULT_BATCH_CONCURRENCY,
+                      **options):
+    """Deploys many apps at once with deploy_app, up to ``concurrency`` at a
+    time. Returns a DeployResult for each app, in order; see
+    deployer.deploy_apps."""
+    images = list(images)
+    semaphore = asyncio.Semaphore(concurrency)
+    done = [0]
+
+    async def deploy(app, image):
+        async with semaphore:
+            start = time.time()
+
+            try:
+                app_rc, _ = await deploy_app(k8s, app, image=image, **options)
+                result = DeployResult(
+                    app, image, app_rc is not None, time.time() - start,
+                    None)
+            except Exception as e:
+                logger.debug(
+                    'Deploying {} failed.'.format(app), exc_info=True)
+                result = DeployResult(
+                    app, image, False, time.time() - start, e)
+
+        done[0] += 1
+        logger.info('[{}/{}] {} {} in {:.1f}s'.format(
+            done[0], len(images), app,
+            'failed' if result.error else
+            'deployed' if result.deployed else 'unchanged',
+            result.seconds))
+
+        return result
+
+    return await asyncio.gather(
+        *[deploy(app, image) for app, image in images])
+
+
+async def _roll_out(k8s, app, new_rc, old_rcs, replicas, **options):
+    autoscaler = await get_autoscaler(k8s, app)
+    previous = deployer.autoscaler_target(autoscaler)
+
+    # Moved over first, see deployer._roll_out.
+    await retarget_autoscaler(k8s, app, new_rc['metadata']['name'])
+
+    if not old_rcs:
+        return
+
+    try:
+        await aiorollout.AsyncRollout(
+            k8s, app, new_rc, old_rcs,
+            plan.rollout_replicas(replicas, autoscaler), **options).run()
+    except rollout.RolloutError as e:
+        if e.rolled_back and previous:
+            await retarget_autoscaler(k8s, app, previous)
+        raise
+
+
+async def apply(k8s, groups):
+    """Applies groups of specs, see deployer.apply."""
+    results = await k8s.apply_many(groups, on_conflict='skip')
+
+    for result in results:
+        logger.debug('{} {} {} in {:.0f}ms'.format(
+            result.kind, result.name, result.action,
+            result.duration * 1000))
+
+    for result in results:
+        if result.error:
+            raise result.error
+
+    return [result.object for result in results]
+
+
+async def get_settings(k8s, app):
+    try:
+        return settings.from_service(await k8s.get_service(app))
+    except KubernetesError:
+        return settings.defaults()
+
+
+async def get_autoscaler(k8s, app):
+    try:
+        return await k8s.get_horizontalpodautoscaler(app)
+    except KubernetesError:
+        return None
+
+
+async def retarget_autoscaler(k8s, app, rc_name):
+    autoscaler = await get_autoscaler(k8s, app)
+
+    if not autoscaler:
+        return None
+
+    if deployer.autoscaler_target(autoscaler) == rc_name:
+        return autoscaler
+
+    logger.info('Autoscaling {} now.'.format(rc_name))
+
+    return await k8s.patch_horizontalpodautoscaler(app, {
+        'spec': {'scaleTargetRef': {'name': rc_name}}})
+
+
+async def delete_app(k8s, app):
+    await delete_apps(k8s, apps=[app])
+
+
+async def delete_apps(k8s, apps=(), label_selector=None):
+    if not label_selector:
+        if not apps:
+            raise ValueError('No apps or label selector given.')
+        label_selector = 'noel-app in ({})'.format(','.join(apps))
+
+    services = [
+        service['metadata']['name'] async for service in k8s.iter_services(
+            params={'labelSelector': label_selector})]
+    services = sorted(set(services).union(apps))
+
+    results = await asyncio.gather(
+        k8s.delete_replicationcontrollers(label_selector),
+        delete_configs(k8s, label_selector, apps),
+        k8s.delete_horizontalpodautoscalers(label_selector),
+        *[delete_service(k8s, name) for name in services])
+
+    await k8s.delete_pods(label_selector)
+
+    deleted = set(
+        rc['metadata'].get('labels', {}).get('noel-app')
+        for rc in results[0].get('items') or [])
+    deleted.update(
+        name for name, result in zip(services, results[3:]) if result)
+    deleted.discard(None)
+
+    return sorted(deleted)
+
+
+async def delete_service(k8s, app):
+    try:
+        await k8s.delete_service(app)
+        return True
+    except KubernetesError:
+        return False
+
+
+async def get_config(k8s, app):
+    try:
+        return await k8s.get_secret(app)
+    except KubernetesError:
+        return None
+
+
+async def update_config(k8s, app, config, unset=()):
+    for attempt in range(MAX_UPDATE_ATTEMPTS):
+        existing = await get_config(k8s, app)
+
+        data = dict(existing['data']) if existing else {}
+        data.update(config)
+        for key in unset:
+            data.pop(key, None)
+
+        if existing and data == existing['data']:
+            return existing
+        elif not existing and not data:
+            return None
+
+        secret = templates.app_secret(app, data)
+
+        try:
+            if existing:
+                secret['metadata']['resourceVersion'] = (
+                    existing['metadata']['resourceVersion'])
+                result = await k8s.replace_secret(secret)
+            else:
+                result = await k8s.create_secret(secret)
+        except KubernetesError as e:
+            status = e.httperror.response.status_code
+            if status != 409 or attempt == MAX_UPDATE_ATTEMPTS - 1:
+                raise
+        else:
+            result['data'] = data
+            return result
+
+        await asyncio.sleep(
+            backoff_delay(attempt, UPDATE_BACKOFF_SECONDS, 2))
+
+
+async def delete_config(k8s, app):
+    try:
+        await k8s.delete_secret(app)
+    except KubernetesError:
+        pass
+
+
+async def delete_configs(k8s, label_selector, apps=()):
+    result = await k8s.delete_secrets(label_selector)
+    deleted = set(
+        secret['metadata']['name'] for secret in result.get('items') or [])
+
+    await asyncio.gather(*[
+        delete_config(k8s, app) for app in set(apps) - deleted])
@@ -0,0 +1,233 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""asyncio versions of noel.deployer.readiness.PodReadiness and
+noel.deployer.rollout.Rollout, for AsyncKubernetes clients.
+
+The rollout takes the same steps as Rollout, worked out by the same
+functions in noel.deployer.rollout, but waits for pods without a thread.
+"""
+
+import asyncio
+import time
+
+from noel.aiowatch import AsyncWatch
+from noel.deployer import plan, readiness, rollout
+from noel.logger import logger
+
+
+class AsyncPodReadiness(object):
+    """Watches the pods of an application, like PodReadiness.
+
+    Use it as an async context manager, or await start() and stop().
+    """
+
+    def __init__(self, k8s, app):
+        self._watch = AsyncWatch(
+            k8s, 'pods', {'labelSelector': 'noel-app={}'.format(app)},
+            on_relist=self._replace)
+        # Pod name -> pod.
+        self._pods = {}
+        # Set and replaced whenever the pods change. Created in the event
+        # loop the watch runs in.
+        self._changed = None
+        self._synced = None
+        self._task = None
+
+    async def start(self, timeout=None):
+        """Starts watching, waiting up to ``timeout`` seconds for the initial
+        list. Returns True if it completed."""
+        self._changed = asyncio.Event()
+        self._synced = asyncio.Event()
+        self._task = asyncio.ensure_future(self._run())
+
+        try:
+            await asyncio.wait_for(self._synced.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def stop(self):
+        self._watch.stop()
+
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def _run(self):
+        async for event in self._watch:
+            name = event['object']['metadata']['name']
+
+            if event['type'] == 'DELETED':
+                self._pods.pop(name, None)
+            else:
+                self._pods[name] = event['object']
+
+            self._notify()
+
+    def _replace(self, result):
+        self._pods = {
+            pod['metadata']['name']: pod for pod in result.get('items') or []}
+        self._synced.set()
+        self._notify()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def pods(self, build_version):
+        """Returns the pods of one version of the application."""
+        return [
+            pod for pod in self._pods.values()
+            if pod['metadata'].get('labels', {}).get('build-version') ==
+            build_version]
+
+    def ready(self, build_version):
+        """Returns the number of ready pods of a version."""
+        return len([
+            pod for pod in self.pods(build_version)
+            if readiness.is_ready(pod)])
+
+    def failures(self, build_version):
+        """Returns (pod name, reason) for the failing pods of a version."""
+        failures = []
+
+        for pod in self.pods(build_version):
+            reason = readiness.failure(pod)
+            if reason:
+                failures.append((pod['metadata']['name'], reason))
+
+        return failures
+
+    async def wait_for_ready(self, build_version, count, timeout=None,
+                             fail_fast=False):
+        """Waits until at least ``count`` pods of a version are ready. See
+        PodReadiness.wait_for_ready."""
+        deadline = time.time() + timeout if timeout is not None else None
+
+        while not (self.ready(build_version) >= count or
+                   fail_fast and self.failures(build_version)):
+            remaining = deadline - time.time() if deadline else None
+
+            if remaining is not None and remaining <= 0:
+                break
+
+            try:
+                await asyncio.wait_for(self._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+
+        return self.ready(build_version)
+
+
+class AsyncRollout(rollout.Rollout):
+    """Replaces ``old_rcs`` with ``new_rc`` like Rollout, with an
+    AsyncKubernetes client. ``readiness`` is a started AsyncPodReadiness.
+    """
+
+    async def run(self):
+        """Runs the rollout and returns its steps. Raises RolloutError if it
+        times out or fails."""
+        deadline = time.time() + self._timeout
+
+        if self._readiness:
+            return await self._run(self._readiness, deadline)
+
+        pods = AsyncPodReadiness(self._k8s, self._app)
+
+        try:
+            if not await pods.start(timeout=self._timeout):
+                raise rollout.RolloutError(
+                    'Rollout of {} couldn\'t list the app\'s pods within '
+                    '{}s.'.format(
+                        self._new_rc['metadata']['name'], self._timeout),
+                    self.steps, False)
+
+            return await self._run(pods, deadline)
+        finally:
+            await pods.stop()
+
+    async def _run(self, pods, deadline):
+        build_version = plan.version_of(self._new_rc)
+
+        name = self._new_rc['metadata']['name']
+        new = plan.replicas(self._new_rc)
+        old = {
+            rc['metadata']['name']: plan.replicas(rc) for rc in self._old_rcs}
+        original = dict(old)
+
+        min_available = max(0, self._replicas - self._max_unavailable)
+
+        async def wait_for_ready(count):
+            return await pods.wait_for_ready(
+                build_version, count,
+                timeout=max(0, deadline - time.time()),
+                fail_fast=self._fail_fast)
+
+        while True:
+            step_start = time.time()
+            old_total = sum(old.values())
+
+            target = rollout.scale_up_target(
+                self._replicas, self._max_surge, new, old_total)
+            if target > new:
+                new = target
+                await self._k8s.scale(name, new)
+
+            if not old_total:
+                break
+
+            ready = await wait_for_ready(
+                rollout.ready_needed(new, old_total, min_available))
+            count = rollout.removable(old_total, ready, min_available)
+
+            if count <= 0:
+                await self._abort(new, ready, original, pods)
+
+            await asyncio.gather(*[
+                self._k8s.scale(old_name, replicas) for old_name, replicas in
+                rollout.scale_down(self._old_rcs, old, count)])
+            self._step(new, old, step_start)
+
+        ready = await wait_for_ready(min_available)
+
+        if ready < min_available:
+            await self._abort(new, ready, original, pods)
+
+        if not self.steps or self.steps[-1].new_replicas != new:
+            self._step(new, old, step_start)
+
+        return self.steps
+
+    async def _abort(self, new, ready, original, pods):
+        message = self._abort_message(new, ready, pods)
+
+        if self._rollback:
+            logger.warning('{} Rolling back.'.format(message))
+            await asyncio.gather(*[
+                self._k8s.scale(name, replicas)
+                for name, replicas in original.items()])
+            await self._k8s.scale(self._new_rc['metadata']['name'], 0)
+
+        raise rollout.RolloutError(message, self.steps, self._rollback)
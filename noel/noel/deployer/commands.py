@@ -14,46 +14,216 @@
 
 """Command-line commands for noel under the 'deploy' group."""
 
+import argparse
 import os
+import sys
+import textwrap
+import time
 
-from noel.deployer import deployer
-from noel.kubernetes import Kubernetes
+import yaml
+
+from noel.deployer import (
+    deployer, plan, prepull, readiness, resources, rollout, settings)
+from noel.kubernetes import connect, DEFAULT_POOL_MAXSIZE
 from noel.logger import logger
 
 
+def _connect(args, **kwargs):
+    # The remote builder's build-and-deploy doesn't set --qps or --burst.
+    return connect(
+        args.kubernetes_url, namespace='noelapp',
+        qps=getattr(args, 'qps', None), burst=getattr(args, 'burst', None),
+        **kwargs)
+
+
+def _deploy_options(args):
+    # build-and-deploy from the remote builder doesn't set these.
+    return {
+        'max_surge': getattr(
+            args, 'max_surge', rollout.DEFAULT_MAX_SURGE),
+        'max_unavailable': getattr(
+            args, 'max_unavailable', rollout.DEFAULT_MAX_UNAVAILABLE),
+        'rollout_timeout': getattr(
+            args, 'rollout_timeout', rollout.DEFAULT_TIMEOUT),
+        'force': getattr(args, 'force', False),
+        'fail_fast': getattr(args, 'wait', False),
+        'retain': getattr(
+            args, 'retain', deployer.DEFAULT_RETAINED_VERSIONS),
+        'prepull_timeout': (
+            args.prepull_timeout if getattr(args, 'prepull', False)
+            else None),
+        'build_node': getattr(args, 'build_node', None),
+    }
+
+
+def _wait_for_pods(pods, rc, since, timeout):
+    build_version = rc['spec']['template']['metadata']['labels'][
+        'build-version']
+    replicas = rc['spec'].get('replicas', 0)
+
+    times = pods.wait(build_version, replicas, since=since, timeout=timeout)
+
+    logger.info(
+        '{} of {} pods ready. First ready after {:.1f}s, all ready after '
+        '{:.1f}s.'.format(
+            replicas, rc['metadata']['name'], times.first_ready,
+            times.all_ready))
+
+    return times
+
+
+def _report_first_ready(k8s, app, rc, seconds):
+    previous, previous_seconds = deployer.record_first_ready(
+        k8s, app, rc, seconds)
+    build_node = deployer.get_build_node(rc)
+
+    if previous is None:
+        return
+
+    logger.info(
+        'The first pod was ready {:.1f}s {} than for {} ({:.1f}s){}.'.format(
+            abs(previous_seconds - seconds),
+            'sooner' if seconds <= previous_seconds else 'later',
+            previous['metadata']['name'], previous_seconds,
+            ', with the image already on build node {}'.format(build_node)
+            if build_node else ''))
+
+
+def _deploy(k8s, args, **kwargs):
+    """Deploys args.app with deployer.deploy_app and, with --wait, waits for
+    its pods to be ready. Returns False if either failed."""
+    kwargs.update(_deploy_options(args))
+    pods = None
+
+    if getattr(args, 'wait', False):
+        # Watch from before the deploy, to see when each pod becomes ready.
+        pods = readiness.PodReadiness(k8s, args.app)
+
+    try:
+        if pods and not pods.start(timeout=args.wait_timeout):
+            raise readiness.WaitTimeoutError(
+                'Couldn\'t list the pods of {} within {}s.'.format(
+                    args.app, args.wait_timeout))
+
+        start = time.time()
+        app_rc, _ = deployer.deploy_app(
+            k8s, args.app, readiness=pods, **kwargs)
+
+        if pods:
+            # The rollout has changed the replica count since app_rc was
+            # created.
+            if app_rc:
+                rc = k8s.get_replicationcontroller(app_rc['metadata']['name'])
+            else:
+                rc = deployer.get_replication_controller(k8s, args.app)
+            times = _wait_for_pods(pods, rc, start, args.wait_timeout)
+
+            if app_rc:
+                _report_first_ready(k8s, args.app, rc, times.first_ready)
+
+    except (rollout.RolloutError, readiness.PodFailedError,
+            readiness.WaitTimeoutError) as e:
+        logger.error(str(e))
+        return False
+
+    finally:
+        if pods:
+            pods.stop()
+
+    return True
+
+
 def deploy_image_command(args):
     """Updates an application with the given docker image."""
     args.app = args.app.lower()
 
-    k8s = Kubernetes(args.kubernetes_url, namespace='noelapp')
-    deployer.deploy_app(k8s, args.app, image=args.image)
+    k8s = _connect(args)
+
+    if not _deploy(k8s, args, image=args.image):
+        return False
 
     logger.info(
         'Application {} updated with image {}'.format(args.app, args.image))
 
 
+def _read_manifest(path):
+    """Reads app: image pairs from a YAML (or JSON) mapping."""
+    if path == '-':
+        manifest = yaml.safe_load(sys.stdin)
+    else:
+        with open(path) as f:
+            manifest = yaml.safe_load(f)
+
+    if not isinstance(manifest, dict):
+        raise ValueError(
+            '{} should map application names to images.'.format(path))
+
+    return sorted(
+        (str(app).lower(), image) for app, image in manifest.items())
+
+
+def deploy_batch_command(args):
+    """Deploys many applications, each with its own image, at once."""
+    try:
+        images = _read_manifest(args.manifest)
+    except (IOError, ValueError, yaml.YAMLError) as e:
+        logger.error(str(e))
+        return False
+
+    # Every rollout holds a connection open to watch its pods.
+    k8s = _connect(
+        args, pool_maxsize=max(DEFAULT_POOL_MAXSIZE, args.concurrency * 2))
+
+    results = deployer.deploy_apps(
+        k8s, images, concurrency=args.concurrency, **_deploy_options(args))
+
+    print('{:<30} {:>9}  {}'.format('APP', 'SECONDS', 'RESULT'))
+    for result in sorted(results, key=lambda result: -result.seconds):
+        print('{:<30} {:>9.1f}  {}'.format(
+            result.app, result.seconds,
+            'failed: {}'.format(result.error) if result.error else
+            'deployed' if result.deployed else 'unchanged'))
+
+    failed = [result.app for result in results if result.error]
+    logger.info('Deployed {} of {} applications, {} failed.'.format(
+        len([result for result in results if result.deployed]),
+        len(results), len(failed)))
+
+    if failed:
+        logger.error('Failed: {}'.format(', '.join(failed)))
+        return False
+
+
 def delete_app_command(args):
-    """Deletes an app and all cluster resources associated with it."""
-    args.app = args.app.lower()
+    """Deletes apps and all cluster resources associated with them."""
+    apps = [app.lower() for app in args.apps or [args.app]]
+
+    k8s = _connect(args)
+
+    if args.selector:
+        deleted = deployer.delete_apps(k8s, label_selector=args.selector)
+    else:
+        deleted = deployer.delete_apps(k8s, apps=apps)
 
-    k8s = Kubernetes(args.kubernetes_url, namespace='noelapp')
-    deployer.delete_app(k8s, args.app)
+    if not deleted:
+        logger.warning('No applications found to delete.')
 
-    logger.info('Application {} deleted'.format(args.app))
+    for app in deleted:
+        logger.info('Application {} deleted'.format(app))
 
 
 def get_config_command(args):
     """Gets the current configuration values for an application."""
     args.app = args.app.lower()
 
-    k8s = Kubernetes(args.kubernetes_url, namespace='noelapp')
+    k8s = _connect(args)
     config = deployer.get_config(k8s, args.app)
 
     if not config:
         logger.error('No config for app {}'.format(args.app))
         return False
 
-    for k, v in config['data'].iteritems():
+    for k, v in sorted(config['data'].items()):
         print('{}: {}'.format(k, v))
 
 
@@ -63,26 +233,170 @@ def set_config_command(args):
 
     data = {pair[0]: pair[1] for pair in [x.split('=', 1) for x in args.pairs]}
 
-    k8s = Kubernetes(args.kubernetes_url, namespace='noelapp')
-    config = deployer.update_config(k8s, args.app, data)
-    deployer.deploy_app(k8s, args.app, config=config)
+    k8s = _connect(args)
+    config = deployer.update_config(
+        k8s, args.app, data, unset=args.unset,
+        apply_pending=not args.no_deploy)
+
+    if data or args.unset:
+        logger.info('Config updated for app {}'.format(args.app))
+
+    if args.no_deploy or not deployer.get_replication_controller(
+            k8s, args.app):
+        logger.info('The config will apply from the next deploy.')
+        return
+
+    if args.debounce:
+        # Leave the deploy to a later update, so that a burst of updates
+        # only rolls out once. Updates made with --no-deploy don't deploy,
+        # so they're rolled out here, with the latest config.
+        time.sleep(args.debounce)
+        latest = deployer.get_config(k8s, args.app)
+        version = (config or {}).get('metadata', {}).get('resourceVersion')
+
+        if latest and latest['metadata']['resourceVersion'] != version and (
+                deployer.apply_pending(latest)):
+            logger.info(
+                'The config changed again, leaving the deploy to that '
+                'change.')
+            return
+
+        config = latest
+
+    reload_path = settings.get_settings(k8s, args.app)['reload_path']
+
+    if reload_path:
+        return _reload_config(k8s, args.app, config, reload_path)
+
+    if not _deploy(k8s, args, config=config):
+        return False
+
+
+def _reload_config(k8s, app, config, reload_path):
+    start = time.time()
+    results = deployer.reload_config(k8s, app, config, reload_path)
+    failed = [(pod, error) for pod, error in results if error]
+
+    for pod, error in failed:
+        logger.error('Pod {} didn\'t reload its config: {}'.format(pod, error))
+
+    if failed:
+        logger.error(
+            'Redeploy with deploy-image --force to restart every pod with the '
+            'new config.')
+        return False
+
+    logger.info('{} pods of app {} reloaded their config in {:.1f}s.'.format(
+        len(results), app, time.time() - start))
+
+
+def settings_command(args):
+    """Gets or changes the deployment settings for an application."""
+    args.app = args.app.lower()
+
+    k8s = _connect(args)
+
+    if not args.pairs:
+        app_settings = settings.get_settings(k8s, args.app)
+        for name, value in sorted(app_settings.items()):
+            print('{}: {}'.format(name, value))
+        return
+
+    try:
+        changes = settings.parse(args.pairs)
+    except ValueError as e:
+        logger.error(str(e))
+        return False
+
+    return _update_settings(k8s, args, changes)
 
-    logger.info('Config updated for app {}'.format(args.app))
+
+def _update_settings(k8s, args, changes):
+    try:
+        app_settings = settings.update_settings(k8s, args.app, changes)
+    except ValueError as e:
+        logger.error(str(e))
+        return False
+
+    logger.info('Settings updated for app {}'.format(args.app))
+
+    if args.no_deploy or not deployer.get_replication_controller(
+            k8s, args.app):
+        logger.info('The settings will apply from the next deploy.')
+        return
+
+    if not _deploy(k8s, args, app_settings=app_settings):
+        return False
+
+
+def resources_command(args):
+    """Gets or changes the CPU and memory requests and limits for an
+    application."""
+    args.app = args.app.lower()
+
+    k8s = _connect(args)
+
+    if args.missing:
+        for app, app_settings in sorted(settings.iter_app_settings(k8s)):
+            if not resources.has_requests(app_settings):
+                print(app)
+        return
+
+    values = {
+        'cpu_request': args.cpu,
+        'memory_request': args.memory,
+        'cpu_limit': args.cpu_limit,
+        'memory_limit': args.memory_limit,
+    }
+    current = settings.get_settings(k8s, args.app)
+
+    if all(value is None for value in values.values()):
+        for name in sorted(values):
+            print('{}: {}'.format(name, current[name]))
+        if not resources.has_requests(current):
+            logger.warning(
+                'App {} has no CPU or memory request.'.format(args.app))
+        return
+
+    try:
+        changes = settings.parse(
+            '{}={}'.format(name, value) for name, value in values.items()
+            if value is not None)
+    except ValueError as e:
+        logger.error(str(e))
+        return False
+
+    app_settings = dict(current, **changes)
+    rc = deployer.get_replication_controller(k8s, args.app)
+    errors, warnings = resources.check(
+        k8s, app_settings, replicas=rc['spec'].get('replicas', 1) if rc else 1,
+        current_settings=current if rc else None)
+
+    for warning in warnings:
+        logger.warning(warning)
+
+    for error in errors:
+        logger.error(error)
+
+    if errors:
+        return False
+
+    return _update_settings(k8s, args, changes)
 
 
 def logs_command(args):
     """Gets (or streams) the logs for an application."""
     args.app = args.app.lower()
 
-    k8s = Kubernetes(args.kubernetes_url, namespace='noelapp')
-    pods = k8s.pods(params={
+    k8s = _connect(args)
+    pods = k8s.iter_pods(params={
         'labelSelector': 'noel-app={}'.format(args.app)})
+    pod = next(pods, None)
 
-    if not pods['items']:
+    if not pod:
         logger.error('No running pods found for app {}'.format(args.app))
         return False
 
-    pod = pods['items'].pop()
     logger.info('Using pod {}'.format(pod['metadata']['name']))
 
     if args.follow:
@@ -106,7 +420,7 @@ def scale_command(args):
     """Scales the number of replicas for an application."""
     args.app = args.app.lower()
 
-    k8s = Kubernetes(args.kubernetes_url, namespace='noelapp')
+    k8s = _connect(args)
 
     rc = deployer.get_replication_controller(k8s, args.app)
 
@@ -115,10 +429,174 @@ def scale_command(args):
             'No replication controller found for app {}.'.format(args.app))
         return False
 
-    k8s.scale(rc['metadata']['name'], replicas=args.replicas)
+    if deployer.get_autoscaler(k8s, args.app):
+        logger.warning(
+            'App {} is autoscaled, the autoscaler may change its replicas '
+            'again.'.format(args.app))
+
+    if not args.wait:
+        k8s.scale(rc['metadata']['name'], replicas=args.replicas)
+        logger.info(
+            'Scaled app {} to {} replicas.'.format(args.app, args.replicas))
+        return
+
+    pods = readiness.PodReadiness(k8s, args.app)
+
+    try:
+        if not pods.start(timeout=args.wait_timeout):
+            logger.error('Couldn\'t list the pods of {} within {}s.'.format(
+                args.app, args.wait_timeout))
+            return False
+
+        start = time.time()
+        rc = k8s.scale(rc['metadata']['name'], replicas=args.replicas)
+        logger.info(
+            'Scaled app {} to {} replicas.'.format(args.app, args.replicas))
+
+        _wait_for_pods(pods, rc, start, args.wait_timeout)
+    except (readiness.PodFailedError, readiness.WaitTimeoutError) as e:
+        logger.error(str(e))
+        return False
+    finally:
+        pods.stop()
+
+
+def rollback_command(args):
+    """Rolls an application back to a previous version."""
+    args.app = args.app.lower()
+
+    k8s = _connect(args)
+
+    try:
+        rc = deployer.rollback(
+            k8s, args.app, to=args.to,
+            max_surge=args.max_surge,
+            max_unavailable=args.max_unavailable,
+            rollout_timeout=args.rollout_timeout)
+    except (ValueError, rollout.RolloutError) as e:
+        logger.error(str(e))
+        return False
+
+    logger.info('Application {} rolled back to {}'.format(
+        args.app, rc['metadata']['name']))
+
+
+def versions_command(args):
+    """Lists the versions of an application that can be rolled back to."""
+    args.app = args.app.lower()
+
+    k8s = _connect(args)
+    rcs = deployer.get_versions(k8s, args.app)
+    current = plan.current_replication_controller(rcs)
+
+    if not rcs:
+        logger.error('No versions found for app {}'.format(args.app))
+        return False
+
+    print('{:<2}{:<40} {:>8}  {:<20}  {:>11}  {}'.format(
+        '', 'VERSION', 'REPLICAS', 'DEPLOYED', 'FIRST READY', 'IMAGE'))
+
+    for rc in rcs:
+        annotations = rc['metadata'].get('annotations') or {}
+        first_ready = annotations.get(plan.FIRST_READY)
+        print('{:<2}{:<40} {:>8}  {:<20}  {:>11}  {}'.format(
+            '*' if rc is current else '',
+            rc['spec']['template']['metadata']['labels']['build-version'],
+            rc['spec'].get('replicas', 0),
+            annotations.get(plan.DEPLOYED_AT, '-'),
+            '{}s'.format(first_ready) if first_ready else '-',
+            rc['spec']['template']['spec']['containers'][0]['image']))
+
+
+def autoscale_command(args):
+    """Scales an application automatically with its CPU usage."""
+    args.app = args.app.lower()
+
+    k8s = _connect(args)
+
+    if args.delete:
+        if not deployer.delete_autoscaler(k8s, args.app):
+            logger.warning('App {} isn\'t autoscaled.'.format(args.app))
+            return
+        logger.info('Stopped autoscaling app {}.'.format(args.app))
+        return
+
+    if args.max is None:
+        logger.error('--max is required.')
+        return False
+
+    try:
+        deployer.autoscale(
+            k8s, args.app, args.min, args.max, args.cpu_percent)
+    except ValueError as e:
+        logger.error(str(e))
+        return False
 
     logger.info(
-        'Scaled app {} to {} replicas.'.format(args.app, args.replicas))
+        'Autoscaling app {} between {} and {} replicas at {}% CPU.'.format(
+            args.app, args.min, args.max, args.cpu_percent))
+
+
+def add_rollout_arguments(parser):
+    parser.add_argument(
+        '--max-surge',
+        type=int,
+        default=rollout.DEFAULT_MAX_SURGE,
+        help='How many pods above the app\'s replica count a rolling update '
+             'may start.')
+    parser.add_argument(
+        '--max-unavailable',
+        type=int,
+        default=rollout.DEFAULT_MAX_UNAVAILABLE,
+        help='How many of the app\'s replicas may be unavailable during a '
+             'rolling update.')
+    parser.add_argument(
+        '--rollout-timeout',
+        type=int,
+        default=rollout.DEFAULT_TIMEOUT,
+        help='Seconds to wait for new pods to become ready before rolling '
+             'back.')
+
+
+def add_deploy_arguments(parser):
+    add_rollout_arguments(parser)
+    parser.add_argument(
+        '--retain',
+        type=int,
+        default=deployer.DEFAULT_RETAINED_VERSIONS,
+        help='How many previous versions to keep, at zero replicas, for '
+             'noel rollback.')
+    parser.add_argument(
+        '--force',
+        default=False,
+        action='store_true',
+        help='Deploy a new replication controller even if the app is already '
+             'running the same spec, restarting every pod.')
+    parser.add_argument(
+        '--prepull',
+        default=False,
+        action='store_true',
+        help='Pull a new image onto every node before rolling it out, so '
+             'that new pods don\'t wait for it.')
+    parser.add_argument(
+        '--prepull-timeout',
+        type=int,
+        default=prepull.DEFAULT_TIMEOUT,
+        help='Seconds to wait for --prepull before rolling out anyway.')
+
+
+def add_wait_arguments(parser):
+    parser.add_argument(
+        '--wait',
+        default=False,
+        action='store_true',
+        help='Wait for the app\'s pods to be ready, and fail as soon as one '
+             'fails to start.')
+    parser.add_argument(
+        '--wait-timeout',
+        type=int,
+        default=rollout.DEFAULT_TIMEOUT,
+        help='Seconds to wait for pods with --wait.')
 
 
 def register_commands(subparsers):
@@ -133,16 +611,42 @@ def register_commands(subparsers):
         help=deploy_image_command.__doc__)
     deploy_image.set_defaults(func=deploy_image_command)
     deploy_image.add_argument(*app_args, **app_kwargs)
+    add_deploy_arguments(deploy_image)
+    add_wait_arguments(deploy_image)
     deploy_image.add_argument(
         'image',
         help='The docker image and tag to deploy, for example:'
              ' gcr.io/project-id/name:tag')
 
+    deploy_batch = subparsers.add_parser(
+        'deploy-batch',
+        help=deploy_batch_command.__doc__)
+    deploy_batch.set_defaults(func=deploy_batch_command)
+    add_deploy_arguments(deploy_batch)
+    deploy_batch.add_argument(
+        '--concurrency',
+        type=int,
+        default=deployer.DEFAULT_BATCH_CONCURRENCY,
+        help='How many applications to deploy at once.')
+    deploy_batch.add_argument(
+        'manifest',
+        help='A YAML or JSON file mapping application names to docker '
+             'images, or - to read it from stdin.')
+
     delete_app = subparsers.add_parser(
         'delete-app',
         help=delete_app_command.__doc__)
     delete_app.set_defaults(func=delete_app_command)
     delete_app.add_argument(*app_args, **app_kwargs)
+    delete_app.add_argument(
+        'apps',
+        nargs='*',
+        help='The applications to delete, instead of --app.')
+    delete_app.add_argument(
+        '--selector',
+        default=None,
+        help='Delete every application matching this label selector, for '
+             'example noel-app in (a,b).')
 
     get_config = subparsers.add_parser(
         'get-config',
@@ -155,10 +659,86 @@ def register_commands(subparsers):
         help=set_config_command.__doc__)
     set_config.set_defaults(func=set_config_command)
     set_config.add_argument(*app_args, **app_kwargs)
+    add_deploy_arguments(set_config)
+    add_wait_arguments(set_config)
+    set_config.add_argument(
+        'pairs',
+        nargs='*',
+        help='key=value pairs of config to set. With none, the app is '
+             'deployed with its current config.')
+    set_config.add_argument(
+        '--unset',
+        action='append',
+        default=[],
+        metavar='KEY',
+        help='A config key to remove. Can be given more than once.')
+    set_config.add_argument(
+        '--no-deploy',
+        default=False,
+        action='store_true',
+        help='Don\'t redeploy the app, so that more changes can be made '
+             'first.')
     set_config.add_argument(
+        '--debounce',
+        type=float,
+        default=0,
+        metavar='SECONDS',
+        help='Wait this long before redeploying or reloading, and leave it '
+             'to the next update if the config changed again in the '
+             'meantime, unless that update was made with --no-deploy.')
+
+    app_settings = subparsers.add_parser(
+        'settings',
+        help=settings_command.__doc__,
+        epilog='settings:\n' + '\n'.join(
+            textwrap.fill(
+                '{}: {}'.format(name, setting[2]),
+                initial_indent='  ', subsequent_indent='    ')
+            for name, setting in sorted(settings.SETTINGS.items())),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    app_settings.set_defaults(func=settings_command)
+    app_settings.add_argument(*app_args, **app_kwargs)
+    add_deploy_arguments(app_settings)
+    add_wait_arguments(app_settings)
+    app_settings.add_argument(
         'pairs',
-        nargs='+',
-        help='key=value pairs of config to set.')
+        nargs='*',
+        help='name=value pairs of settings to change. An empty value resets '
+             'a setting to its default. Prints the settings if none are '
+             'given.')
+    app_settings.add_argument(
+        '--no-deploy',
+        default=False,
+        action='store_true',
+        help='Don\'t redeploy the app with the new settings.')
+
+    app_resources = subparsers.add_parser(
+        'resources',
+        help=resources_command.__doc__)
+    app_resources.set_defaults(func=resources_command)
+    app_resources.add_argument(*app_args, **app_kwargs)
+    add_deploy_arguments(app_resources)
+    add_wait_arguments(app_resources)
+    for name, example in (
+            ('cpu', '250m'), ('memory', '256Mi'),
+            ('cpu-limit', '1'), ('memory-limit', '512Mi')):
+        app_resources.add_argument(
+            '--' + name,
+            default=None,
+            help='The {} for each pod, for example {}. An empty value '
+                 'removes it.'.format(
+                     name.replace('-', ' ') if 'limit' in name
+                     else name + ' request', example))
+    app_resources.add_argument(
+        '--missing',
+        default=False,
+        action='store_true',
+        help='List the apps that have no CPU or memory request.')
+    app_resources.add_argument(
+        '--no-deploy',
+        default=False,
+        action='store_true',
+        help='Don\'t redeploy the app with the new resources.')
 
     logs = subparsers.add_parser(
         'logs',
@@ -180,6 +760,54 @@ def register_commands(subparsers):
         help=scale_command.__doc__)
     scale.set_defaults(func=scale_command)
     scale.add_argument(*app_args, **app_kwargs)
+    add_wait_arguments(scale)
     scale.add_argument(
         'replicas',
+        type=int,
         help='The number of replicas.')
+
+    rollback = subparsers.add_parser(
+        'rollback',
+        help=rollback_command.__doc__)
+    rollback.set_defaults(func=rollback_command)
+    rollback.add_argument(*app_args, **app_kwargs)
+    add_rollout_arguments(rollback)
+    rollback.add_argument(
+        '--to',
+        default=None,
+        metavar='VERSION',
+        help='The version to roll back to, see noel versions. Defaults to '
+             'the one deployed before the current one.')
+
+    versions = subparsers.add_parser(
+        'versions',
+        help=versions_command.__doc__)
+    versions.set_defaults(func=versions_command)
+    versions.add_argument(*app_args, **app_kwargs)
+
+    autoscale = subparsers.add_parser(
+        'autoscale',
+        help=autoscale_command.__doc__)
+    autoscale.set_defaults(func=autoscale_command)
+    autoscale.add_argument(*app_args, **app_kwargs)
+    autoscale.add_argument(
+        '--min',
+        type=int,
+        default=1,
+        help='The minimum number of replicas.')
+    autoscale.add_argument(
+        '--max',
+        type=int,
+        default=None,
+        help='The maximum number of replicas.')
+    autoscale.add_argument(
+        '--cpu-percent',
+        type=int,
+        default=80,
+        help='The average CPU usage to aim for, as a percentage of what '
+             'each pod requests.')
+    autoscale.add_argument(
+        '--delete',
+        default=False,
+        action='store_true',
+        help='Stop autoscaling the app.')
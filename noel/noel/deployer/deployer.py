@@ -15,11 +15,56 @@
 """Logic for creating the necessary resources in Kubernetes to deploy a given
 application version."""
 
+from collections import namedtuple
+import json
+import threading
+import time
+
+import requests
+
 from noel.kubernetes import KubernetesError
-from noel.deployer import templates
+from noel.deployer import (
+    plan, prepull, readiness, resources, rollout, settings, templates)
+from noel.logger import logger
+from noel.ratelimit import backoff_delay
+from noel.utils import concurrently
+
+# Number of services to delete at once when deleting apps.
+DELETE_CONCURRENCY = 5
+
+# Number of previous versions kept at zero replicas for rollback.
+DEFAULT_RETAINED_VERSIONS = 2
+
+# Seconds to wait for the first pod to be scheduled onto the build node.
+PLACEMENT_TIMEOUT = 30
+
+# How many times to try a config update that races with others, and the
+# base delay between attempts.
+MAX_UPDATE_ATTEMPTS = 5
+UPDATE_BACKOFF_SECONDS = 0.1
 
+# Annotation on a config version whose writer is going to deploy or reload
+# it, which set-config --debounce leaves the deploy to.
+APPLY_PENDING = 'noel/apply-pending'
 
-def deploy_app(k8s, app, image=None, config=None):
+# Number of pods to ask to reload their config at once.
+RELOAD_CONCURRENCY = 10
+
+# Number of apps to deploy at once with deploy_apps.
+DEFAULT_BATCH_CONCURRENCY = 10
+
+# The outcome of deploying one app with deploy_apps. ``deployed`` is False if
+# the app was already running the image.
+DeployResult = namedtuple('DeployResult', 'app image deployed seconds error')
+
+
+def deploy_app(k8s, app, image=None, config=None, app_settings=None,
+               max_surge=rollout.DEFAULT_MAX_SURGE,
+               max_unavailable=rollout.DEFAULT_MAX_UNAVAILABLE,
+               rollout_timeout=rollout.DEFAULT_TIMEOUT,
+               force=False, fail_fast=False, readiness=None,
+               retain=DEFAULT_RETAINED_VERSIONS, prepull_timeout=None,
+               build_node=None):
     """Deploys an application version.
 
     An application version consists of two parts: an image and a configuration.
@@ -31,118 +76,488 @@ def deploy_app(k8s, app, image=None, config=None):
     A config is a per-application Kubernetes secret. The Kubernetes API resource
     generation determines a config's version.
 
-    The application version is '{image-tag}-{config-version}'. A deployment is
-    triggered whenever either the image or the config is updated. When one is
-    updated, the other is implied to be the current version.
+    The application version is '{image-tag}-{config-version}', followed by
+    a hash of the app's settings (see noel.deployer.settings) if it has any.
+    Apps with a reload_path setting use 'live' as their config version, so
+    config changes don't need a new version.
+    A deployment is triggered whenever either the image or the config is
+    updated. When one is updated, the other is implied to be the current
+    version.
 
     In both cases, a new replication controller will be created for the app
-    version and all existing replication controllers for the app will be turned
-    down.
+    version and traffic is moved over to it with a rolling update (see
+    noel.deployer.rollout), keeping the app at its current number of
+    replicas. The ``retain`` most recent old replication controllers are
+    kept at zero replicas for rollback(), the others deleted. If the new
+    pods don't become ready within ``rollout_timeout`` seconds, or with
+    ``fail_fast`` as soon as one of them fails to start, the old version is
+    restored and RolloutError is raised. ``readiness`` is passed on to the
+    rollout.
+
+    Replication controllers are annotated with a hash of their spec. If the
+    app is already running a replication controller with the same hash,
+    nothing is written and (None, None) is returned. ``force``
+    deploys a new replication controller regardless, restarting every pod.
+
+    If the app has an autoscaler (see autoscale()), it's moved over to the
+    new replication controller before the rollout, and back if the rollout
+    is rolled back, and the rollout keeps the replica count within the
+    autoscaler's bounds.
+
+    With ``prepull_timeout``, a new image is first pulled onto every node
+    (see noel.deployer.prepull), waiting up to that many seconds.
+
+    ``build_node`` is the node the image was built on, which already has
+    it. The first pod of a new version prefers that node, so it can start
+    without a pull; the preference is removed once it's scheduled.
     """
+    rcs = list(k8s.iter_replicationcontrollers(params={
+        'labelSelector': 'noel-app={}'.format(app)}))
+    current = plan.current_replication_controller(rcs)
+    current_image = plan.image_of(current) if current else None
 
     # Get the current version and image, if not specified.
     if not image:
-        image = get_current_image(k8s, app)
+        if not current:
+            raise ValueError(
+                "No replication controller found for {}".format(app))
+
+        image = current_image
 
     if not config:
         # Note: config can totally be None here. That's fine.
         config = get_config(k8s, app)
 
-    image_tag = image.rsplit(':').pop()
-    config_version = config['metadata']['resourceVersion'] if config else '0'
-    build_version = '{}-{}'.format(image_tag, config_version)
+    if not app_settings:
+        app_settings = settings.get_settings(k8s, app)
+
+    deploy = plan.plan_deploy(
+        app, rcs, image, config, app_settings, force=force,
+        max_surge=max_surge, build_node=build_node)
 
-    app_svc = create_service(k8s, app)
-    app_rc = create_replication_controller(
-        k8s, app, build_version, image, config)
-    turndown_old_replication_controllers(k8s, app, build_version)
+    if deploy.deployed:
+        logger.info('{} is already deployed.'.format(
+            deploy.rc['metadata']['name']))
+        retarget_autoscaler(k8s, app, deploy.rc['metadata']['name'])
+        return None, None
+
+    if deploy.rc_spec is None:
+        # An earlier rollout to this version didn't finish, or it's a
+        # retained version, pick it up.
+        app_rc = deploy.rc
+        app_svc, = apply(k8s, [[templates.app_service(name=app)]])
+
+    else:
+        if not resources.has_requests(app_settings):
+            logger.warning(
+                'App {} has no CPU or memory request, so its pods can be '
+                'scheduled onto full nodes. Set them with noel '
+                'resources.'.format(app))
+
+        if prepull_timeout and image != current_image:
+            _prepull(k8s, app, image, prepull_timeout)
+
+        # The service and replication controller don't depend on each other.
+        # The service may exist already from an earlier version.
+        app_svc, app_rc = apply(k8s, [[
+            templates.app_service(name=app), deploy.rc_spec]])
+
+        if deploy.build_node:
+            app_rc = _place_first_pod(
+                k8s, app, app_rc, deploy.build_node, readiness,
+                timeout=min(PLACEMENT_TIMEOUT, rollout_timeout))
+
+    _roll_out(
+        k8s, app, app_rc, deploy.old_rcs, deploy.replicas,
+        max_surge=max_surge,
+        max_unavailable=max_unavailable,
+        timeout=rollout_timeout,
+        fail_fast=fail_fast,
+        readiness=readiness)
+
+    if deploy.old_rcs:
+        _mark_deployed(k8s, app_rc)
+
+    turndown_old_replication_controllers(
+        k8s, app, deploy.build_version, retain=retain, rcs=deploy.old_rcs)
 
     return app_rc, app_svc
 
 
+def deploy_apps(k8s, images, concurrency=DEFAULT_BATCH_CONCURRENCY,
+                **options):
+    """Deploys many apps at once with deploy_app.
+
+    ``images`` is a list of (app, image) pairs. Up to ``concurrency`` apps
+    are deployed at a time, sharing the client ``k8s``, and ``options`` are
+    passed to each deploy_app call. A failed deploy doesn't stop the others.
+    Returns a DeployResult for each app, in order.
+    """
+    images = list(images)
+    lock = threading.Lock()
+    done = [0]
+
+    def deploy(item):
+        app, image = item
+        start = time.time()
+
+        try:
+            app_rc, _ = deploy_app(k8s, app, image=image, **options)
+            result = DeployResult(
+                app, image, app_rc is not None, time.time() - start, None)
+        except Exception as e:
+            logger.debug('Deploying {} failed.'.format(app), exc_info=True)
+            result = DeployResult(app, image, False, time.time() - start, e)
+
+        with lock:
+            done[0] += 1
+            logger.info('[{}/{}] {} {} in {:.1f}s'.format(
+                done[0], len(images), app,
+                'failed' if result.error else
+                'deployed' if result.deployed else 'unchanged',
+                result.seconds))
+
+        return result
+
+    return concurrently(deploy, images, concurrency)
+
+
+def rollback(k8s, app, to=None,
+             max_surge=rollout.DEFAULT_MAX_SURGE,
+             max_unavailable=rollout.DEFAULT_MAX_UNAVAILABLE,
+             rollout_timeout=rollout.DEFAULT_TIMEOUT):
+    """Rolls an app back to one of its retained versions: the one with the
+    build version (or replication controller name) ``to``, or else the one
+    that was deployed last before the current one.
+
+    The retained replication controller is scaled back up with a rolling
+    update, and the current one is kept at zero replicas, so it can be
+    rolled back to in turn. Returns the replication controller rolled back
+    to.
+    """
+    rcs = get_versions(k8s, app)
+    current = plan.current_replication_controller(rcs)
+
+    if not current:
+        raise ValueError('No replication controller found for {}'.format(app))
+
+    candidates = [rc for rc in rcs if rc is not current]
+
+    if to:
+        candidates = [
+            rc for rc in candidates
+            if to in (plan.version_of(rc), rc['metadata']['name'])]
+    else:
+        # Versions whose rollout failed were never deployed.
+        candidates = [
+            rc for rc in candidates if plan.annotation(rc, plan.DEPLOYED_AT)]
+
+    if not candidates:
+        raise ValueError('No {} to roll back to for {}.'.format(
+            'version {}'.format(to) if to else 'previous version', app))
+
+    target = candidates[0]
+    others = [rc for rc in rcs if rc is not target]
+
+    _roll_out(
+        k8s, app, target, others, sum(plan.replicas(rc) for rc in rcs),
+        max_surge=max_surge,
+        max_unavailable=max_unavailable,
+        timeout=rollout_timeout)
+    _mark_deployed(k8s, target)
+
+    return target
+
+
+def get_versions(k8s, app):
+    """Returns an app's replication controllers, the most recently deployed
+    first."""
+    rcs = list(k8s.iter_replicationcontrollers(params={
+        'labelSelector': 'noel-app={}'.format(app)}))
+    return sorted(rcs, key=plan.deploy_order, reverse=True)
+
+
+def _roll_out(k8s, app, new_rc, old_rcs, replicas, **options):
+    autoscaler = get_autoscaler(k8s, app)
+    previous = autoscaler_target(autoscaler)
+
+    # Left on the old version, the autoscaler would scale it back up while
+    # the rollout scales it down. It leaves a replication controller with
+    # no replicas alone, so it only starts resizing the new one once the
+    # rollout has scaled that up.
+    retarget_autoscaler(k8s, app, new_rc['metadata']['name'])
+
+    if not old_rcs:
+        return
+
+    try:
+        rollout.Rollout(
+            k8s, app, new_rc, old_rcs,
+            plan.rollout_replicas(replicas, autoscaler), **options).run()
+    except rollout.RolloutError as e:
+        if e.rolled_back and previous:
+            retarget_autoscaler(k8s, app, previous)
+        raise
+
+
+def _prepull(k8s, app, image, timeout):
+    start = time.time()
+
+    # Pre-pulling only speeds the rollout up, so it mustn't stop it, whether
+    # the pods can't be created, DaemonSets can't be (or aren't allowed to
+    # be) written, or the API server can't be reached.
+    try:
+        results = prepull.prepull(k8s, app, image, timeout=timeout)
+    except (prepull.PrepullError, KubernetesError,
+            requests.RequestException) as e:
+        logger.warning('Couldn\'t pre-pull {}, rolling out anyway: {}'.format(
+            image, e))
+        return
+
+    for result in results:
+        if result.error:
+            logger.warning('Node {} didn\'t pull {}: {}'.format(
+                result.node, image, result.error))
+        else:
+            logger.info('Node {} had {} after {:.1f}s.'.format(
+                result.node, image, result.seconds))
+
+    pulled = [result for result in results if not result.error]
+    logger.info('Pre-pulled {} on {} of {} nodes in {:.1f}s.'.format(
+        image, len(pulled), len(results), time.time() - start))
+
+
+def _place_first_pod(k8s, app, rc, build_node, pods=None,
+                     timeout=PLACEMENT_TIMEOUT):
+    """Starts the first pod of a new replication controller, which prefers
+    the build node, and then removes the preference so the rest of the
+    pods are spread as usual. Returns the updated replication controller."""
+    name = rc['metadata']['name']
+    own_pods = pods is None
+
+    try:
+        if own_pods:
+            pods = readiness.PodReadiness(k8s, app)
+            if not pods.start(timeout=timeout):
+                raise rollout.RolloutError(
+                    'Couldn\'t list the pods of {} within {}s.'.format(
+                        app, timeout), [], False)
+
+        if not plan.replicas(rc):
+            k8s.scale(name, 1)
+
+        node = pods.wait_for_scheduled(
+            plan.version_of(rc), timeout=timeout)
+    finally:
+        if own_pods:
+            pods.stop()
+
+    if node == build_node:
+        logger.info(
+            'The first pod of {} is on build node {}, which already has its '
+            'image.'.format(name, node))
+    elif node:
+        logger.info(
+            'The first pod of {} is on {}, not build node {}.'.format(
+                name, node, build_node))
+    else:
+        logger.warning(
+            'The first pod of {} wasn\'t scheduled within {}s.'.format(
+                name, timeout))
+
+    return k8s.patch_replicationcontroller(name, {
+        'spec': {'template': {'spec': {'affinity': None}}}})
+
+
+def get_build_node(rc):
+    """Returns the node that a version's image was built on, if known."""
+    return plan.annotation(rc, plan.BUILD_NODE)
+
+
+def record_first_ready(k8s, app, rc, seconds):
+    """Records how long the first pod of a version took to be ready, and
+    returns the version deployed before it and its time, or (None, None) if
+    that wasn't recorded."""
+    name = rc['metadata']['name']
+    k8s.patch_replicationcontroller(name, {'metadata': {'annotations': {
+        plan.FIRST_READY: '{:.1f}'.format(seconds)}}})
+
+    previous = [
+        version for version in get_versions(k8s, app)
+        if version['metadata']['name'] != name and
+        plan.annotation(version, plan.FIRST_READY)]
+
+    if not previous:
+        return None, None
+
+    return previous[0], float(
+        plan.annotation(previous[0], plan.FIRST_READY))
+
+
+def _mark_deployed(k8s, rc):
+    k8s.patch_replicationcontroller(rc['metadata']['name'], {
+        'metadata': {'annotations': {plan.DEPLOYED_AT: plan.now()}}})
+
+
 def delete_app(k8s, app):
-    delete_config(k8s, app)
-    delete_service(k8s, app)
-    turndown_old_replication_controllers(k8s, app, 'delete')
+    delete_apps(k8s, apps=[app])
 
 
-def get_current_image(k8s, app):
-    rc = get_replication_controller(k8s, app)
+def delete_apps(k8s, apps=(), label_selector=None):
+    """Deletes apps and all cluster resources associated with them, either
+    the named ``apps`` or every app matching ``label_selector``.
 
-    if not rc:
-        raise ValueError("No replication controller found for {}".format(app))
+    Replication controllers, pods and configs are deleted with one request
+    each, however many apps and versions there are. Services can't be
+    deleted by selector, so they're deleted one by one. Returns the names of
+    the apps that had replication controllers or services.
+    """
+    if not label_selector:
+        if not apps:
+            raise ValueError('No apps or label selector given.')
+        label_selector = 'noel-app in ({})'.format(','.join(apps))
+
+    services = [
+        service['metadata']['name'] for service in k8s.iter_services(
+            params={'labelSelector': label_selector})]
+    # Services and configs created before they were labelled are deleted by
+    # name.
+    services = sorted(set(services).union(apps))
+
+    results = concurrently(lambda delete: delete(), [
+        lambda: k8s.delete_replicationcontrollers(label_selector),
+        lambda: delete_configs(k8s, label_selector, apps),
+        lambda: k8s.delete_horizontalpodautoscalers(label_selector)] + [
+        lambda name=name: delete_service(k8s, name) for name in services],
+        DELETE_CONCURRENCY)
+
+    # The replication controllers' pods are garbage collected in the
+    # background, deleting them now stops them straight away.
+    k8s.delete_pods(label_selector)
 
-    return rc['spec']['template']['spec']['containers'][0]['image']
+    deleted = set(
+        rc['metadata'].get('labels', {}).get('noel-app')
+        for rc in results[0].get('items') or [])
+    deleted.update(
+        name for name, result in zip(services, results[3:]) if result)
+    deleted.discard(None)
+
+    return sorted(deleted)
+
+
+def apply(k8s, groups):
+    """Applies groups of specs with Kubernetes.apply_many, leaving objects
+    that already exist alone. Returns the created objects (None for existing
+    ones) and raises the first error."""
+    results = k8s.apply_many(groups, on_conflict='skip')
+
+    for result in results:
+        logger.debug('{} {} {} in {:.0f}ms'.format(
+            result.kind, result.name, result.action,
+            result.duration * 1000))
+
+    for result in results:
+        if result.error:
+            raise result.error
+
+    return [result.object for result in results]
 
 
 def get_replication_controller(k8s, app):
-    # TODO: It's possible for this to get multiple RCs.
-    # Think of a way to deal with that.
     results = k8s.replicationcontrollers(params={
         'labelSelector': 'noel-app={}'.format(app)
     })
 
-    if results.get('items'):
-        return results['items'].pop()
+    return plan.current_replication_controller(results.get('items') or [])
 
-    return None
+
+def turndown_old_replication_controllers(k8s, app, build_version, retain=0,
+                                         rcs=()):
+    """Deletes an app's old versions, except the ``retain`` most recently
+    deployed ones out of ``rcs``, which should be at zero replicas."""
+    # One request deletes every old version. Their pods are deleted in the
+    # background by the garbage collector.
+    k8s.delete_replicationcontrollers(
+        plan.turndown_selector(app, build_version, rcs, retain=retain))
+
+
+def get_autoscaler(k8s, app):
+    try:
+        return k8s.get_horizontalpodautoscaler(app)
+    except KubernetesError:
+        return None
 
 
-def create_replication_controller(k8s, app, build_version, image, config):
-    rc_spec = templates.app_replicationcontroller(
+def autoscale(k8s, app, min_replicas, max_replicas, cpu_percent):
+    """Creates or updates a horizontal pod autoscaler for an app, which
+    keeps the app's current replication controller between
+    ``min_replicas`` and ``max_replicas``, aiming for ``cpu_percent`` of
+    each pod's requested CPU. deploy_app moves it to every new version.
+    """
+    if not 1 <= min_replicas <= max_replicas:
+        raise ValueError(
+            'Replicas should be at least 1 and min no more than max.')
+
+    if cpu_percent <= 0:
+        raise ValueError('The CPU target should be positive.')
+
+    rc = get_replication_controller(k8s, app)
+
+    if not rc:
+        raise ValueError('No replication controller found for {}'.format(app))
+
+    result = k8s.apply(templates.app_autoscaler(
         name=app,
-        build_version=build_version,
-        image=image,
-        config=config)
-    return k8s.create_replicationcontroller(rc_spec)
+        rc_name=rc['metadata']['name'],
+        min_replicas=min_replicas,
+        max_replicas=max_replicas,
+        cpu_percent=cpu_percent))
 
+    if result.error:
+        raise result.error
 
-def turndown_old_replication_controllers(k8s, app, build_version):
-    rcs = get_old_replication_controllers(k8s, app, build_version)
+    return result.object
 
-    for rc in rcs:
-        turndown_replication_controller(k8s, rc)
 
+def autoscaler_target(autoscaler):
+    """Returns the name of the replication controller an autoscaler
+    scales, or None without an autoscaler."""
+    if not autoscaler:
+        return None
 
-def turndown_replication_controller(k8s, rc):
-    # NOTE: Presently this just scales to zero and then deletes. In the future
-    # the Kubernetes deployment API can handle doing a rolling update for us.
-    if rc['status']['replicas'] != 0:
-        k8s.scale(rc['metadata']['name'], 0)
-    k8s.delete_replicationcontroller(rc['metadata']['name'])
+    return autoscaler['spec']['scaleTargetRef']['name']
 
 
-def get_old_replication_controllers(k8s, app, build_version):
-    rcs = k8s.replicationcontrollers(params={
-        'labelSelector': 'noel-app={},build-version!={}'.format(
-            app, build_version)
-    }).get('items', [])
+def retarget_autoscaler(k8s, app, rc_name):
+    """Points an app's autoscaler, if it has one, at a replication
+    controller."""
+    autoscaler = get_autoscaler(k8s, app)
 
-    return rcs
+    if not autoscaler:
+        return None
 
+    if autoscaler_target(autoscaler) == rc_name:
+        return autoscaler
 
-def create_service(k8s, app):
-    """Creates a service for the application, if needed.
+    logger.info('Autoscaling {} now.'.format(rc_name))
+
+    return k8s.patch_horizontalpodautoscaler(app, {
+        'spec': {'scaleTargetRef': {'name': rc_name}}})
 
-    Every app needs a service so that traffic can be routed to it, both inside
-    and outside of the cluster. Typically, the app service is not directly
-    exposed outside of the cluster, instead, the http-frontend service handles
-    proxying outside traffic.
-    """
-    try:
-        return k8s.get_service(app)
-    except KubernetesError:
-        pass
 
-    service_spec = templates.app_service(name=app)
-    return k8s.create_service(service_spec)
+def delete_autoscaler(k8s, app):
+    """Deletes an app's autoscaler, returning whether it had one."""
+    result = k8s.delete_horizontalpodautoscalers('noel-app={}'.format(app))
+    return bool(result.get('items'))
 
 
 def delete_service(k8s, app):
+    """Deletes an app's service, returning whether it existed."""
     try:
         k8s.delete_service(app)
+        return True
     except KubernetesError:
-        pass
+        return False
 
 
 def get_config(k8s, app):
@@ -152,23 +567,89 @@ def get_config(k8s, app):
         return None
 
 
-def update_config(k8s, app, config):
-    try:
-        existing = k8s.get_secret(app)
-    except KubernetesError:
-        existing = None
+def update_config(k8s, app, config, unset=(), apply_pending=False):
+    """Sets the values in ``config`` and removes the keys in ``unset`` from
+    an app's config, all in one new version of it, and returns the config.
+    ``apply_pending`` marks the new version as one the caller is going to
+    deploy or reload (see apply_pending()).
 
-    if existing:
-        current_config = existing['data']
-        current_config.update(config)
-        config = current_config
+    Nothing is written if that changes nothing. The write fails if the
+    config changed since it was read, in which case the changes are applied
+    to the new config and written again, so concurrent updates don't lose
+    each other's values.
+    """
+    for attempt in range(MAX_UPDATE_ATTEMPTS):
+        existing = get_config(k8s, app)
+
+        data = dict(existing['data']) if existing else {}
+        data.update(config)
+        for key in unset:
+            data.pop(key, None)
+
+        if existing and data == existing['data']:
+            return existing
+        elif not existing and not data:
+            return None
+
+        secret = templates.app_secret(app, data)
+        if apply_pending:
+            secret['metadata'].setdefault('annotations', {})[
+                APPLY_PENDING] = 'true'
+
+        try:
+            if existing:
+                # The resourceVersion makes the replace fail if the config
+                # changed since it was read.
+                secret['metadata']['resourceVersion'] = (
+                    existing['metadata']['resourceVersion'])
+                result = k8s.replace_secret(secret)
+            else:
+                result = k8s.create_secret(secret)
+        except KubernetesError as e:
+            status = e.httperror.response.status_code
+            if status != 409 or attempt == MAX_UPDATE_ATTEMPTS - 1:
+                raise
+        else:
+            # Decoded, like get_config returns it.
+            result['data'] = data
+            return result
+
+        time.sleep(backoff_delay(attempt, UPDATE_BACKOFF_SECONDS, 2))
+
+
+def apply_pending(config):
+    """Returns whether the writer of a config version is going to deploy or
+    reload it."""
+    annotations = config['metadata'].get('annotations') or {}
+    return annotations.get(APPLY_PENDING) == 'true'
+
+
+def reload_config(k8s, app, config, reload_path,
+                  concurrency=RELOAD_CONCURRENCY):
+    """Asks each of an app's ready pods to reload its config, by POSTing
+    the config values as a JSON object to ``reload_path`` through the API
+    server's pod proxy. The pods keep running, and the mounted config files
+    catch up within a minute or so.
+
+    Returns a list of (pod name, error) pairs, where error is None for pods
+    that reloaded.
+    """
+    pods = [
+        pod['metadata']['name'] for pod in k8s.iter_pods(
+            params={'labelSelector': 'noel-app={}'.format(app)})
+        if readiness.is_ready(pod)]
+    body = json.dumps((config or {}).get('data') or {}, sort_keys=True)
 
-    secret = templates.app_secret(app, config)
+    def reload(pod):
+        try:
+            k8s.proxy_pod(
+                pod, reload_path, port=templates.APP_PORT, method='POST',
+                data=body)
+            return pod, None
+        except (KubernetesError, requests.RequestException) as e:
+            return pod, e
 
-    if existing:
-        return k8s.replace_secret(secret)
-    else:
-        return k8s.create_secret(secret)
+    return concurrently(reload, pods, concurrency)
 
 
 def delete_config(k8s, app):
@@ -176,3 +657,14 @@ def delete_config(k8s, app):
         k8s.delete_secret(app)
     except KubernetesError:
         pass
+
+
+def delete_configs(k8s, label_selector, apps=()):
+    """Deletes the configs matching a label selector, and those of the
+    named ``apps`` that aren't labelled."""
+    result = k8s.delete_secrets(label_selector)
+    deleted = set(
+        secret['metadata']['name'] for secret in result.get('items') or [])
+
+    for app in set(apps) - deleted:
+        delete_config(k8s, app)
@@ -0,0 +1,208 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""What a deploy does, worked out from an app's replication controllers
+without talking to Kubernetes.
+
+noel.deployer.deployer and noel.deployer.aiodeployer both deploy with these,
+so that a version is named, hashed, rolled out and retained the same way
+whichever client deploys it.
+"""
+
+from collections import namedtuple
+import hashlib
+import json
+import time
+
+from noel.deployer import rollout, settings, templates
+
+# Annotation holding the hash of a replication controller's spec.
+SPEC_HASH = 'noel/spec-hash'
+# Annotation holding when a replication controller last became the app's
+# current version.
+DEPLOYED_AT = 'noel/deployed-at'
+
+# The node an image was built on, if it was built in the cluster, and how
+# long the first pod of a version took to be ready, in seconds.
+BUILD_NODE = 'noel/build-node'
+FIRST_READY = 'noel/first-ready-seconds'
+
+# What deploying a version takes. ``rc_spec`` is a new replication
+# controller to create and roll out to; if it's None, ``rc`` is an existing
+# one with the same spec, which an earlier rollout didn't finish, unless
+# ``deployed`` says the app is running it already. ``replicas`` is how many
+# pods the app should end up with, and ``build_node`` the node its first pod
+# is placed on, if any.
+DeployPlan = namedtuple(
+    'DeployPlan',
+    'build_version rc rc_spec old_rcs replicas build_node deployed')
+
+
+def build_version(image, config, app_settings):
+    """Returns the version name for an image, config and settings: see
+    noel.deployer.deployer.deploy_app."""
+    image_tag = image.rsplit(':').pop()
+    config_version = config['metadata']['resourceVersion'] if config else '0'
+
+    # Apps that reload their config (see reload_config) keep their version
+    # when it changes.
+    if config and app_settings.get('reload_path'):
+        config_version = 'live'
+
+    version = '{}-{}'.format(image_tag, config_version)
+
+    settings_version = settings.version(app_settings)
+    if settings_version:
+        version = '{}-{}'.format(version, settings_version)
+
+    return version
+
+
+def plan_deploy(app, rcs, image, config, app_settings, force=False,
+                max_surge=rollout.DEFAULT_MAX_SURGE, build_node=None):
+    """Works out how to deploy ``image`` with ``config`` and
+    ``app_settings``, given the app's replication controllers ``rcs``.
+    Returns a DeployPlan."""
+    version = build_version(image, config, app_settings)
+
+    def render(version, replicas, preferred_node=None):
+        return templates.app_replicationcontroller(
+            name=app,
+            build_version=version,
+            image=image,
+            config=config,
+            replicas=replicas,
+            settings=app_settings,
+            preferred_node=preferred_node)
+
+    rc_hash = spec_hash(render(version, 0))
+    deployed = [rc for rc in rcs if annotation(rc, SPEC_HASH) == rc_hash]
+
+    if deployed and not force:
+        rc = current_replication_controller(deployed)
+        old_rcs = [other for other in rcs if other is not rc]
+
+        return DeployPlan(
+            build_version=version_of(rc),
+            rc=rc,
+            rc_spec=None,
+            old_rcs=old_rcs,
+            replicas=sum(replicas(other) for other in rcs),
+            build_node=None,
+            deployed=not any(replicas(other) for other in old_rcs))
+
+    total = sum(replicas(rc) for rc in rcs) if rcs else 1
+
+    # The same version with a different spec (or a forced deploy) needs a
+    # new name.
+    names = set(rc['metadata']['name'] for rc in rcs)
+    if '{}-{}'.format(app, version) in names:
+        suffix = '{:x}'.format(int(time.time())) if force else rc_hash[:6]
+        version = '{}-{}'.format(version, suffix)
+
+    # Placing the first pod needs room for one more pod than the app has.
+    if rcs and max_surge <= 0:
+        build_node = None
+
+    # With old versions running, the new one starts at zero replicas and is
+    # scaled up by the rollout. On the build node, it starts with the one
+    # pod that's placed there.
+    rc_spec = render(
+        version, 0 if rcs else 1 if build_node else total,
+        preferred_node=build_node)
+    annotations = rc_spec['metadata'].setdefault('annotations', {})
+    annotations[SPEC_HASH] = rc_hash
+    if not rcs:
+        annotations[DEPLOYED_AT] = now()
+    if build_node:
+        annotations[BUILD_NODE] = build_node
+
+    return DeployPlan(
+        build_version=version,
+        rc=None,
+        rc_spec=rc_spec,
+        old_rcs=list(rcs),
+        replicas=total,
+        build_node=build_node,
+        deployed=False)
+
+
+def rollout_replicas(replicas, autoscaler):
+    """Returns the replica count to roll out to, kept within the bounds of
+    the app's autoscaler, if it has one."""
+    if not autoscaler:
+        return replicas
+
+    return min(
+        max(replicas, autoscaler['spec'].get('minReplicas', 1)),
+        autoscaler['spec']['maxReplicas'])
+
+
+def turndown_selector(app, build_version, rcs, retain=0):
+    """Returns a label selector for an app's old versions out of ``rcs``,
+    leaving out ``build_version`` and the ``retain`` most recently deployed
+    others."""
+    keep = [build_version] + [
+        version_of(rc) for rc in sorted(rcs, key=deploy_order, reverse=True)
+        if version_of(rc) != build_version][:retain]
+
+    return 'noel-app={},build-version notin ({})'.format(app, ','.join(keep))
+
+
+def current_replication_controller(rcs):
+    """Returns the replication controller serving an app out of its
+    replication controllers: the one with the most replicas, and the newest
+    of those."""
+    rcs = sorted(
+        rcs,
+        key=lambda rc: (
+            replicas(rc), rc['metadata'].get('creationTimestamp')))
+    return rcs[-1] if rcs else None
+
+
+def spec_hash(rc_spec):
+    """Returns a hash of a replication controller spec, leaving out its
+    replica count, which changes without the version changing."""
+    rc_spec = dict(rc_spec, spec=dict(rc_spec['spec']))
+    del rc_spec['spec']['replicas']
+    data = json.dumps(rc_spec, sort_keys=True).encode('utf-8')
+    return hashlib.sha1(data).hexdigest()
+
+
+def image_of(rc):
+    return rc['spec']['template']['spec']['containers'][0]['image']
+
+
+def version_of(rc):
+    return rc['spec']['template']['metadata']['labels']['build-version']
+
+
+def deploy_order(rc):
+    """Sort key putting replication controllers in the order they were
+    last deployed."""
+    return (
+        annotation(rc, DEPLOYED_AT) or '',
+        rc['metadata'].get('creationTimestamp') or '')
+
+
+def annotation(obj, name):
+    return (obj['metadata'].get('annotations') or {}).get(name)
+
+
+def replicas(rc):
+    return rc['spec'].get('replicas', 0)
+
+
+def now():
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
@@ -0,0 +1,167 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Pulls a new image onto every node before it's rolled out.
+
+Without it, each node that gets a pod of the new version pulls the image
+when the pod starts, one after another as the rollout proceeds. A short-lived
+DaemonSet pulls it on all nodes at once instead, so that the rollout's pods
+start from a warm cache.
+"""
+
+from collections import namedtuple
+import time
+
+from noel.deployer import templates
+from noel.informer import Informer
+from noel.kubernetes import KubernetesError
+
+# Seconds to wait for the pulls before rolling out anyway.
+DEFAULT_TIMEOUT = 120
+
+# The container the DaemonSet's pods idle in once the image is pulled.
+PAUSE_IMAGE = 'registry.k8s.io/pause:3.9'
+
+# How often to check how many nodes the DaemonSet should run on.
+POLL_SECONDS = 1
+
+PULL_FAILURES = ('ErrImagePull', 'ImagePullBackOff', 'InvalidImageName')
+
+# How long after the start of prepull() a node had the image, or why it
+# didn't. ``seconds`` is None for nodes that didn't finish in time.
+PullResult = namedtuple('PullResult', 'node seconds error')
+
+
+class PrepullError(Exception):
+    """The DaemonSet couldn't create its pods."""
+
+
+def _pull_state(pod):
+    """Returns (pulled, failure reason) for a pre-pull pod."""
+    for status in pod.get('status', {}).get('initContainerStatuses') or []:
+        state = status.get('state') or {}
+
+        if status.get('imageID') or 'running' in state or (
+                'terminated' in state):
+            return True, None
+
+        reason = (state.get('waiting') or {}).get('reason')
+        if reason in PULL_FAILURES:
+            return False, reason
+
+    return False, None
+
+
+def _remove_stale(k8s, name, selector, deadline):
+    """Deletes a DaemonSet left behind by an earlier pre-pull of another
+    image, and waits for it to be gone. Its selector can't be changed, so
+    it can't be replaced."""
+    def get():
+        try:
+            return k8s.get_daemonset(name)
+        except KubernetesError as e:
+            if e.httperror.response.status_code == 404:
+                return None
+            raise
+
+    existing = get()
+    if not existing or existing['spec'].get('selector') == selector:
+        return
+
+    k8s.delete_daemonset(name)
+
+    while get() and time.time() < deadline:
+        time.sleep(POLL_SECONDS)
+
+
+def prepull(k8s, app, image, timeout=DEFAULT_TIMEOUT):
+    """Pulls ``image`` onto every node that the app could run on, waiting up
+    to ``timeout`` seconds. Returns a PullResult for each node, sorted by
+    node name. Raises PrepullError as soon as the DaemonSet fails to create
+    pods, for example because they don't fit in a quota, and
+    KubernetesError if it can't be written.
+
+    A DaemonSet left over from pre-pulling another image is deleted first.
+    The DaemonSet is deleted again before it returns, whether or not the
+    pulls finished.
+    """
+    name = 'noel-prepull-{}'.format(app)
+    spec = templates.image_puller(name, app, image, PAUSE_IMAGE)
+    selector = ','.join(
+        '{}={}'.format(key, value) for key, value in sorted(
+            spec['spec']['selector']['matchLabels'].items()))
+
+    start = time.time()
+    deadline = start + timeout
+    # Node -> PullResult, for nodes that pulled the image or failed to.
+    results = {}
+    pending = set()
+
+    def observe(event_type, pod):
+        node = pod.get('spec', {}).get('nodeName')
+        if not node or node in results or event_type == 'DELETED':
+            return
+
+        pulled, reason = _pull_state(pod)
+        if pulled or reason:
+            results[node] = PullResult(node, time.time() - start, reason)
+            pending.discard(node)
+        else:
+            pending.add(node)
+
+    informer = Informer(k8s, 'pods', label_selector=selector)
+    informer.add_handler(observe)
+    informer.start()
+
+    try:
+        _remove_stale(k8s, name, spec['spec']['selector'], deadline)
+
+        result = k8s.apply(spec)
+        if result.error:
+            raise result.error
+
+        daemonset = result.object or k8s.get_daemonset(name)
+        uid = daemonset['metadata'].get('uid')
+        # The controller reports pods it can't create as events.
+        failures = {'fieldSelector': 'reason=FailedCreate,{}'.format(
+            'involvedObject.uid={}'.format(uid) if uid else
+            'involvedObject.kind=DaemonSet,involvedObject.name={}'.format(
+                name))}
+
+        while time.time() < deadline:
+            status = k8s.get_daemonset(name).get('status') or {}
+            desired = status.get('desiredNumberScheduled')
+
+            failure = next(k8s.iter_events(params=failures), None)
+            if failure:
+                raise PrepullError(failure.get('message') or 'FailedCreate')
+
+            def done(_):
+                return desired is not None and len(results) >= desired
+
+            if informer.wait_until(done, timeout=min(
+                    POLL_SECONDS, max(deadline - time.time(), 0))):
+                break
+
+    finally:
+        informer.stop()
+        try:
+            k8s.delete_daemonset(name)
+        except KubernetesError:
+            pass
+
+    for node in pending - set(results):
+        results[node] = PullResult(node, None, 'timed out')
+
+    return [results[node] for node in sorted(results)]
@@ -0,0 +1,191 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tracks which of an application's pods are ready to serve traffic.
+
+PodReadiness watches an app's pods through an informer, so waiting for pods
+to become ready costs one list and one watch rather than a poll loop. It also
+notes when it first saw each pod ready, to report how long a deploy took to
+serve traffic.
+"""
+
+from collections import namedtuple
+import time
+
+from noel.informer import Informer
+
+# Container states that won't become ready without a new deploy.
+FAILURE_REASONS = (
+    'CrashLoopBackOff',
+    'ImagePullBackOff',
+    'ErrImagePull',
+    'InvalidImageName',
+    'CreateContainerConfigError',
+)
+
+# Seconds from the start of a wait until the first and the last of the
+# wanted pods were ready.
+ReadyTimes = namedtuple('ReadyTimes', 'first_ready all_ready')
+
+
+class PodFailedError(Exception):
+    """A pod failed in a way that it won't recover from by itself."""
+
+    def __init__(self, pod, reason):
+        super(PodFailedError, self).__init__(
+            'Pod {} is in {}.'.format(pod, reason))
+        self.pod = pod
+        self.reason = reason
+
+
+class WaitTimeoutError(Exception):
+    """Pods didn't become ready in time."""
+
+
+def is_ready(pod):
+    """Returns True if a pod is ready and isn't being deleted."""
+    if pod['metadata'].get('deletionTimestamp'):
+        return False
+
+    for condition in pod.get('status', {}).get('conditions') or []:
+        if condition.get('type') == 'Ready':
+            return condition.get('status') == 'True'
+
+    return False
+
+
+def failure(pod):
+    """Returns the reason a pod's containers are failing to start, or None
+    if they aren't."""
+    statuses = pod.get('status', {}).get('containerStatuses') or []
+
+    for status in statuses:
+        waiting = (status.get('state') or {}).get('waiting') or {}
+        if waiting.get('reason') in FAILURE_REASONS:
+            return waiting['reason']
+
+    return None
+
+
+class PodReadiness(object):
+    """Watches the pods of an application.
+
+    Use it as a context manager, or call start() and stop().
+    """
+
+    def __init__(self, k8s, app):
+        self._informer = Informer(
+            k8s, 'pods', label_selector='noel-app={}'.format(app))
+        # Pod name -> when it was first seen ready.
+        self._ready_at = {}
+        self._informer.add_handler(self._observe)
+
+    def start(self, timeout=None):
+        """Starts watching, waiting up to ``timeout`` seconds for the initial
+        list. Returns True if it completed."""
+        self._informer.start()
+        return self._informer.wait_for_sync(timeout)
+
+    def stop(self):
+        self._informer.stop()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def pods(self, build_version):
+        """Returns the pods of one version of the application."""
+        return self._informer.list('build-version={}'.format(build_version))
+
+    def ready(self, build_version):
+        """Returns the number of ready pods of a version."""
+        return len([pod for pod in self.pods(build_version) if is_ready(pod)])
+
+    def failures(self, build_version):
+        """Returns (pod name, reason) for the failing pods of a version."""
+        failures = []
+
+        for pod in self.pods(build_version):
+            reason = failure(pod)
+            if reason:
+                failures.append((pod['metadata']['name'], reason))
+
+        return failures
+
+    def wait_for_ready(self, build_version, count, timeout=None,
+                       fail_fast=False):
+        """Waits until at least ``count`` pods of a version are ready.
+        Returns the number of ready pods, which is less than ``count`` if
+        the wait timed out, or if a pod failed and ``fail_fast`` is set."""
+        def done(_):
+            return (self.ready(build_version) >= count or
+                    fail_fast and self.failures(build_version))
+
+        self._informer.wait_until(done, timeout)
+        return self.ready(build_version)
+
+    def wait_for_scheduled(self, build_version, timeout=None):
+        """Waits until a pod of a version is scheduled, and returns the
+        name of its node, or None if none was within ``timeout`` seconds."""
+        def scheduled(_):
+            return next((
+                pod['spec']['nodeName'] for pod in self.pods(build_version)
+                if pod.get('spec', {}).get('nodeName')), None)
+
+        return self._informer.wait_until(scheduled, timeout)
+
+    def wait(self, build_version, count, since, timeout=None):
+        """Waits until ``count`` pods of a version are ready and returns
+        ReadyTimes relative to the time ``since``. Pods that were ready
+        before then count as ready straight away.
+
+        Raises PodFailedError as soon as a pod fails to start, and
+        WaitTimeoutError if the pods aren't ready within ``timeout``
+        seconds.
+        """
+        ready = self.wait_for_ready(
+            build_version, count, timeout=timeout, fail_fast=True)
+
+        if ready < count:
+            failures = self.failures(build_version)
+            if failures:
+                raise PodFailedError(*failures[0])
+
+            raise WaitTimeoutError(
+                '{} of {} pods of {} ready after {}s.'.format(
+                    ready, count, build_version, timeout))
+
+        times = sorted(
+            max(0, self._ready_at.get(pod['metadata']['name'], since) - since)
+            for pod in self.pods(build_version) if is_ready(pod))
+
+        if not count:
+            return ReadyTimes(0, 0)
+
+        # The first pod that became ready during the wait, if any did.
+        first = next((t for t in times if t > 0), 0)
+        return ReadyTimes(first, times[count - 1])
+
+    def _observe(self, event_type, pod):
+        name = pod['metadata']['name']
+
+        if event_type == 'DELETED':
+            self._ready_at.pop(name, None)
+        elif is_ready(pod):
+            self._ready_at.setdefault(name, time.time())
+        else:
+            self._ready_at.pop(name, None)
@@ -0,0 +1,186 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""CPU and memory requests and limits for application pods.
+
+They're stored with the app's other settings (see noel.deployer.settings) as
+cpu_request, cpu_limit, memory_request and memory_limit, in Kubernetes
+quantity notation, and checked against the namespace's LimitRanges and
+ResourceQuotas before they're changed.
+"""
+
+import re
+
+# resource -> (request setting, limit setting)
+RESOURCES = {
+    'cpu': ('cpu_request', 'cpu_limit'),
+    'memory': ('memory_request', 'memory_limit'),
+}
+
+_QUANTITY = re.compile(
+    r'^(?P<number>[0-9]+(\.[0-9]*)?|\.[0-9]+)'
+    r'(?P<suffix>Ki|Mi|Gi|Ti|Pi|Ei|[numkMGTPE]|[eE][-+]?[0-9]+)?$')
+
+_SUFFIXES = {
+    '': 1,
+    'n': 1e-9, 'u': 1e-6, 'm': 1e-3,
+    'k': 1e3, 'M': 1e6, 'G': 1e9, 'T': 1e12, 'P': 1e15, 'E': 1e18,
+    'Ki': 2 ** 10, 'Mi': 2 ** 20, 'Gi': 2 ** 30, 'Ti': 2 ** 40,
+    'Pi': 2 ** 50, 'Ei': 2 ** 60,
+}
+
+
+def parse_quantity(value):
+    """Returns the number a Kubernetes quantity such as 100m or 256Mi stands
+    for. Raises ValueError if it isn't one."""
+    match = _QUANTITY.match(str(value).strip())
+
+    if not match:
+        raise ValueError('{} is not a quantity, such as 250m or 128Mi.'.format(
+            value))
+
+    suffix = match.group('suffix') or ''
+    if suffix[:1] in ('e', 'E'):
+        return float(match.group('number') + suffix)
+
+    return float(match.group('number')) * _SUFFIXES[suffix]
+
+
+def container_resources(app_settings):
+    """Returns the resources field of an app's container for its settings,
+    or None if it has no requests or limits."""
+    result = {}
+
+    for resource, names in sorted(RESOURCES.items()):
+        for kind, name in zip(('requests', 'limits'), names):
+            if app_settings.get(name):
+                result.setdefault(kind, {})[resource] = app_settings[name]
+
+    return result or None
+
+
+def has_requests(app_settings):
+    return all(
+        app_settings.get(request) for request, _ in RESOURCES.values())
+
+
+def _amounts(app_settings, kind):
+    index = 0 if kind == 'requests' else 1
+    return {
+        resource: parse_quantity(app_settings[names[index]])
+        for resource, names in RESOURCES.items()
+        if app_settings.get(names[index])}
+
+
+def check(k8s, app_settings, replicas=1, current_settings=None):
+    """Checks an app's resource settings against each other and against the
+    namespace's LimitRanges and ResourceQuotas.
+
+    Returns (errors, warnings): errors are values that the API server would
+    reject pods for, warnings are requests that may not fit in the quota
+    with ``replicas`` pods, counting the pods' ``current_settings`` as
+    already used.
+    """
+    errors = []
+    warnings = []
+    requests = _amounts(app_settings, 'requests')
+    limits = _amounts(app_settings, 'limits')
+
+    for resource in RESOURCES:
+        if resource in requests and resource in limits and (
+                requests[resource] > limits[resource]):
+            errors.append(
+                'The {} request is more than its limit.'.format(resource))
+
+    for limit_range in k8s.iter_limitranges():
+        name = limit_range['metadata']['name']
+
+        for item in limit_range['spec'].get('limits') or []:
+            if item.get('type') not in ('Container', 'Pod'):
+                continue
+
+            errors.extend(_check_limit_range(name, item, requests, limits))
+
+    current = _amounts(current_settings or {}, 'requests')
+    current_limits = _amounts(current_settings or {}, 'limits')
+
+    for quota in k8s.iter_resourcequotas():
+        hard = quota['spec'].get('hard') or {}
+        used = (quota.get('status') or {}).get('used') or {}
+
+        for key, amounts, existing in (
+                ('requests.cpu', requests, current),
+                ('cpu', requests, current),
+                ('requests.memory', requests, current),
+                ('memory', requests, current),
+                ('limits.cpu', limits, current_limits),
+                ('limits.memory', limits, current_limits)):
+            resource = key.split('.')[-1]
+
+            if key not in hard or resource not in amounts:
+                continue
+
+            free = parse_quantity(hard[key]) - parse_quantity(
+                used.get(key, '0'))
+            needed = (amounts[resource] - existing.get(resource, 0)) * replicas
+
+            if needed > free:
+                warnings.append(
+                    'With {} replicas the app needs {} more {} than is left '
+                    'in quota {} ({} of {}).'.format(
+                        replicas, _format(needed, resource), key,
+                        quota['metadata']['name'], _format(free, resource),
+                        hard[key]))
+
+    return errors, warnings
+
+
+def _check_limit_range(name, item, requests, limits):
+    errors = []
+
+    for resource in RESOURCES:
+        minimum = (item.get('min') or {}).get(resource)
+        maximum = (item.get('max') or {}).get(resource)
+        ratio = (item.get('maxLimitRequestRatio') or {}).get(resource)
+
+        for kind, amounts in (('request', requests), ('limit', limits)):
+            amount = amounts.get(resource)
+
+            if amount is None:
+                continue
+
+            if minimum and amount < parse_quantity(minimum):
+                errors.append(
+                    'The {} {} is less than the minimum of {} in LimitRange '
+                    '{}.'.format(resource, kind, minimum, name))
+
+            if maximum and amount > parse_quantity(maximum):
+                errors.append(
+                    'The {} {} is more than the maximum of {} in LimitRange '
+                    '{}.'.format(resource, kind, maximum, name))
+
+        if ratio and resource in requests and resource in limits and (
+                limits[resource] / requests[resource] >
+                parse_quantity(ratio)):
+            errors.append(
+                'The {} limit is more than {} times the request, the most '
+                'LimitRange {} allows.'.format(resource, ratio, name))
+
+    return errors
+
+
+def _format(amount, resource):
+    if resource == 'cpu':
+        return '{:g}m'.format(round(amount * 1000, 1))
+    return '{:g}Mi'.format(round(amount / 2 ** 20, 1))
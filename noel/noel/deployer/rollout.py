@@ -0,0 +1,242 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Rolling updates from an app's old replication controllers to a new one.
+
+The new replication controller is scaled up and the old ones down in steps,
+so that the app never has fewer than ``replicas - max_unavailable`` ready
+pods or more than ``replicas + max_surge`` pods in total. Old pods are only
+removed once enough new ones are ready, which is the same algorithm as
+`kubectl rolling-update`.
+"""
+
+from collections import namedtuple
+import time
+
+from noel.deployer.readiness import PodReadiness
+from noel.logger import logger
+
+DEFAULT_MAX_SURGE = 1
+DEFAULT_MAX_UNAVAILABLE = 0
+# Seconds the whole rollout may take before it's rolled back.
+DEFAULT_TIMEOUT = 300
+
+# The replica counts after a step of the rollout, and how long it took.
+RolloutStep = namedtuple('RolloutStep', 'new_replicas old_replicas seconds')
+
+
+class RolloutError(Exception):
+    """The rollout didn't finish in time, or its pods failed. ``steps`` are
+    the steps that were completed, and ``rolled_back`` whether the old
+    version was restored."""
+
+    def __init__(self, message, steps, rolled_back):
+        super(RolloutError, self).__init__(message)
+        self.steps = steps
+        self.rolled_back = rolled_back
+
+
+def _name(rc):
+    return rc['metadata']['name']
+
+
+def _replicas(rc):
+    return rc['spec'].get('replicas', 0)
+
+
+def _build_version(rc):
+    return rc['spec']['template']['metadata']['labels']['build-version']
+
+
+def scale_up_target(replicas, max_surge, new, old_total):
+    """Returns how many new replicas there can be with ``old_total`` old
+    ones: as many as the surge allows, up to ``replicas``, and never fewer
+    than the ``new`` there are."""
+    return max(new, min(replicas, replicas + max_surge - old_total))
+
+
+def ready_needed(new, old_total, min_available):
+    """Returns how many new pods have to be ready before any of the
+    ``old_total`` old ones can go, which needs one more than keeps
+    ``min_available`` pods available."""
+    return min(new, min_available - old_total + 1)
+
+
+def removable(old_total, ready, min_available):
+    """Returns how many old replicas can go with ``ready`` new pods ready,
+    keeping ``min_available`` pods available."""
+    return min(old_total, old_total + ready - min_available)
+
+
+def scale_down(old_rcs, old, count):
+    """Takes ``count`` replicas off the old replication controllers, the
+    oldest first. Updates their replica counts in ``old`` and returns the
+    (name, replicas) to scale them to."""
+    changes = []
+
+    for rc in old_rcs:
+        name = _name(rc)
+        take = min(count, old[name])
+
+        if take:
+            old[name] -= take
+            count -= take
+            changes.append((name, old[name]))
+
+    return changes
+
+
+class Rollout(object):
+    """Replaces ``old_rcs`` with ``new_rc``, ending with ``replicas`` pods of
+    the new version and none of the old ones.
+
+    The old replication controllers are left at zero replicas, deleting them
+    is up to the caller. If the new pods aren't ready within ``timeout``
+    seconds, the old replication controllers are scaled back up and the new
+    one down, unless ``rollback`` is False. With ``fail_fast``, that happens
+    as soon as a new pod fails to start (see readiness.FAILURE_REASONS).
+
+    ``readiness`` is a started PodReadiness for the app to use instead of
+    watching its pods separately.
+    """
+
+    def __init__(self, k8s, app, new_rc, old_rcs, replicas,
+                 max_surge=DEFAULT_MAX_SURGE,
+                 max_unavailable=DEFAULT_MAX_UNAVAILABLE,
+                 timeout=DEFAULT_TIMEOUT,
+                 rollback=True,
+                 fail_fast=False,
+                 readiness=None):
+        if max_surge <= 0 and max_unavailable <= 0:
+            raise ValueError(
+                'max_surge and max_unavailable can\'t both be zero.')
+
+        self._k8s = k8s
+        self._app = app
+        self._new_rc = new_rc
+        self._old_rcs = sorted(
+            old_rcs, key=lambda rc: rc['metadata'].get('creationTimestamp'))
+        self._replicas = replicas
+        self._max_surge = max_surge
+        self._max_unavailable = max_unavailable
+        self._timeout = timeout
+        self._rollback = rollback
+        self._fail_fast = fail_fast
+        self._readiness = readiness
+
+        self.steps = []
+
+    def run(self):
+        """Runs the rollout and returns its steps. Raises RolloutError if it
+        times out or fails."""
+        deadline = time.time() + self._timeout
+
+        if self._readiness:
+            return self._run(self._readiness, deadline)
+
+        readiness = PodReadiness(self._k8s, self._app)
+
+        try:
+            if not readiness.start(timeout=self._timeout):
+                raise RolloutError(
+                    'Rollout of {} couldn\'t list the app\'s pods within '
+                    '{}s.'.format(_name(self._new_rc), self._timeout),
+                    self.steps, False)
+
+            return self._run(readiness, deadline)
+        finally:
+            readiness.stop()
+
+    def _run(self, readiness, deadline):
+        build_version = _build_version(self._new_rc)
+
+        new = _replicas(self._new_rc)
+        old = {_name(rc): _replicas(rc) for rc in self._old_rcs}
+        original = dict(old)
+
+        min_available = max(0, self._replicas - self._max_unavailable)
+
+        def wait_for_ready(count):
+            return readiness.wait_for_ready(
+                build_version, count,
+                timeout=max(0, deadline - time.time()),
+                fail_fast=self._fail_fast)
+
+        while True:
+            step_start = time.time()
+            old_total = sum(old.values())
+
+            # Scale up as far as the surge allows.
+            target = scale_up_target(
+                self._replicas, self._max_surge, new, old_total)
+            if target > new:
+                new = target
+                self._k8s.scale(_name(self._new_rc), new)
+
+            if not old_total:
+                break
+
+            # Old pods can go once enough new ones are ready to keep the
+            # app available.
+            ready = wait_for_ready(ready_needed(new, old_total, min_available))
+            count = removable(old_total, ready, min_available)
+
+            if count <= 0:
+                self._abort(new, ready, original, readiness)
+
+            # Drain the oldest replication controllers first.
+            for name, replicas in scale_down(self._old_rcs, old, count):
+                self._k8s.scale(name, replicas)
+            self._step(new, old, step_start)
+
+        ready = wait_for_ready(min_available)
+
+        if ready < min_available:
+            self._abort(new, ready, original, readiness)
+
+        if not self.steps or self.steps[-1].new_replicas != new:
+            self._step(new, old, step_start)
+
+        return self.steps
+
+    def _step(self, new, old, start):
+        step = RolloutStep(new, sum(old.values()), time.time() - start)
+        self.steps.append(step)
+
+        logger.info(
+            'Rollout of {}: {} new, {} old replicas ({:.1f}s).'.format(
+                _name(self._new_rc), step.new_replicas, step.old_replicas,
+                step.seconds))
+
+    def _abort_message(self, new, ready, readiness):
+        failures = readiness.failures(_build_version(self._new_rc))
+
+        if self._fail_fast and failures:
+            return 'Rollout of {} failed, pod {} is in {}.'.format(
+                _name(self._new_rc), *failures[0])
+
+        return (
+            'Rollout of {} timed out after {}s with {} of {} new pods '
+            'ready.'.format(_name(self._new_rc), self._timeout, ready, new))
+
+    def _abort(self, new, ready, original, readiness):
+        message = self._abort_message(new, ready, readiness)
+
+        if self._rollback:
+            logger.warning('{} Rolling back.'.format(message))
+            for name, replicas in original.items():
+                self._k8s.scale(name, replicas)
+            self._k8s.scale(_name(self._new_rc), 0)
+
+        raise RolloutError(message, self.steps, self._rollback)
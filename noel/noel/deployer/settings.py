@@ -0,0 +1,220 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-application deployment settings.
+
+Settings change how an app's pods are run, such as its health checks, as
+opposed to its config, which is handed to the app itself. They're stored as
+JSON in an annotation on the app's service, which lives as long as the app
+does, and are applied to the replication controller on every deploy.
+"""
+
+import hashlib
+import json
+
+from noel.deployer import resources, templates
+from noel.kubernetes import KubernetesError
+
+SETTINGS_ANNOTATION = 'noel/settings'
+
+# How many times to retry an update that raced with another one.
+MAX_UPDATE_ATTEMPTS = 3
+
+
+def _path(value):
+    if not value.startswith('/'):
+        raise ValueError('{} is not an absolute path.'.format(value))
+    return value
+
+
+def _seconds(value):
+    value = int(value)
+    if value < 0:
+        raise ValueError('{} is negative.'.format(value))
+    return value
+
+
+def _quantity(value):
+    resources.parse_quantity(value)
+    return value
+
+
+# name -> (default, parser, description)
+SETTINGS = {
+    'readiness_path': (
+        None, _path,
+        'HTTP path that returns 200 once a pod can serve traffic. Pods only '
+        'get traffic while it does.'),
+    'liveness_path': (
+        None, _path,
+        'HTTP path that returns 200 while a pod is healthy. Pods are '
+        'restarted when it doesn\'t.'),
+    'liveness_delay': (
+        30, _seconds,
+        'Seconds after startup before the liveness check starts.'),
+    'warmup_path': (
+        None, _path,
+        'HTTP path requested when a pod starts, until it returns 200, to warm '
+        'up caches and code paths. The pod can\'t become ready before then.'),
+    'warmup_timeout': (
+        120, _seconds,
+        'Seconds a pod has for the warm-up path to return 200 before it\'s '
+        'restarted.'),
+    'termination_grace_period': (
+        30, _seconds,
+        'Seconds a pod has to shut down after it\'s asked to stop.'),
+    'reload_path': (
+        None, _path,
+        'HTTP path that config changes are POSTed to, as a JSON object, on '
+        'every ready pod, instead of replacing the pods. The app has to '
+        'apply the new config itself.'),
+    'drain_seconds': (
+        0, _seconds,
+        'Seconds a pod keeps serving after it\'s taken out of the service, '
+        'so in-flight and queued requests can finish. The image needs a '
+        'sleep binary.'),
+    'cpu_request': (
+        None, _quantity,
+        'CPU reserved for each pod, such as 250m for a quarter of a core. '
+        'The scheduler only places pods where it\'s free.'),
+    'cpu_limit': (
+        None, _quantity,
+        'Most CPU each pod can use before it\'s throttled.'),
+    'memory_request': (
+        None, _quantity,
+        'Memory reserved for each pod, such as 256Mi.'),
+    'memory_limit': (
+        None, _quantity,
+        'Most memory each pod can use before it\'s killed.'),
+}
+
+
+def defaults():
+    return {name: setting[0] for name, setting in SETTINGS.items()}
+
+
+def check(settings):
+    """Raises ValueError if settings contradict each other."""
+    drain = settings.get('drain_seconds') or 0
+    grace = settings.get('termination_grace_period')
+
+    # The kubelet kills the pod after the grace period, drained or not.
+    if drain and grace is not None and drain >= grace:
+        raise ValueError(
+            'drain_seconds ({}) should be less than termination_grace_period '
+            '({}).'.format(drain, grace))
+
+
+def version(settings):
+    """Returns a short hash identifying settings, or '' if they're all
+    defaults, so that apps without settings keep their version names."""
+    changed = {
+        name: value for name, value in settings.items()
+        if value != SETTINGS.get(name, (None,))[0]}
+
+    if not changed:
+        return ''
+
+    data = json.dumps(changed, sort_keys=True).encode('utf-8')
+    return hashlib.sha1(data).hexdigest()[:8]
+
+
+def parse(pairs):
+    """Parses name=value pairs into a dict of changes. An empty value resets
+    a setting to its default, which is represented as None."""
+    changes = {}
+
+    for pair in pairs:
+        name, _, value = pair.partition('=')
+
+        if name not in SETTINGS:
+            raise ValueError('Unknown setting {}.'.format(name))
+
+        changes[name] = SETTINGS[name][1](value) if value else None
+
+    return changes
+
+
+def _stored(service):
+    annotations = service['metadata'].get('annotations') or {}
+    return json.loads(annotations.get(SETTINGS_ANNOTATION) or '{}')
+
+
+def from_service(service):
+    """Returns the settings stored on an app's service, with defaults for
+    those that aren't set."""
+    result = defaults()
+    result.update(_stored(service))
+    return result
+
+
+def get_settings(k8s, app):
+    """Returns an app's settings, with defaults for those that aren't set."""
+    try:
+        service = k8s.get_service(app)
+    except KubernetesError:
+        return defaults()
+
+    return from_service(service)
+
+
+def iter_app_settings(k8s):
+    """Yields (app, settings) for every app, with defaults for the settings
+    that aren't set."""
+    for service in k8s.iter_services(params={'labelSelector': 'noel-app'}):
+        yield service['metadata']['labels']['noel-app'], from_service(service)
+
+
+def update_settings(k8s, app, changes):
+    """Applies changes from parse() to an app's settings and returns them.
+    Raises ValueError if the changed settings don't pass check()."""
+    for attempt in range(MAX_UPDATE_ATTEMPTS):
+        try:
+            service = k8s.get_service(app)
+        except KubernetesError:
+            service = None
+
+        stored = _stored(service) if service else {}
+
+        for name, value in changes.items():
+            if value is None:
+                stored.pop(name, None)
+            else:
+                stored[name] = value
+
+        result = defaults()
+        result.update(stored)
+        check(result)
+
+        annotations = {
+            SETTINGS_ANNOTATION: json.dumps(stored, sort_keys=True)}
+
+        try:
+            if service:
+                # The resourceVersion makes the patch fail if the service
+                # changed since it was read.
+                k8s.patch_service(app, {'metadata': {
+                    'resourceVersion': service['metadata']['resourceVersion'],
+                    'annotations': annotations}})
+            else:
+                spec = templates.app_service(name=app)
+                spec['metadata']['annotations'] = annotations
+                k8s.create_service(spec)
+            break
+        except KubernetesError as e:
+            status = e.httperror.response.status_code
+            if status != 409 or attempt == MAX_UPDATE_ATTEMPTS - 1:
+                raise
+
+    return result
@@ -12,30 +12,405 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import yaml
+"""Builders for the Kubernetes objects that make up an application.
 
-from jinja2 import Template
-from pkg_resources import resource_string
+Each builder returns the API object as a dict, ready to be sent to the API
+server. Before it's returned, the object is passed through the registered
+overrides, which can customize the objects of particular apps, and checked
+with validate().
 
-APP_SERVICE_TMPL = Template(
-    resource_string(__name__, 'resources/app-service.tmpl.yaml'))
-APP_RC_TMPL = Template(
-    resource_string(__name__, 'resources/app-rc.tmpl.yaml'))
-APP_SECRET_TMPL = Template(
-    resource_string(__name__, 'resources/app-secret.tmpl.yaml'))
+Overrides are registered with register_override(), or by installing a
+package with a ``noel.spec_overrides`` entry point:
+
+    def add_team_label(app, spec):
+        spec['metadata'].setdefault('labels', {})['team'] = 'payments'
+
+    templates.register_override(add_team_label)
+"""
+
+import hashlib
+import re
+
+from pkg_resources import iter_entry_points
+
+from noel.deployer import resources
+
+# The port apps serve on.
+APP_PORT = 8080
+
+# How often a pod's warm-up path is requested until it succeeds, and how long
+# each request may take.
+WARMUP_PERIOD_SECONDS = 2
+WARMUP_REQUEST_SECONDS = 10
+
+ENTRY_POINT_GROUP = 'noel.spec_overrides'
+
+# The resources of each container of the image puller's pods.
+_PULLER_RESOURCES = {'cpu': '10m', 'memory': '32Mi'}
+
+_overrides = []
+_plugins_loaded = False
+
+_DNS_LABEL = re.compile(r'^[a-z]([-a-z0-9]*[a-z0-9])?$')
+_DNS_SUBDOMAIN = re.compile(
+    r'^[a-z0-9]([-a-z0-9]*[a-z0-9])?(\.[a-z0-9]([-a-z0-9]*[a-z0-9])?)*$')
+_LABEL_KEY = re.compile(
+    r'^([a-z0-9]([-a-z0-9]*[a-z0-9])?(\.[a-z0-9]([-a-z0-9]*[a-z0-9])?)*/)?'
+    r'[A-Za-z0-9]([-A-Za-z0-9_.]*[A-Za-z0-9])?$')
+_LABEL_VALUE = re.compile(r'^(([A-Za-z0-9][-A-Za-z0-9_.]*)?[A-Za-z0-9])?$')
+_SECRET_KEY = re.compile(r'^[-._a-zA-Z0-9]+$')
+
+try:
+    _text = (str, unicode)
+except NameError:
+    _text = (str,)
+
+
+def register_override(override):
+    """Registers ``override(app, spec)``, which is called with every object
+    built for an app. It can change the spec in place or return a new one.
+    """
+    _overrides.append(override)
+
+
+def _load_plugins():
+    global _plugins_loaded
+
+    if _plugins_loaded:
+        return
+    _plugins_loaded = True
+
+    for entry_point in iter_entry_points(ENTRY_POINT_GROUP):
+        register_override(entry_point.load())
+
+
+def _build(app, spec):
+    _load_plugins()
+
+    for override in _overrides:
+        result = override(app, spec)
+        if result is not None:
+            spec = result
+
+    validate(spec)
+    return spec
 
 
 def app_service(name):
-    return yaml.load(APP_SERVICE_TMPL.render(name=name))
+    return _build(name, {
+        'apiVersion': 'v1',
+        'kind': 'Service',
+        'metadata': {
+            'name': name,
+            'labels': {'noel-app': name},
+        },
+        'spec': {
+            'ports': [{'port': 80, 'targetPort': APP_PORT}],
+            'selector': {'noel-app': name},
+        },
+    })
+
+
+def app_replicationcontroller(name, build_version, image, config,
+                              replicas=1, settings=None, preferred_node=None):
+    settings = settings or {}
+
+    container = {
+        'name': 'noel-app',
+        'image': image,
+        'ports': [{'containerPort': APP_PORT}],
+        'env': [{'name': 'PORT', 'value': str(APP_PORT)}],
+    }
+    pod_spec = {'containers': [container]}
+
+    grace_period = settings.get('termination_grace_period')
+    if _is_int(grace_period):
+        pod_spec['terminationGracePeriodSeconds'] = grace_period
+
+    if settings.get('readiness_path'):
+        container['readinessProbe'] = {
+            'httpGet': {'path': settings['readiness_path'], 'port': APP_PORT},
+            'periodSeconds': 5,
+        }
 
+    if settings.get('liveness_path'):
+        container['livenessProbe'] = {
+            'httpGet': {'path': settings['liveness_path'], 'port': APP_PORT},
+            'initialDelaySeconds': settings.get('liveness_delay'),
+        }
 
-def app_replicationcontroller(name, build_version, image, config):
-    return yaml.load(APP_RC_TMPL.render(
-        name=name,
-        build_version=build_version,
-        image=image,
-        config=config))
+    container_resources = resources.container_resources(settings)
+    if container_resources:
+        container['resources'] = container_resources
+
+    if settings.get('warmup_path'):
+        # The readiness and liveness probes only start once this succeeds,
+        # and the container is restarted if it doesn't within warmup_timeout.
+        container['startupProbe'] = {
+            'httpGet': {'path': settings['warmup_path'], 'port': APP_PORT},
+            'periodSeconds': WARMUP_PERIOD_SECONDS,
+            'timeoutSeconds': WARMUP_REQUEST_SECONDS,
+            'failureThreshold': max(1, -(
+                -(settings.get('warmup_timeout') or 0) //
+                WARMUP_PERIOD_SECONDS)),
+        }
+
+    if settings.get('drain_seconds'):
+        container['lifecycle'] = {'preStop': {
+            'exec': {'command': ['sleep', str(settings['drain_seconds'])]}}}
+
+    if preferred_node:
+        pod_spec['affinity'] = {'nodeAffinity': {
+            'preferredDuringSchedulingIgnoredDuringExecution': [{
+                'weight': 100,
+                'preference': {'matchFields': [{
+                    'key': 'metadata.name',
+                    'operator': 'In',
+                    'values': [preferred_node],
+                }]},
+            }],
+        }}
+
+    if config:
+        container['volumeMounts'] = [{
+            'name': 'noelapp-config',
+            'mountPath': '/var/noel/config',
+            'readOnly': True,
+        }]
+        pod_spec['volumes'] = [{
+            'name': 'noelapp-config',
+            'secret': {'secretName': config['metadata']['name']},
+        }]
+
+    return _build(name, {
+        'apiVersion': 'v1',
+        'kind': 'ReplicationController',
+        'metadata': {'name': '{}-{}'.format(name, build_version)},
+        'spec': {
+            'replicas': replicas,
+            'template': {
+                'metadata': {
+                    'labels': {
+                        'noel-app': name,
+                        'build-version': build_version,
+                    },
+                },
+                'spec': pod_spec,
+            },
+        },
+    })
 
 
 def app_secret(name, data):
-    return yaml.load(APP_SECRET_TMPL.render(name=name, data=data))
+    return _build(name, {
+        'apiVersion': 'v1',
+        'kind': 'Secret',
+        'metadata': {
+            'name': name,
+            'labels': {'noel-app': name},
+        },
+        'type': 'Opaque',
+        'data': dict(data),
+    })
+
+
+def app_autoscaler(name, rc_name, min_replicas, max_replicas, cpu_percent):
+    return _build(name, {
+        'apiVersion': 'autoscaling/v1',
+        'kind': 'HorizontalPodAutoscaler',
+        'metadata': {
+            'name': name,
+            'labels': {'noel-app': name},
+        },
+        'spec': {
+            'scaleTargetRef': {
+                'apiVersion': 'v1',
+                'kind': 'ReplicationController',
+                'name': rc_name,
+            },
+            'minReplicas': min_replicas,
+            'maxReplicas': max_replicas,
+            'targetCPUUtilizationPercentage': cpu_percent,
+        },
+    })
+
+
+def image_puller(name, app, image, pause_image):
+    """A DaemonSet that pulls ``image`` onto every node, by running it as
+    an init container that exits straight away, then idles in
+    ``pause_image``."""
+    labels = {'noel-prepull': app, 'image-hash': _short_hash(image)}
+
+    # Explicit, so that the pods are admitted in namespaces with a quota
+    # and no LimitRange defaults.
+    container_resources = {
+        'requests': dict(_PULLER_RESOURCES),
+        'limits': dict(_PULLER_RESOURCES),
+    }
+
+    return _build(app, {
+        'apiVersion': 'apps/v1',
+        'kind': 'DaemonSet',
+        'metadata': {
+            'name': name,
+            'labels': {'noel-prepull': app},
+        },
+        'spec': {
+            'selector': {'matchLabels': labels},
+            'template': {
+                'metadata': {'labels': labels},
+                'spec': {
+                    'initContainers': [{
+                        'name': 'pull',
+                        'image': image,
+                        'imagePullPolicy': 'IfNotPresent',
+                        'command': ['true'],
+                        'resources': container_resources,
+                    }],
+                    'containers': [{
+                        'name': 'pause',
+                        'image': pause_image,
+                        'resources': container_resources,
+                    }],
+                    'terminationGracePeriodSeconds': 0,
+                },
+            },
+        },
+    })
+
+
+def _short_hash(value):
+    return hashlib.sha1(value.encode('utf-8')).hexdigest()[:10]
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _check(condition, spec, message, *args):
+    if not condition:
+        raise ValueError('Invalid {} {}: {}'.format(
+            spec.get('kind'), spec.get('metadata', {}).get('name'),
+            message.format(*args)))
+
+
+def _check_labels(spec, labels):
+    _check(isinstance(labels, dict), spec, 'labels should be a mapping.')
+
+    for key, value in labels.items():
+        _check(
+            isinstance(key, _text) and _LABEL_KEY.match(key), spec,
+            'label {!r} is not a valid label key.', key)
+        _check(
+            isinstance(value, _text) and len(value) <= 63 and
+            _LABEL_VALUE.match(value), spec,
+            'label {} has an invalid value {!r}.', key, value)
+
+
+def _validate_service(spec):
+    ports = spec['spec'].get('ports')
+    _check(ports, spec, 'a service needs ports.')
+
+    for port in ports:
+        _check(
+            _is_int(port.get('port')) and 0 < port['port'] < 65536, spec,
+            'port {!r} is out of range.', port.get('port'))
+
+
+def _validate_replicationcontroller(spec):
+    replicas = spec['spec'].get('replicas')
+    _check(
+        _is_int(replicas) and replicas >= 0, spec,
+        'replicas should be a whole number, not {!r}.', replicas)
+
+    _check_pod_template(spec, spec['spec'].get('template') or {})
+
+
+def _check_pod_template(spec, template):
+    _check_labels(spec, template.get('metadata', {}).get('labels') or {})
+
+    pod_spec = template.get('spec', {})
+    containers = pod_spec.get('containers')
+    _check(containers, spec, 'a pod needs containers.')
+
+    for container in containers + (pod_spec.get('initContainers') or []):
+        _check(
+            _DNS_LABEL.match(container.get('name') or ''), spec,
+            'container name {!r} is invalid.', container.get('name'))
+        _check(
+            isinstance(container.get('image'), _text) and
+            container['image'].strip(), spec,
+            'container {} has no image.', container['name'])
+
+        for kind, amounts in (container.get('resources') or {}).items():
+            for resource, amount in amounts.items():
+                try:
+                    resources.parse_quantity(amount)
+                except ValueError:
+                    _check(
+                        False, spec, 'container {} has an invalid {} {} '
+                        '{!r}.', container['name'], resource, kind, amount)
+
+
+def _validate_secret(spec):
+    data = spec.get('data')
+    _check(isinstance(data, dict), spec, 'data should be a mapping.')
+
+    for key, value in data.items():
+        _check(
+            isinstance(key, _text) and _SECRET_KEY.match(key), spec,
+            'key {!r} can only have letters, digits, -, _ and .', key)
+        _check(
+            isinstance(value, _text), spec,
+            'the value of {} should be text.', key)
+
+
+def _validate_daemonset(spec):
+    template = spec['spec'].get('template') or {}
+    _check_pod_template(spec, template)
+
+    selector = spec['spec'].get('selector', {}).get('matchLabels') or {}
+    labels = template.get('metadata', {}).get('labels') or {}
+    _check(
+        selector and all(
+            labels.get(key) == value for key, value in selector.items()),
+        spec, 'the selector should match the pod template\'s labels.')
+
+
+def _validate_horizontalpodautoscaler(spec):
+    min_replicas = spec['spec'].get('minReplicas', 1)
+    max_replicas = spec['spec'].get('maxReplicas')
+    _check(
+        _is_int(min_replicas) and _is_int(max_replicas) and
+        1 <= min_replicas <= max_replicas, spec,
+        'replicas should be at least 1 and min no more than max.')
+
+
+_VALIDATORS = {
+    'DaemonSet': _validate_daemonset,
+    'HorizontalPodAutoscaler': _validate_horizontalpodautoscaler,
+    'ReplicationController': _validate_replicationcontroller,
+    'Secret': _validate_secret,
+    'Service': _validate_service,
+}
+
+
+def validate(spec):
+    """Checks an object against the parts of the Kubernetes schema that Noel
+    relies on, raising ValueError with the problem if it doesn't match."""
+    _check(
+        spec.get('kind') in _VALIDATORS, spec, 'unsupported kind.')
+
+    name = spec.get('metadata', {}).get('name') or ''
+    if spec['kind'] == 'Service':
+        _check(
+            len(name) <= 63 and _DNS_LABEL.match(name), spec,
+            'service names should be lower case letters, digits and -, '
+            'starting with a letter.')
+    else:
+        _check(
+            len(name) <= 253 and _DNS_SUBDOMAIN.match(name), spec,
+            'names should be lower case letters, digits, - and .')
+
+    _check_labels(spec, spec['metadata'].get('labels') or {})
+    _VALIDATORS[spec['kind']](spec)
@@ -0,0 +1,346 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Informers keep an in-memory copy of a Kubernetes resource collection.
+
+An informer lists a collection once and then watches it, resuming from the
+last resourceVersion it saw, so that long-running processes can answer
+lookups from memory instead of asking the API server every time. This is the
+same list+watch pattern that Kubernetes' own controllers use.
+
+Once an informer is registered with a Kubernetes client, the client serves
+list and get calls for that resource from the informer:
+
+    k8s = Kubernetes(url, namespace='noelapp')
+    k8s.add_informer('replicationcontrollers')
+    deployer.get_replication_controller(k8s, 'app')  # No API call.
+"""
+
+import copy
+import threading
+import time
+
+from noel.logger import logger
+from noel.watch import Watch
+
+# Labels that Noel selects resources by.
+DEFAULT_INDEXES = ('noel-app', 'build-version')
+
+# Seconds to wait before restarting an informer that failed unexpectedly.
+RESTART_SECONDS = 1
+
+# How long each watch request lasts. Reconnecting shows that the API server
+# is still there even when nothing changes.
+WATCH_TIMEOUT_SECONDS = 60
+# Seconds without hearing from the API server after which the store isn't
+# used to serve reads, as it may be missing changes.
+MAX_STALENESS_SECONDS = 2 * WATCH_TIMEOUT_SECONDS
+
+
+def parse_selector(selector):
+    """Parses an equality-based label selector into (key, op, value) terms.
+
+    Returns None for selectors that use set-based requirements, which the
+    informer doesn't evaluate itself.
+    """
+    terms = []
+
+    for term in (selector or '').split(','):
+        term = term.strip()
+
+        if not term:
+            continue
+
+        for op in ('!=', '==', '='):
+            if op in term:
+                key, value = term.split(op, 1)
+                op = '!=' if op == '!=' else '='
+                terms.append((key.strip(), op, value.strip()))
+                break
+        else:
+            return None
+
+    return terms
+
+
+def _matches(labels, terms):
+    for key, op, value in terms:
+        if (labels.get(key) == value) != (op == '='):
+            return False
+    return True
+
+
+def _version(obj):
+    try:
+        return int(obj['metadata']['resourceVersion'])
+    except (KeyError, TypeError, ValueError):
+        return 0
+
+
+class Informer(object):
+    """Maintains a local, indexed store of one resource collection.
+
+    Objects are indexed by name and by the values of the labels in
+    ``indexes``. Reads return copies, so callers are free to modify them.
+
+    The store is only considered fresh (see is_fresh()) while it has heard
+    from the API server within ``max_staleness`` seconds.
+    """
+
+    def __init__(self, k8s, resource, label_selector=None,
+                 indexes=DEFAULT_INDEXES,
+                 max_staleness=MAX_STALENESS_SECONDS):
+        self._k8s = k8s
+        self._resource = resource
+        self._label_selector = label_selector
+        self._indexes = indexes
+        self._max_staleness = max_staleness
+
+        # Reentrant, so that wait_until() predicates can read the store.
+        self._lock = threading.Condition(threading.RLock())
+        self._objects = {}
+        self._index = {label: {} for label in indexes}
+        self._last_sync = None
+        self._synced = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._handlers = []
+
+        params = {}
+        if label_selector:
+            params['labelSelector'] = label_selector
+
+        # The watch lists the collection first and again whenever it can't
+        # resume, each time replacing the store.
+        self._watcher = Watch(
+            k8s, resource, params, on_relist=self._replace,
+            timeout_seconds=WATCH_TIMEOUT_SECONDS)
+
+    @property
+    def resource(self):
+        return self._resource
+
+    @property
+    def label_selector(self):
+        return self._label_selector
+
+    def add_handler(self, handler):
+        """Calls ``handler(event_type, obj)`` for every change to the store,
+        including the objects of each list, which are ADDED. Handlers are
+        called with the store locked and must not block."""
+        with self._lock:
+            self._handlers.append(handler)
+
+    def start(self):
+        """Lists the collection and starts watching it in the background."""
+        self._thread = threading.Thread(
+            target=self._run, name='informer-{}'.format(self._resource))
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._watcher.stop()
+
+    def has_synced(self):
+        return self._synced.is_set()
+
+    def is_fresh(self):
+        """Returns True if the store has synced and heard from the API
+        server recently enough to serve reads. It isn't while the watch is
+        failing to reconnect."""
+        staleness = self.staleness()
+
+        return (self.has_synced() and staleness is not None and
+                staleness <= self._max_staleness)
+
+    def wait_for_sync(self, timeout=None):
+        """Waits for the initial list to complete. Returns True if it did."""
+        return self._synced.wait(timeout)
+
+    def wait_until(self, predicate, timeout=None):
+        """Waits until ``predicate(self)`` is true, checking it again
+        whenever the store changes. Returns its last result."""
+        deadline = time.time() + timeout if timeout is not None else None
+
+        with self._lock:
+            while True:
+                result = predicate(self)
+                remaining = deadline - time.time() if deadline else None
+
+                if result or (remaining is not None and remaining <= 0):
+                    return result
+
+                self._lock.wait(remaining)
+
+    def staleness(self):
+        """Returns how many seconds ago the store was last known to be in sync
+        with the API server, or None if it never was."""
+        contacts = [
+            t for t in (self._last_sync, self._watcher.last_contact)
+            if t is not None]
+
+        if not contacts:
+            return None
+        return time.time() - max(contacts)
+
+    def stats(self):
+        """Returns the counters of the underlying watch."""
+        return self._watcher.stats()
+
+    def resync(self):
+        """Forces a fresh list of the collection, replacing the store.
+
+        The background watch keeps running; events older than the new list
+        are ignored.
+        """
+        params = {}
+        if self._label_selector:
+            params['labelSelector'] = self._label_selector
+
+        self._replace(self._k8s._fetch(self._resource, params=params))
+
+    def get(self, name):
+        """Returns the object with the given name, or None."""
+        with self._lock:
+            obj = self._objects.get(name)
+        return copy.deepcopy(obj)
+
+    def list(self, label_selector=None):
+        """Returns the objects matching an equality-based label selector."""
+        terms = parse_selector(label_selector)
+
+        if terms is None:
+            raise ValueError(
+                'Unsupported label selector {}'.format(label_selector))
+
+        with self._lock:
+            candidates = self._candidates(terms)
+            items = [
+                obj for obj in candidates
+                if _matches(obj['metadata'].get('labels', {}), terms)]
+            return copy.deepcopy(items)
+
+    def can_serve(self, label_selector):
+        """Returns True if this informer can answer a list for the given
+        selector from its store."""
+        if not self.is_fresh():
+            return False
+
+        terms = parse_selector(label_selector)
+        own_terms = parse_selector(self._label_selector)
+
+        if terms is None or own_terms is None:
+            return False
+
+        # Every term of the informer's own selector must also be in the
+        # request, otherwise the store may be missing objects.
+        return all(t in terms for t in own_terms)
+
+    def observe(self, event_type, obj):
+        """Applies a change to the store.
+
+        The client calls this with the results of its own writes, so reads
+        reflect them without waiting for the watch event.
+        """
+        labels = obj['metadata'].get('labels', {})
+        terms = parse_selector(self._label_selector)
+        # Without terms to check, leave the object to the watch.
+        if event_type != 'DELETED' and (
+                terms is None or not _matches(labels, terms)):
+            return
+
+        with self._lock:
+            self._apply(event_type, obj)
+            self._lock.notify_all()
+
+    def _replace(self, result):
+        with self._lock:
+            self._objects = {}
+            self._index = {label: {} for label in self._indexes}
+            for obj in result.get('items') or []:
+                self._store(obj)
+                self._notify('ADDED', obj)
+            self._last_sync = time.time()
+            self._lock.notify_all()
+
+        self._synced.set()
+
+    def _candidates(self, terms):
+        for key, op, value in terms:
+            if op == '=' and key in self._index:
+                names = self._index[key].get(value, ())
+                return [self._objects[name] for name in names]
+        return list(self._objects.values())
+
+    def _store(self, obj):
+        name = obj['metadata']['name']
+        self._unstore(name)
+        self._objects[name] = obj
+
+        labels = obj['metadata'].get('labels', {})
+        for label, index in self._index.items():
+            if label in labels:
+                index.setdefault(labels[label], set()).add(name)
+
+    def _unstore(self, name):
+        obj = self._objects.pop(name, None)
+
+        if not obj:
+            return
+
+        labels = obj['metadata'].get('labels', {})
+        for label, index in self._index.items():
+            names = index.get(labels.get(label))
+            if names:
+                names.discard(name)
+
+    def _apply(self, event_type, obj):
+        name = obj['metadata']['name']
+        existing = self._objects.get(name)
+
+        # Ignore events that are older than what's already in the store.
+        if existing and _version(obj) and _version(obj) < _version(existing):
+            return
+
+        if event_type == 'DELETED':
+            self._unstore(name)
+        else:
+            self._store(obj)
+
+        self._notify(event_type, obj)
+
+    def _notify(self, event_type, obj):
+        for handler in self._handlers:
+            handler(event_type, obj)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                for event in self._watcher:
+                    with self._lock:
+                        self._apply(event['type'], event['object'])
+                        self._lock.notify_all()
+                return
+
+            except Exception:
+                logger.exception('Informer for {} failed, restarting.'.format(
+                    self._resource))
+
+                # Relist, as the store may have missed the event that failed.
+                # Until then, it can't serve reads.
+                self._synced.clear()
+                self._watcher.resource_version = None
+                self._stopped.wait(RESTART_SECONDS)
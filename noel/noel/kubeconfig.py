@@ -0,0 +1,257 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Finds out how to reach and authenticate to the Kubernetes API.
+
+Inside a cluster, pods get a service account token and the cluster's CA
+bundle mounted into them, which is enough to talk to the API server directly
+over TLS. Outside of a cluster, kubectl's kubeconfig file has the same
+information. Both are returned as keyword arguments for the Kubernetes
+client, so that neither needs a `kubectl proxy` in between.
+"""
+
+from base64 import b64decode
+import atexit
+import calendar
+import datetime
+import os
+import re
+import tempfile
+import time
+
+import yaml
+
+SERVICE_ACCOUNT_DIR = '/var/run/secrets/kubernetes.io/serviceaccount'
+DEFAULT_KUBECONFIG = '~/.kube/config'
+
+# What to do instead when a kubeconfig user can't be authenticated as.
+PROXY_HINT = (
+    'Run `kubectl proxy` and pass --kubernetes-url http://localhost:8001 '
+    'instead.')
+
+# An RFC 3339 time, as auth providers write their token expiry.
+_RFC3339 = re.compile(
+    r'^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.\d+)?'
+    r'(Z|[+-]\d\d:\d\d)$', re.IGNORECASE)
+
+# Inline kubeconfig data -> the temporary file it was written to.
+_data_files = {}
+
+
+class ConfigError(Exception):
+    pass
+
+
+def in_cluster():
+    """Returns True if running in a pod with a service account."""
+    return ('KUBERNETES_SERVICE_HOST' in os.environ and
+            os.path.exists(os.path.join(SERVICE_ACCOUNT_DIR, 'token')))
+
+
+def in_cluster_config():
+    """Returns the client configuration for the pod's service account."""
+    host = os.environ['KUBERNETES_SERVICE_HOST']
+    port = os.environ.get('KUBERNETES_SERVICE_PORT', '443')
+
+    # IPv6 service hosts need brackets in URLs.
+    if ':' in host:
+        host = '[{}]'.format(host)
+
+    return {
+        'api_root': 'https://{}:{}'.format(host, port),
+        'token_file': os.path.join(SERVICE_ACCOUNT_DIR, 'token'),
+        'ca_cert': os.path.join(SERVICE_ACCOUNT_DIR, 'ca.crt'),
+    }
+
+
+def kubeconfig_path():
+    """Returns the first kubeconfig file named by $KUBECONFIG, or the default
+    location, or None if there isn't one."""
+    paths = os.environ.get('KUBECONFIG', '').split(os.pathsep)
+    paths = [p for p in paths if p] or [DEFAULT_KUBECONFIG]
+
+    for path in paths:
+        path = os.path.expanduser(path)
+        if os.path.exists(path):
+            return path
+
+    return None
+
+
+def _named(items, name, kind):
+    for item in items or []:
+        if item.get('name') == name:
+            return item.get(kind) or {}
+    raise ConfigError('No {} named {} in kubeconfig.'.format(kind, name))
+
+
+def _remove_data_files():
+    for path in _data_files.values():
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    _data_files.clear()
+
+
+atexit.register(_remove_data_files)
+
+
+def _data_file(data):
+    """Writes base64 encoded data, which can be a private key, to a
+    temporary file that only the user can read. Each distinct value is
+    written once, and the files are removed when the process exits."""
+    if data not in _data_files:
+        fd, path = tempfile.mkstemp(prefix='noel-')
+        os.chmod(path, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b64decode(data))
+        _data_files[data] = path
+
+    return _data_files[data]
+
+
+def _file_or_data(entry, key, base_dir):
+    """Returns a path for a kubeconfig 'key' or 'key-data' entry. Inline data
+    is written to a temporary file, as requests only accepts paths."""
+    if entry.get(key + '-data'):
+        return _data_file(entry[key + '-data'])
+
+    if entry.get(key):
+        return os.path.join(base_dir, os.path.expanduser(entry[key]))
+
+    return None
+
+
+def _timestamp(value):
+    """Returns the Unix time of an RFC 3339 time, which YAML may already
+    have parsed into a datetime, or None if it can't be parsed."""
+    if isinstance(value, datetime.datetime):
+        offset = value.utcoffset() or datetime.timedelta(0)
+        return calendar.timegm((value - offset).timetuple())
+
+    match = _RFC3339.match(str(value).strip())
+    if not match:
+        return None
+
+    base, zone = match.groups()
+    timestamp = calendar.timegm(time.strptime(base, '%Y-%m-%dT%H:%M:%S'))
+
+    if zone.upper() != 'Z':
+        sign = 1 if zone[0] == '+' else -1
+        timestamp -= sign * (int(zone[1:3]) * 3600 + int(zone[4:6]) * 60)
+
+    return timestamp
+
+
+def _auth_provider_token(user_name, auth_provider):
+    """Returns the access token an auth provider cached in the kubeconfig.
+    Raises ConfigError if there's none or it has expired, as only the
+    provider (run by kubectl) can get a new one."""
+    name = auth_provider.get('name')
+    config = auth_provider.get('config') or {}
+
+    if not config.get('access-token'):
+        raise ConfigError(
+            'kubeconfig user {} has no access token cached by the {} auth '
+            'provider, and noel can\'t run the provider itself. {}'.format(
+                user_name, name, PROXY_HINT))
+
+    expiry = config.get('expiry')
+    expires = _timestamp(expiry) if expiry else None
+
+    if expires is not None and expires <= time.time():
+        raise ConfigError(
+            'The {} access token of kubeconfig user {} expired at {}. '
+            'Running any kubectl command refreshes it. {}'.format(
+                name, user_name, expiry, PROXY_HINT))
+
+    return config['access-token']
+
+
+def kubeconfig(path=None, context=None):
+    """Returns the client configuration for a kubeconfig context, by default
+    the current context of the default kubeconfig file.
+
+    Supports bearer tokens (including tokens cached by the gcp auth
+    provider), client certificates and basic auth. Raises ConfigError for
+    users that authenticate with an exec credential plugin (such as
+    gke-gcloud-auth-plugin), another auth provider, or an expired cached
+    token; use `kubectl proxy` for those clusters.
+    """
+    path = path or kubeconfig_path()
+
+    if not path:
+        raise ConfigError('No kubeconfig file found.')
+
+    with open(path) as f:
+        config = yaml.safe_load(f) or {}
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    context = _named(
+        config.get('contexts'),
+        context or config.get('current-context'),
+        'context')
+    cluster = _named(config.get('clusters'), context.get('cluster'), 'cluster')
+    user_name = context.get('user')
+    user = _named(config.get('users'), user_name, 'user')
+
+    result = {'api_root': cluster['server'].rstrip('/')}
+
+    if cluster.get('insecure-skip-tls-verify'):
+        result['verify'] = False
+    else:
+        result['ca_cert'] = _file_or_data(
+            cluster, 'certificate-authority', base_dir)
+
+    if user.get('token'):
+        result['token'] = user['token']
+    elif user.get('tokenFile'):
+        result['token_file'] = os.path.join(base_dir, user['tokenFile'])
+    elif user.get('exec'):
+        raise ConfigError(
+            'kubeconfig user {} authenticates with the exec credential '
+            'plugin {}, which noel doesn\'t support. {}'.format(
+                user_name, user['exec'].get('command'), PROXY_HINT))
+    elif user.get('auth-provider'):
+        result['token'] = _auth_provider_token(
+            user_name, user['auth-provider'])
+    elif user.get('username'):
+        result['basic_auth'] = (user['username'], user.get('password', ''))
+
+    client_cert = _file_or_data(user, 'client-certificate', base_dir)
+    if client_cert:
+        result['client_cert'] = (
+            client_cert, _file_or_data(user, 'client-key', base_dir))
+
+    return result
+
+
+def find_config(api_root=None):
+    """Returns the client configuration to use.
+
+    An explicit ``api_root`` (for example a `kubectl proxy` URL) wins,
+    followed by the in-cluster service account, followed by the current
+    kubeconfig context. If none are available, a local proxy is assumed.
+    """
+    if api_root:
+        return {'api_root': api_root}
+
+    if in_cluster():
+        return in_cluster_config()
+
+    if kubeconfig_path():
+        return kubeconfig()
+
+    return {'api_root': 'http://localhost:8001'}
@@ -19,9 +19,73 @@ Alternatively, you could use subprocess.call to call out to kubectl.
 """
 
 from base64 import b64decode, b64encode
-import json
+from collections import namedtuple
+import os
+import socket
+import threading
+import time
 
 import requests
+import requests.adapters
+import requests.auth
+from requests.packages.urllib3.connection import HTTPConnection
+
+from noel import cache, codec, metrics
+from noel.logger import logger
+from noel.ratelimit import backoff_delay, parse_retry_after, RateLimiter
+from noel.utils import concurrently
+
+# Seconds to wait for a connection to, and a response from, the API server.
+DEFAULT_TIMEOUT = (5, 30)
+# Number of distinct hosts to keep pools for, and connections per pool.
+DEFAULT_POOL_CONNECTIONS = 1
+DEFAULT_POOL_MAXSIZE = 10
+# Number of items to request per page when iterating over a collection.
+DEFAULT_PAGE_SIZE = 250
+# How many times to retry a throttled or failed request, and the bounds for
+# the delay between attempts.
+DEFAULT_MAX_RETRIES = 5
+RETRY_BACKOFF_SECONDS = 0.5
+MAX_RETRY_DELAY_SECONDS = 30
+
+# TCP keepalive for pooled connections: seconds idle before the first probe,
+# seconds between probes, and unanswered probes before the connection is
+# dropped. This notices API servers that went away without closing the
+# connection, which a long-lived stream would otherwise wait on forever.
+KEEPALIVE_IDLE_SECONDS = 60
+KEEPALIVE_INTERVAL_SECONDS = 15
+KEEPALIVE_PROBES = 4
+
+# Methods that can safely be sent again if the server may have processed them.
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+# Statuses worth retrying. A 429 means the request was rejected before it was
+# processed, so it's retried for any method.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Number of objects apply_many() writes at once.
+DEFAULT_APPLY_CONCURRENCY = DEFAULT_POOL_MAXSIZE
+
+# The collection that objects of each kind are created in, for apply().
+KIND_COLLECTIONS = {
+    'DaemonSet': 'daemonsets',
+    'Pod': 'pods',
+    'ReplicationController': 'replicationcontrollers',
+    'HorizontalPodAutoscaler': 'horizontalpodautoscalers',
+    'Secret': 'secrets',
+    'Service': 'services',
+}
+
+# The API group and version of collections outside of the core API.
+API_GROUPS = {
+    'daemonsets': 'apps/v1',
+    'horizontalpodautoscalers': 'autoscaling/v1',
+}
+
+# The outcome of applying one object. ``action`` is 'created', 'replaced',
+# 'unchanged' or 'failed'; ``object`` is what the API server returned, if
+# anything, and ``error`` the KubernetesError or requests exception for
+# failures.
+ApplyResult = namedtuple(
+    'ApplyResult', 'kind name action object duration error')
 
 
 class KubernetesError(Exception):
@@ -37,95 +101,659 @@ class KubernetesError(Exception):
             '{}'.format(self.json))
 
 
-class Kubernetes(object):
-    """Kubernetes HTTP API client."""
+def make_error(status_code, url, content=b'', reason=None):
+    """Creates a KubernetesError for a response that wasn't received through
+    requests, for example one served from a local cache.
+
+    The error wraps a requests.HTTPError so that callers can always inspect
+    ``e.httperror.response``.
+    """
+    response = requests.models.Response()
+    response.status_code = status_code
+    response.reason = reason
+    response.url = url
+    response._content = content
+
+    try:
+        response.raise_for_status()
+    except requests.HTTPError as e:
+        return KubernetesError(e)
+
+
+def _resource_label(resource):
+    """Returns the collection and subresource of a resource path, leaving out
+    object names to keep metric cardinality low."""
+    parts = resource.split('/')
+    return '/'.join([parts[0]] + parts[2:3])
+
+
+def _b64encode(value):
+    if not isinstance(value, bytes):
+        value = value.encode('utf-8')
+    return b64encode(value).decode('ascii')
+
+
+def _b64decode(value):
+    value = b64decode(value)
+    # On Python 3 callers expect text, just as they get str on Python 2.
+    if not isinstance(value, str):
+        value = value.decode('utf-8')
+    return value
+
+
+class BearerTokenAuth(requests.auth.AuthBase):
+    """Authenticates requests with a bearer token.
+
+    Service account tokens are rotated on disk, so a token file is read again
+    whenever it changes.
+    """
+
+    def __init__(self, token=None, token_file=None):
+        self._token = token
+        self._token_file = token_file
+        self._mtime = None
+
+    def _current_token(self):
+        if self._token_file:
+            mtime = os.path.getmtime(self._token_file)
+            if mtime != self._mtime:
+                with open(self._token_file) as f:
+                    self._token = f.read().strip()
+                self._mtime = mtime
+        return self._token
+
+    def __call__(self, r):
+        r.headers['Authorization'] = 'Bearer {}'.format(self._current_token())
+        return r
+
+
+class BaseKubernetes(object):
+    """Transport-independent parts of the Kubernetes API clients."""
 
     def __init__(self, api_root, namespace='default'):
+        self._server = api_root
         self._api_root = api_root + '/api/v1'
         self._namespace = namespace
 
     def _url(self, resource, namespace=None, *args, **kwargs):
+        group = API_GROUPS.get(resource.split('/')[0])
+        api_root = (
+            '{}/apis/{}'.format(self._server, group) if group
+            else self._api_root)
+
         return '{}/namespaces/{}/{}'.format(
-            self._api_root,
+            api_root,
             namespace or self._namespace,
             resource.format(*args, **kwargs))
 
+    def encode_secret_data(self, data):
+        """Base64 encodes a dictionary's values.
+
+        Kubernetes expects secret values to be base64 encoded within JSON.
+        """
+        return {
+            k: _b64encode(v)
+            for k, v in data.items()
+        }
+
+    def decode_secret_data(self, data):
+        """Base64 decodes a dictionary's values.
+
+        Kubernetes returns secret values encoded in base64.
+        """
+        return {
+            k: _b64decode(v)
+            for k, v in data.items()
+        }
+
+
+def _keepalive_options():
+    options = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+
+    # The timings can only be set on some platforms, Linux among them.
+    for name, value in (('TCP_KEEPIDLE', KEEPALIVE_IDLE_SECONDS),
+                        ('TCP_KEEPINTVL', KEEPALIVE_INTERVAL_SECONDS),
+                        ('TCP_KEEPCNT', KEEPALIVE_PROBES)):
+        if hasattr(socket, name):
+            options.append((socket.IPPROTO_TCP, getattr(socket, name), value))
+
+    return options
+
+
+class KeepAliveAdapter(requests.adapters.HTTPAdapter):
+    """An HTTPAdapter whose connections use TCP keepalive."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = (
+            HTTPConnection.default_socket_options + _keepalive_options())
+        super(KeepAliveAdapter, self).init_poolmanager(*args, **kwargs)
+
+
+class Kubernetes(BaseKubernetes):
+    """Kubernetes HTTP API client.
+
+    Each client owns a :class:`requests.Session`, so connections to the API
+    server are pooled and kept alive across calls instead of being opened
+    for every request. ``pool_connections`` and ``pool_maxsize`` are passed
+    to the session's adapters; ``timeout`` is applied to every call that
+    doesn't specify its own and may be a number or a ``(connect, read)``
+    tuple. Connections use TCP keepalive, see KeepAliveAdapter.
+
+    If a ``rate_limiter`` (a noel.ratelimit.RateLimiter, which may be shared
+    between clients) is given, every request waits for a token from it.
+    Requests that are throttled (429) or fail with a server error are retried
+    up to ``max_retries`` times, honoring Retry-After; server errors and
+    connection failures are only retried for idempotent methods.
+
+    To talk to the API server directly rather than through `kubectl proxy`,
+    pass a bearer ``token`` or ``token_file``, ``basic_auth`` or a
+    ``client_cert`` (a (cert, key) tuple), and a ``ca_cert`` bundle to verify
+    the server with (or ``verify=False``). connect() works these out from the
+    environment.
+
+    Latency, status codes, bytes transferred, retries and throttling are
+    recorded per verb and resource in ``metrics``, a noel.metrics.Registry.
+    Pass None to disable recording.
+
+    Request and response bodies are encoded with ``codec``, a
+    noel.codec.Codec, by default the fastest JSON library installed. Pages of
+    a collection are decoded incrementally while they're read when ijson is
+    installed, unless ``incremental_lists`` is False.
+
+    Gets can be served from a noel.cache.ResponseCache passed as ``cache``,
+    which this client invalidates as it writes. There's no cache by default.
+    """
+
+    def __init__(
+            self,
+            api_root,
+            namespace='default',
+            timeout=DEFAULT_TIMEOUT,
+            pool_connections=DEFAULT_POOL_CONNECTIONS,
+            pool_maxsize=DEFAULT_POOL_MAXSIZE,
+            rate_limiter=None,
+            max_retries=DEFAULT_MAX_RETRIES,
+            metrics=metrics.REGISTRY,
+            token=None,
+            token_file=None,
+            basic_auth=None,
+            client_cert=None,
+            ca_cert=None,
+            verify=True,
+            codec=codec.DEFAULT_CODEC,
+            incremental_lists=True,
+            cache=None):
+        super(Kubernetes, self).__init__(api_root, namespace)
+        self._timeout = timeout
+        self._session = self._create_session(pool_connections, pool_maxsize)
+
+        if token or token_file:
+            self._session.auth = BearerTokenAuth(token, token_file)
+        elif basic_auth:
+            self._session.auth = basic_auth
+        self._session.cert = client_cert
+        self._session.verify = ca_cert if verify and ca_cert else verify
+        self._informers = {}
+        self._rate_limiter = rate_limiter
+        self._max_retries = max_retries
+        self._metrics = metrics
+        self._codec = codec
+        self._incremental_lists = incremental_lists
+        self._cache = cache
+
+        self._stats_lock = threading.Lock()
+        self._retries = 0
+        self._retry_seconds = 0.0
+
+    def _create_session(self, pool_connections, pool_maxsize):
+        session = requests.Session()
+
+        adapter = KeepAliveAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        session.headers.update({
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip',
+            'Connection': 'keep-alive'})
+
+        return session
+
+    def close(self):
+        """Closes all pooled connections held by this client."""
+        self._session.close()
+
     def _wrap_exception(self, r):
         try:
             r.raise_for_status()
         except requests.HTTPError as e:
             raise KubernetesError(e)
 
-    def _get(self, resource, *args, **kwargs):
+    def stats(self):
+        """Returns counters for retries and time spent waiting on the rate
+        limiter and between retries."""
+        limiter = self._rate_limiter
+        return {
+            'retries': self._retries,
+            'retry_seconds': self._retry_seconds,
+            'throttled_seconds': limiter.throttled_seconds if limiter else 0.0
+        }
+
+    def _request(self, method, resource, *args, **kwargs):
         url = self._url(resource)
-        r = requests.get(url, *args, **kwargs)
+        kwargs.setdefault('timeout', self._timeout)
+        idempotent = kwargs.pop('idempotent', method in IDEMPOTENT_METHODS)
+        attempt = 0
+
+        verb = method
+        if (kwargs.get('params') or {}).get('watch') == 'true':
+            verb = 'WATCH'
+        label = _resource_label(resource)
+
+        self._invalidate(method, resource)
+
+        while True:
+            if self._rate_limiter:
+                throttled = self._rate_limiter.acquire()
+                if self._metrics:
+                    self._metrics.observe_throttle(verb, label, throttled)
+
+            can_retry = attempt < self._max_retries
+            start = time.time()
+
+            try:
+                r = self._session.request(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._observe_request(verb, label, start, kwargs, None)
+                if not (can_retry and idempotent):
+                    raise
+                delay = None
+                reason = str(e)
+            else:
+                self._observe_request(verb, label, start, kwargs, r)
+
+                retryable = r.status_code in RETRY_STATUSES and (
+                    idempotent or r.status_code == 429)
+
+                if not (can_retry and retryable):
+                    self._invalidate(method, resource)
+                    return r
+
+                delay = parse_retry_after(r.headers.get('Retry-After'))
+                reason = r.status_code
+                r.close()
+
+            if delay is None:
+                delay = backoff_delay(
+                    attempt, RETRY_BACKOFF_SECONDS, MAX_RETRY_DELAY_SECONDS)
+            delay = min(delay, MAX_RETRY_DELAY_SECONDS)
+
+            logger.debug('{} {} failed ({}), retrying in {:.1f}s.'.format(
+                method, url, reason, delay))
+
+            with self._stats_lock:
+                self._retries += 1
+                self._retry_seconds += delay
+            if self._metrics:
+                self._metrics.observe_retry(verb, label)
+
+            time.sleep(delay)
+            attempt += 1
+
+    def _invalidate(self, method, resource):
+        # Invalidated both before and after a write, so that gets made while
+        # it's in flight aren't cached.
+        if self._cache is not None and method != 'GET':
+            self._cache.invalidate(self._url(resource.split('/')[0]))
+
+    def _observe_request(self, verb, label, start, kwargs, r):
+        """Records a request; ``r`` is None if no response was received."""
+        if not self._metrics:
+            return
+
+        elapsed = time.time() - start
+        sent = len(kwargs.get('data') or '')
+
+        if r is None:
+            code, received = 'error', 0
+        elif kwargs.get('stream'):
+            code = r.status_code
+            received = int(r.headers.get('Content-Length') or 0)
+        else:
+            code, received = r.status_code, len(r.content)
+
+        self._metrics.observe_request(
+            verb, label, code, elapsed, sent, received)
+
+    def add_informer(self, resource, label_selector=None):
+        """Starts an informer for the given resource collection.
+
+        While the informer is fresh (see Informer.is_fresh()), lists with
+        equality-based label selectors and gets by name for that resource
+        are served from memory. Otherwise they go to the API server. This
+        client's own writes are applied to the informer immediately.
+        """
+        from noel.informer import Informer
+
+        informer = Informer(self, resource, label_selector=label_selector)
+        self._informers[resource] = informer
+        return informer.start()
+
+    def _from_informer(self, resource, params):
+        parts = resource.split('/')
+        informer = self._informers.get(parts[0])
+
+        if not informer or not informer.is_fresh() or len(parts) > 2:
+            return None
+
+        params = dict(params or {})
+
+        if len(parts) == 1:
+            selector = params.pop('labelSelector', None)
+            if params or not informer.can_serve(selector):
+                return None
+            return {'kind': 'List', 'items': informer.list(selector)}
+
+        if params:
+            return None
+
+        obj = informer.get(parts[1])
+
+        # An informer with a selector might just not be watching the object.
+        if obj is None and informer.label_selector:
+            return None
+        elif obj is None:
+            raise make_error(404, self._url(resource))
+
+        return obj
+
+    def _observe(self, resource, event_type, obj):
+        informer = self._informers.get(resource.split('/')[0])
+
+        if informer and obj.get('metadata', {}).get('name'):
+            informer.observe(event_type, obj)
+
+    def _get(self, resource, *args, **kwargs):
+        result = self._from_informer(resource, kwargs.get('params'))
+
+        if result is not None:
+            return result
+
+        if self._cache is not None and not args and set(kwargs) <= {'params'}:
+            content = self._cache.get(
+                self._url(resource.split('/')[0]),
+                self._url(resource),
+                kwargs.get('params'),
+                lambda: self._fetch_content(resource, **kwargs))
+            return self._codec.loads(content)
+
+        return self._fetch(resource, *args, **kwargs)
+
+    def _fetch(self, resource, *args, **kwargs):
+        return self._codec.loads(
+            self._fetch_content(resource, *args, **kwargs))
+
+    def _fetch_content(self, resource, *args, **kwargs):
+        r = self._request('GET', resource, *args, **kwargs)
 
         self._wrap_exception(r)
 
-        return r.json()
+        return r.content
 
     def _stream(self, resource, *args, **kwargs):
-        url = self._url(resource)
+        chunk_size = kwargs.pop('chunk_size', requests.models.ITER_CHUNK_SIZE)
+        # Streams are long-lived, so only the connect timeout applies, and
+        # ``read_timeout``, the most seconds to wait for more data.
+        read_timeout = kwargs.pop('read_timeout', None)
+        kwargs.setdefault('timeout', (self._connect_timeout(), read_timeout))
+
+        # Called with the response, so that it can be closed from another
+        # thread to end the stream.
+        on_response = kwargs.pop('on_response', None)
 
-        r = requests.get(url, *args, stream=True, **kwargs)
+        r = self._request('GET', resource, *args, stream=True, **kwargs)
 
-        for line in r.iter_lines():
-            yield line
+        try:
+            self._wrap_exception(r)
+
+            if on_response:
+                on_response(r)
+
+            for line in r.iter_lines(chunk_size=chunk_size):
+                yield line
+        finally:
+            r.close()
+
+    def _connect_timeout(self):
+        if isinstance(self._timeout, tuple):
+            return self._timeout[0]
+        return self._timeout
 
     def _watch(self, resource, *args, **kwargs):
-        params = kwargs.pop('params', {})
-        params['watch'] = 'true'
+        """Returns a noel.watch.Watch on the given collection. Keyword
+        arguments are passed to Watch."""
+        from noel.watch import Watch
 
-        for line in self._stream(resource, *args, params=params, **kwargs):
-            yield json.loads(line)
+        return Watch(self, resource, *args, **kwargs)
 
     def _post(self, resource, data, *args, **kwargs):
-        url = self._url(resource)
-        r = requests.post(url, data=json.dumps(data), *args, **kwargs)
+        r = self._request(
+            'POST', resource, *args, data=self._codec.dumps(data), **kwargs)
 
         self._wrap_exception(r)
 
-        return r.json()
+        result = self._codec.loads(r.content)
+        self._observe(resource, 'ADDED', result)
+        return result
 
     def _put(self, resource, data, *args, **kwargs):
-        url = self._url(resource)
-        r = requests.put(url, data=json.dumps(data), *args, **kwargs)
+        r = self._request(
+            'PUT', resource, *args, data=self._codec.dumps(data), **kwargs)
 
         self._wrap_exception(r)
 
-        return r.json()
+        result = self._codec.loads(r.content)
+        self._observe(resource, 'MODIFIED', result)
+        return result
 
     def _patch(self, resource, data, *args, **kwargs):
-        url = self._url(resource)
-
-        r = requests.patch(
-            url,
-            data=json.dumps(data),
+        r = self._request(
+            'PATCH',
+            resource,
+            data=self._codec.dumps(data),
             headers={'content-type': 'application/merge-patch+json'},
             *args,
             **kwargs)
 
         self._wrap_exception(r)
 
-        return r.json()
+        result = self._codec.loads(r.content)
+        self._observe(resource, 'MODIFIED', result)
+        return result
 
     def _delete(self, resource, *args, **kwargs):
-        url = self._url(resource)
-        r = requests.delete(url, *args, **kwargs)
+        r = self._request('DELETE', resource, *args, **kwargs)
 
         self._wrap_exception(r)
 
-        return r.json()
+        name = resource.split('/')[-1]
+        self._observe(resource, 'DELETED', {'metadata': {'name': name}})
+        return self._codec.loads(r.content)
+
+    def _delete_collection(self, resource, label_selector,
+                           propagation_policy=None, **kwargs):
+        """Deletes every object in a collection that matches a label
+        selector in a single request, returning the list of deleted objects.
+
+        ``propagation_policy`` is 'Foreground', 'Background' or 'Orphan' and
+        decides what happens to dependents, such as a replication
+        controller's pods.
+        """
+        # An empty selector would delete the whole collection.
+        if not label_selector:
+            raise ValueError('A label selector is required.')
+
+        params = dict(kwargs.pop('params', None) or {})
+        params['labelSelector'] = label_selector
+        if propagation_policy:
+            params['propagationPolicy'] = propagation_policy
+
+        r = self._request('DELETE', resource, params=params, **kwargs)
+
+        self._wrap_exception(r)
+
+        result = self._codec.loads(r.content)
+        for item in result.get('items') or []:
+            self._observe(resource, 'DELETED', item)
+        return result
+
+    def _iter(self, resource, page_size=DEFAULT_PAGE_SIZE, *args, **kwargs):
+        """Yields the items in a collection one at a time.
+
+        The collection is fetched in chunks of ``page_size`` items using the
+        API's limit and continue parameters, so that large collections never
+        have to be held in memory all at once. Each page is decoded as it's
+        read from the socket, see noel.codec.ListReader.
+        """
+        params = dict(kwargs.pop('params', None) or {})
+
+        cached = self._from_informer(resource, params)
+        if cached is not None:
+            for item in cached['items']:
+                yield item
+            return
+
+        params['limit'] = page_size
+
+        while True:
+            r = self._request(
+                'GET', resource, *args, params=params, stream=True, **kwargs)
+
+            self._wrap_exception(r)
+
+            # Let urllib3 gunzip the raw stream as it's read.
+            r.raw.decode_content = True
+            page = codec.ListReader(
+                r.raw, self._codec, incremental=self._incremental_lists)
+
+            try:
+                for item in page:
+                    yield item
+            finally:
+                r.close()
+
+            token = page.metadata.get('continue')
+
+            if not token:
+                return
+
+            params['continue'] = token
+
+    def apply(self, spec, on_conflict='replace'):
+        """Creates an object from its spec, or if it already exists either
+        replaces it (``on_conflict='replace'``) or leaves it as it is
+        (``'skip'``). Returns an ApplyResult; API and connection errors are
+        reported in the result rather than raised.
+
+        Specs are sent as is, so secret data has to be base64 encoded.
+        """
+        if on_conflict not in ('replace', 'skip'):
+            raise ValueError('Unknown on_conflict {}'.format(on_conflict))
+
+        kind = spec['kind']
+        name = spec['metadata']['name']
+        collection = KIND_COLLECTIONS[kind]
+        start = time.time()
+
+        try:
+            try:
+                result = self._post(collection, spec)
+                action = 'created'
+            except KubernetesError as e:
+                if e.httperror.response.status_code != 409:
+                    raise
+                elif on_conflict == 'skip':
+                    result, action = None, 'unchanged'
+                else:
+                    result = self._replace(collection, spec)
+                    action = 'replaced'
+        except (KubernetesError, requests.RequestException) as e:
+            return ApplyResult(
+                kind, name, 'failed', None, time.time() - start, e)
+
+        return ApplyResult(
+            kind, name, action, result, time.time() - start, None)
+
+    def _replace(self, collection, spec):
+        resource = '{}/{}'.format(collection, spec['metadata']['name'])
+        existing = self._fetch(resource)
+
+        spec = dict(spec)
+        spec['metadata'] = dict(
+            spec['metadata'],
+            resourceVersion=existing['metadata']['resourceVersion'])
+
+        # A service's cluster IP can't be changed once it's allocated.
+        cluster_ip = existing.get('spec', {}).get('clusterIP')
+        if spec['kind'] == 'Service' and cluster_ip:
+            spec['spec'] = dict(spec['spec'], clusterIP=cluster_ip)
+
+        return self._put(resource, spec)
+
+    def apply_many(self, groups, concurrency=DEFAULT_APPLY_CONCURRENCY,
+                   on_conflict='replace'):
+        """Applies groups of object specs, see apply().
+
+        The objects in a group are applied concurrently, up to
+        ``concurrency`` at a time, and each group is only started once the
+        one before it is done, so objects can be ordered by their
+        dependencies. If anything in a group fails, later groups are not
+        applied. Returns the ApplyResults for every object that was applied,
+        in order.
+        """
+        results = []
+
+        for group in groups:
+            group_results = concurrently(
+                lambda spec: self.apply(spec, on_conflict=on_conflict),
+                group,
+                concurrency)
+            results.extend(group_results)
+
+            if any(result.error for result in group_results):
+                break
+
+        return results
 
     def pods(self, *args, **kwargs):
         return self._get('pods', *args, **kwargs)
 
+    def iter_pods(self, *args, **kwargs):
+        return self._iter('pods', *args, **kwargs)
+
     def services(self, *args, **kwargs):
         return self._get('services', *args, **kwargs)
 
+    def iter_services(self, *args, **kwargs):
+        return self._iter('services', *args, **kwargs)
+
     def replicationcontrollers(self, *args, **kwargs):
         return self._get('replicationcontrollers', *args, **kwargs)
 
+    def iter_replicationcontrollers(self, *args, **kwargs):
+        return self._iter('replicationcontrollers', *args, **kwargs)
+
+    def iter_events(self, *args, **kwargs):
+        return self._iter('events', *args, **kwargs)
+
+    def iter_limitranges(self, *args, **kwargs):
+        return self._iter('limitranges', *args, **kwargs)
+
+    def iter_resourcequotas(self, *args, **kwargs):
+        return self._iter('resourcequotas', *args, **kwargs)
+
     def logs(
             self,
             name,
@@ -144,19 +772,67 @@ class Kubernetes(object):
         return self._stream(
             'pods/{}/log'.format(name), *args, params=params, **kwargs)
 
+    def proxy_pod(self, name, path, port=None, method='GET', data=None,
+                  *args, **kwargs):
+        """Sends a request to a pod through the API server's proxy and
+        returns the response body."""
+        target = '{}:{}'.format(name, port) if port else name
+        r = self._request(
+            method,
+            'pods/{}/proxy/{}'.format(target, path.lstrip('/')),
+            data=data,
+            *args,
+            **kwargs)
+
+        self._wrap_exception(r)
+        return r.text
+
     def get_service(self, name, *args, **kwargs):
         return self._get('services/' + name, *args, **kwargs)
 
     def create_service(self, spec, *args, **kwargs):
         return self._post('services', spec, *args, **kwargs)
 
+    def get_replicationcontroller(self, name, *args, **kwargs):
+        return self._get('replicationcontrollers/' + name, *args, **kwargs)
+
+    def patch_service(self, name, patch, *args, **kwargs):
+        return self._patch('services/' + name, patch, *args, **kwargs)
+
     def create_replicationcontroller(self, spec, *args, **kwargs):
         return self._post('replicationcontrollers', spec, *args, **kwargs)
 
+    def patch_replicationcontroller(self, name, patch, *args, **kwargs):
+        return self._patch(
+            'replicationcontrollers/' + name, patch, *args, **kwargs)
+
     def scale(self, name, replicas, *args, **kwargs):
         return self._patch(
             'replicationcontrollers/{}'.format(name),
-            {"spec": {"replicas": 0}},
+            {"spec": {"replicas": replicas}},
+            idempotent=True,
+            *args,
+            **kwargs)
+
+    def get_horizontalpodautoscaler(self, name, *args, **kwargs):
+        return self._get('horizontalpodautoscalers/' + name, *args, **kwargs)
+
+    def patch_horizontalpodautoscaler(self, name, patch, *args, **kwargs):
+        return self._patch(
+            'horizontalpodautoscalers/' + name, patch, *args, **kwargs)
+
+    def delete_horizontalpodautoscalers(self, label_selector, **kwargs):
+        return self._delete_collection(
+            'horizontalpodautoscalers', label_selector, **kwargs)
+
+    def get_daemonset(self, name, *args, **kwargs):
+        return self._get('daemonsets/' + name, *args, **kwargs)
+
+    def delete_daemonset(self, name, propagation_policy='Background',
+                         *args, **kwargs):
+        return self._delete(
+            'daemonsets/' + name,
+            params={'propagationPolicy': propagation_policy},
             *args,
             **kwargs)
 
@@ -172,29 +848,21 @@ class Kubernetes(object):
             *args,
             **kwargs)
 
-    def encode_secret_data(self, data):
-        """Base64 encodes a dictionary's values.
-
-        Kubernetes expects secret values to be base64 encoded within JSON.
-        """
-        return {
-            k: b64encode(v)
-            for k, v in data.iteritems()
-        }
-
-    def decode_secret_data(self, data):
-        """Base64 decodes a dictionary's values.
+    def delete_replicationcontrollers(
+            self, label_selector, propagation_policy='Background', **kwargs):
+        return self._delete_collection(
+            'replicationcontrollers',
+            label_selector,
+            propagation_policy=propagation_policy,
+            **kwargs)
 
-        Kubernetes returns secret values encoded in base64.
-        """
-        return {
-            k: b64decode(v)
-            for k, v in data.iteritems()
-        }
+    def delete_pods(self, label_selector, **kwargs):
+        return self._delete_collection('pods', label_selector, **kwargs)
 
     def get_secret(self, name, *args, **kwargs):
         r = self._get('secrets/' + name, *args, **kwargs)
-        r['data'] = self.decode_secret_data(r['data'])
+        # The API server leaves out empty data.
+        r['data'] = self.decode_secret_data(r.get('data') or {})
         return r
 
     def create_secret(self, spec, *args, **kwargs):
@@ -209,5 +877,30 @@ class Kubernetes(object):
     def delete_secret(self, name, *args, **kwargs):
         return self._delete('secrets/{}'.format(name), *args, **kwargs)
 
+    def delete_secrets(self, label_selector, **kwargs):
+        return self._delete_collection('secrets', label_selector, **kwargs)
+
     def watch_secrets(self, *args, **kwargs):
         return self._watch('secrets', *args, **kwargs)
+
+
+def connect(api_root=None, namespace='default', qps=None, burst=None,
+            **kwargs):
+    """Creates a Kubernetes client configured from the environment.
+
+    Uses ``api_root`` as is if given, otherwise the pod's service account
+    when running in a cluster, otherwise the current kubeconfig context.
+    See noel.kubeconfig.find_config. If ``qps`` is given, the client makes at
+    most that many requests per second, in bursts of up to ``burst``. Other
+    arguments are passed to Kubernetes. Clients share noel.cache.SHARED if
+    it's been enabled.
+    """
+    from noel.kubeconfig import find_config
+
+    config = find_config(api_root)
+    config.setdefault('cache', cache.SHARED)
+    if qps:
+        config['rate_limiter'] = RateLimiter(qps, burst)
+    config.update(kwargs)
+
+    return Kubernetes(namespace=namespace, **config)
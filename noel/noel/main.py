@@ -27,7 +27,7 @@ def build_and_deploy_command(args):
     essentially runs build and then deploy-image."""
     image = noel.builder.commands.build_command(args)
     args.image = image
-    noel.deployer.commands.deploy_image_command(args)
+    return noel.deployer.commands.deploy_image_command(args)
 
 
 def main():
@@ -36,8 +36,38 @@ def main():
 
     parser.add_argument(
         '--kubernetes-url',
-        default='http://localhost:8001',
-        help="The URL for the Kubernetes API.")
+        default=None,
+        help='The URL for the Kubernetes API, for example a kubectl proxy. '
+             'Defaults to the in-cluster service account or the current '
+             'kubeconfig context.')
+    parser.add_argument(
+        '--metrics-summary',
+        default=False,
+        action='store_true',
+        help='Print a summary of Kubernetes API requests when done.')
+    parser.add_argument(
+        '--cache',
+        default=False,
+        action='store_true',
+        help='Cache Kubernetes API reads for a few seconds, so that repeated '
+             'reads of the same object are only made once.')
+    parser.add_argument(
+        '--cache-ttl',
+        default=5,
+        type=float,
+        help='How long cached reads are kept, in seconds.')
+    parser.add_argument(
+        '--qps',
+        default=None,
+        type=float,
+        help='The most Kubernetes API requests to make per second. '
+             'Unlimited by default.')
+    parser.add_argument(
+        '--burst',
+        default=None,
+        type=int,
+        help='How many requests can be made at once before --qps applies. '
+             'Defaults to --qps.')
 
     noel.builder.commands.register_commands(subparsers)
     noel.deployer.commands.register_commands(subparsers)
@@ -47,6 +77,8 @@ def main():
         help=build_and_deploy_command.__doc__)
 
     build_and_deploy.set_defaults(func=build_and_deploy_command)
+    noel.deployer.commands.add_deploy_arguments(build_and_deploy)
+    noel.deployer.commands.add_wait_arguments(build_and_deploy)
     build_and_deploy.add_argument(
         '--project-id',
         default=None,
@@ -61,6 +93,12 @@ def main():
         '--app',
         default=os.path.basename(os.getcwd()),
         help='The application name. Defaults to the name of the directory.')
+    build_and_deploy.add_argument(
+        '--build-node',
+        default=None,
+        help='The Kubernetes node the image is built on, when building on '
+             'a node of the cluster. The first pod is started there, where '
+             'the image needn\'t be pulled.')
     build_and_deploy.add_argument(
         '--version',
         default=None,
@@ -0,0 +1,238 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Lightweight request metrics with Prometheus text exposition.
+
+Every Kubernetes client records its requests into a Registry (by default the
+module-level REGISTRY). Recording a request is a lock, a couple of dict
+lookups and a bisect, so it's cheap enough to always leave on. Long-running
+processes can expose the metrics to Prometheus with serve(), and the CLI can
+print a summary().
+"""
+
+import bisect
+import threading
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+# Latency histogram bucket upper bounds, in seconds.
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+        for k, v in zip(names, values)) + '}'
+
+
+class Counter(object):
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values=(), amount=1):
+        with self._lock:
+            self._values[label_values] = (
+                self._values.get(label_values, 0) + amount)
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    def exposition(self):
+        lines = [
+            '# HELP {} {}'.format(self.name, self.help),
+            '# TYPE {} counter'.format(self.name)]
+
+        for label_values, value in sorted(self.values().items()):
+            lines.append('{}{} {}'.format(
+                self.name, _format_labels(self.labels, label_values), value))
+
+        return lines
+
+
+class Histogram(object):
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        index = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            counts = self._values.get(label_values)
+            if counts is None:
+                counts = self._values[label_values] = (
+                    [0] * (len(self.buckets) + 1) + [0.0])
+            counts[index] += 1
+            counts[-1] += value
+
+    def values(self):
+        """Returns {label values: (count, sum, per-bucket counts)}."""
+        with self._lock:
+            return {
+                k: (sum(v[:-1]), v[-1], list(v[:-1]))
+                for k, v in self._values.items()}
+
+    def exposition(self):
+        lines = [
+            '# HELP {} {}'.format(self.name, self.help),
+            '# TYPE {} histogram'.format(self.name)]
+
+        bucket_labels = self.labels + ('le',)
+
+        for label_values, (count, total, counts) in sorted(
+                self.values().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(
+                    self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append('{}_bucket{} {}'.format(
+                    self.name,
+                    _format_labels(bucket_labels, label_values + (bound,)),
+                    cumulative))
+
+            labels = _format_labels(self.labels, label_values)
+            lines.append('{}_sum{} {}'.format(self.name, labels, total))
+            lines.append('{}_count{} {}'.format(self.name, labels, count))
+
+        return lines
+
+
+class Registry(object):
+    """The metrics recorded by Kubernetes clients."""
+
+    def __init__(self):
+        request_labels = ('verb', 'resource')
+
+        self.request_latency = Histogram(
+            'noel_kubernetes_request_duration_seconds',
+            'Kubernetes API request latency.',
+            request_labels)
+        self.responses = Counter(
+            'noel_kubernetes_responses_total',
+            'Kubernetes API responses by status code.',
+            request_labels + ('code',))
+        self.bytes_sent = Counter(
+            'noel_kubernetes_request_bytes_total',
+            'Bytes sent in Kubernetes API request bodies.',
+            request_labels)
+        self.bytes_received = Counter(
+            'noel_kubernetes_response_bytes_total',
+            'Bytes received in Kubernetes API response bodies.',
+            request_labels)
+        self.retries = Counter(
+            'noel_kubernetes_retries_total',
+            'Kubernetes API requests that were retried.',
+            request_labels)
+        self.throttled_seconds = Counter(
+            'noel_kubernetes_throttled_seconds_total',
+            'Time spent waiting on the client-side rate limiter.',
+            request_labels)
+
+        self._metrics = (
+            self.request_latency, self.responses, self.bytes_sent,
+            self.bytes_received, self.retries, self.throttled_seconds)
+
+    def observe_request(self, verb, resource, code, seconds, bytes_sent,
+                        bytes_received):
+        labels = (verb, resource)
+        self.request_latency.observe(labels, seconds)
+        self.responses.inc(labels + (code,))
+        if bytes_sent:
+            self.bytes_sent.inc(labels, bytes_sent)
+        if bytes_received:
+            self.bytes_received.inc(labels, bytes_received)
+
+    def observe_retry(self, verb, resource):
+        self.retries.inc((verb, resource))
+
+    def observe_throttle(self, verb, resource, seconds):
+        if seconds:
+            self.throttled_seconds.inc((verb, resource), seconds)
+
+    def exposition(self):
+        """Returns all metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.exposition())
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """Returns a human readable per verb and resource summary."""
+        responses = self.responses.values()
+        received = self.bytes_received.values()
+        retries = self.retries.values()
+
+        lines = []
+
+        for labels, (count, total, _) in sorted(
+                self.request_latency.values().items()):
+            codes = ', '.join(
+                '{}: {}'.format(k[2], v)
+                for k, v in sorted(responses.items()) if k[:2] == labels)
+            lines.append(
+                '{:<7} {:<32} {:>5} calls {:>9.1f}ms avg {:>10} bytes in '
+                '{:>3} retries  [{}]'.format(
+                    labels[0], labels[1], count, total / count * 1000,
+                    received.get(labels, 0), retries.get(labels, 0), codes))
+
+        return '\n'.join(lines)
+
+
+REGISTRY = Registry()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+
+        body = self.server.registry.exposition().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port, registry=REGISTRY, host=''):
+    """Serves the registry at http://host:port/metrics from a background
+    thread. Returns the server."""
+    server = HTTPServer((host, port), _MetricsHandler)
+    server.registry = registry
+
+    thread = threading.Thread(target=server.serve_forever, name='metrics')
+    thread.daemon = True
+    thread.start()
+
+    return server
@@ -0,0 +1,92 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Client-side rate limiting and retry helpers for the Kubernetes client."""
+
+from email.utils import mktime_tz, parsedate_tz
+import random
+import threading
+import time
+
+
+class RateLimiter(object):
+    """A thread-safe token bucket.
+
+    The bucket holds up to ``burst`` tokens and refills at ``qps`` tokens per
+    second. Every request takes one token, waiting for it if the bucket is
+    empty. One limiter can be shared by any number of Kubernetes clients to
+    cap their combined request rate.
+    """
+
+    def __init__(self, qps, burst=None):
+        self.qps = float(qps)
+        self.burst = burst or max(1, int(qps))
+        self.throttled_seconds = 0.0
+        self._tokens = float(self.burst)
+        self._last = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Takes a token, blocking until one is available. Returns how long
+        the caller was throttled, in seconds."""
+        wait = self.reserve()
+
+        if wait:
+            time.sleep(wait)
+
+        return wait
+
+    def reserve(self):
+        """Takes a token without waiting for it. Returns how long the caller
+        has to wait before using it, in seconds, so that asyncio callers can
+        wait without blocking the event loop."""
+        with self._lock:
+            now = time.time()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._last) * self.qps)
+            self._last = now
+
+            # Reserve the token now, even if it's only available later, so
+            # that concurrent callers queue up in order.
+            self._tokens -= 1
+            wait = -self._tokens / self.qps if self._tokens < 0 else 0.0
+            self.throttled_seconds += wait
+
+        return wait
+
+
+def parse_retry_after(value, now=None):
+    """Returns the delay in seconds requested by a Retry-After header, which
+    may be a number of seconds or an HTTP date, or None."""
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    date = parsedate_tz(value)
+
+    if date is None:
+        return None
+
+    return max(0.0, mktime_tz(date) - (now or time.time()))
+
+
+def backoff_delay(attempt, base, maximum):
+    """Returns an exponential backoff delay with jitter for the given retry
+    attempt, starting at 0."""
+    delay = min(maximum, base * 2 ** attempt)
+    return random.uniform(delay / 2.0, delay)
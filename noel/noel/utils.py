@@ -12,9 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from multiprocessing.pool import ThreadPool
 import subprocess
 import sys
 
+from noel import cache, metrics
 from noel.logger import setup_logging, logger
 
 
@@ -25,10 +27,31 @@ def call(*args, **kwargs):
         return subprocess.check_call(args)
 
 
+def concurrently(func, items, concurrency):
+    """Calls ``func`` with each item, using up to ``concurrency`` threads,
+    and returns the results in order. An exception raised by ``func`` is
+    raised once every call has finished."""
+    items = list(items)
+
+    if concurrency <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    pool = ThreadPool(min(concurrency, len(items)))
+
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
 def run_command(parser):
     setup_logging()
     args = parser.parse_args()
 
+    if getattr(args, 'cache', False):
+        cache.enable(ttl=args.cache_ttl)
+
     try:
         result = args.func(args)
 
@@ -38,3 +61,10 @@ def run_command(parser):
     except Exception:
         logger.exception('Command failed')
         sys.exit(1)
+
+    finally:
+        if getattr(args, 'metrics_summary', False):
+            logger.info('Kubernetes API requests:\n{}'.format(
+                metrics.REGISTRY.summary()))
+        if cache.SHARED is not None:
+            logger.info('Kubernetes cache: {}'.format(cache.SHARED.summary()))
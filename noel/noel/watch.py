@@ -0,0 +1,310 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A resumable watch on a Kubernetes resource collection.
+
+A single watch request to the API server only lasts until the server or the
+network closes it. Watch wraps those requests into one endless stream of
+events: it reconnects from the last resourceVersion it saw, relists when
+that resourceVersion has expired (410 Gone), and backs off with jitter when
+the API server is unreachable.
+
+    for event in Watch(k8s, 'secrets', params={'labelSelector': 'a=b'}):
+        print(event['type'], event['object']['metadata']['name'])
+"""
+
+import socket
+import threading
+import time
+
+import requests
+from requests.packages.urllib3.exceptions import ReadTimeoutError
+
+from noel.kubernetes import KubernetesError
+from noel.logger import logger
+from noel.ratelimit import backoff_delay
+
+# Bytes to read from the socket at a time.
+DEFAULT_CHUNK_SIZE = 16 * 1024
+
+# How long the server should keep a single watch request open.
+DEFAULT_TIMEOUT_SECONDS = 300
+
+# Seconds past timeoutSeconds to wait for the server to end a watch request
+# before treating the connection as dead. Bookmarks and keep-alive newlines
+# keep a healthy watch from going quiet for that long.
+READ_TIMEOUT_MARGIN_SECONDS = 30
+
+# Bounds for the delay between reconnection attempts after errors.
+MIN_BACKOFF_SECONDS = 1
+MAX_BACKOFF_SECONDS = 30
+
+
+class WatchExpired(Exception):
+    """The resourceVersion the watch resumed from is no longer available."""
+
+
+def is_expired(status):
+    return status.get('code') == 410 or status.get('reason') in (
+        'Expired', 'Gone')
+
+
+def _timed_out(error):
+    """Returns whether a requests exception is a read timing out. Timeouts
+    while reading the body are raised as a ConnectionError wrapping
+    urllib3's ReadTimeoutError."""
+    if isinstance(error, requests.Timeout):
+        return True
+
+    return any(
+        isinstance(arg, (ReadTimeoutError, socket.timeout))
+        for arg in error.args)
+
+
+def _close(response):
+    """Closes a streaming response from another thread. Closing it alone
+    doesn't wake a thread that's blocked reading from its socket, shutting
+    the socket down does."""
+    connection = getattr(response.raw, 'connection', None)
+    sock = getattr(connection, 'sock', None)
+
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+
+    response.close()
+
+
+class Watch(object):
+    """An endless, resumable stream of watch events for a collection.
+
+    If ``resource_version`` isn't given, the collection is listed first and
+    the watch starts from the list's resourceVersion. Whenever the watch has
+    to (re)list, ``on_relist`` is called with the list result; without it,
+    every listed object is yielded as an ``ADDED`` event instead, so that
+    consumers never miss the current state of an object.
+
+    Bookmark events only advance the resourceVersion and are not yielded.
+    """
+
+    def __init__(self, k8s, resource, params=None, resource_version=None,
+                 on_relist=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 timeout_seconds=DEFAULT_TIMEOUT_SECONDS,
+                 max_backoff=MAX_BACKOFF_SECONDS):
+        self._k8s = k8s
+        self._resource = resource
+        self._params = dict(params or {})
+        self._on_relist = on_relist
+        self._chunk_size = chunk_size
+        self._timeout_seconds = timeout_seconds
+        self._max_backoff = max_backoff
+
+        self.resource_version = resource_version
+        self.last_contact = None
+        self._stopped = threading.Event()
+        self._response = None
+        self._failures = 0
+
+        self._started = None
+        self._events = 0
+        self._bookmarks = 0
+        self._reconnects = 0
+        self._relists = 0
+        self._errors = 0
+
+    def stop(self):
+        """Stops the watch, closing the current request so that the thread
+        iterating over it doesn't have to wait for the next event."""
+        self._stopped.set()
+
+        response = self._response
+        if response is not None:
+            _close(response)
+
+    def _set_response(self, response):
+        self._response = response
+        # Connecting counts as contact, so that a quiet collection doesn't
+        # look stale.
+        self.last_contact = time.time()
+
+        # stop() may have missed it.
+        if self._stopped.is_set():
+            _close(response)
+
+    def stats(self):
+        """Returns counters describing the watch so far."""
+        elapsed = time.time() - self._started if self._started else 0
+
+        return {
+            'events': self._events,
+            'events_per_second': self._events / elapsed if elapsed else 0.0,
+            'bookmarks': self._bookmarks,
+            'reconnects': self._reconnects,
+            'relists': self._relists,
+            'errors': self._errors,
+            'resource_version': self.resource_version,
+        }
+
+    def __iter__(self):
+        self._started = time.time()
+
+        while not self._stopped.is_set():
+            relisted = False
+
+            try:
+                if self.resource_version is None:
+                    relisted = True
+                    for event in self._relist():
+                        yield event
+
+                for event in self._stream():
+                    yield event
+
+                if self._stopped.is_set():
+                    return
+
+                # The server ended the request normally, pick up where it
+                # left off.
+                self._reconnects += 1
+
+            except WatchExpired as e:
+                logger.info('Watch on {} expired at {}, relisting.'.format(
+                    self._resource, self.resource_version))
+                self.resource_version = None
+
+                # A version that expires straight after a list means the
+                # server is struggling, don't hammer it with lists.
+                if relisted:
+                    self._errors += 1
+                    self._backoff(e)
+
+            except requests.RequestException as e:
+                self._reconnects += 1
+
+                if self._stopped.is_set():
+                    return
+
+                if _timed_out(e):
+                    # Nothing, not even a bookmark, arrived in time, so the
+                    # connection was most likely dropped without being
+                    # closed.
+                    logger.info('Watch on {} timed out, reconnecting.'.format(
+                        self._resource))
+                    continue
+
+                self._errors += 1
+                self._backoff(e)
+
+            except (KubernetesError, ValueError) as e:
+                self._errors += 1
+                self._reconnects += 1
+                self._backoff(e)
+
+    def _relist(self):
+        params = {
+            k: v for k, v in self._params.items()
+            if k in ('labelSelector', 'fieldSelector')}
+
+        result = self._k8s._fetch(self._resource, params=params)
+
+        self._relists += 1
+        self.resource_version = result['metadata']['resourceVersion']
+        self.last_contact = time.time()
+
+        if self._on_relist:
+            self._on_relist(result)
+            return []
+
+        return [
+            {'type': 'ADDED', 'object': obj}
+            for obj in result.get('items') or []]
+
+    def _stream(self):
+        params = dict(self._params)
+        params.update({
+            'watch': 'true',
+            'resourceVersion': self.resource_version,
+            'timeoutSeconds': self._timeout_seconds,
+            'allowWatchBookmarks': 'true'
+        })
+
+        try:
+            lines = self._k8s._stream(
+                self._resource, params=params, chunk_size=self._chunk_size,
+                read_timeout=(
+                    self._timeout_seconds + READ_TIMEOUT_MARGIN_SECONDS),
+                on_response=self._set_response)
+
+            for line in lines:
+                self.last_contact = time.time()
+
+                if self._stopped.is_set():
+                    return
+
+                # Keep-alive newlines.
+                if not line.strip():
+                    continue
+
+                event = self._k8s._codec.loads(line)
+                event_type = event.get('type')
+                obj = event.get('object') or {}
+
+                if event_type == 'ERROR':
+                    if is_expired(obj):
+                        raise WatchExpired(obj.get('message', '410 Gone'))
+                    raise ValueError('Watch error: {}'.format(obj))
+
+                self._failures = 0
+                version = obj.get('metadata', {}).get('resourceVersion')
+                if version:
+                    self.resource_version = version
+
+                if event_type == 'BOOKMARK':
+                    self._bookmarks += 1
+                    continue
+
+                self._events += 1
+                yield event
+
+                if self._stopped.is_set():
+                    return
+
+        except KubernetesError as e:
+            # Some API servers reject an expired resourceVersion up front.
+            if e.httperror.response.status_code == 410:
+                raise WatchExpired(str(e))
+            raise
+
+        except Exception:
+            # Closing the response from stop() fails the read in whichever
+            # way the connection happened to be in.
+            if self._stopped.is_set():
+                return
+            raise
+
+        finally:
+            self._response = None
+
+    def _backoff(self, error):
+        # Jitter keeps many watchers from reconnecting in lockstep.
+        delay = backoff_delay(
+            self._failures, MIN_BACKOFF_SECONDS, self._max_backoff)
+        self._failures += 1
+
+        logger.warning('Watch on {} failed ({}), retrying in {:.1f}s.'.format(
+            self._resource, error, delay))
+
+        self._stopped.wait(delay)
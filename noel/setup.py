@@ -33,12 +33,14 @@ setup(
         'Operating System :: Linux',
     ],
 
-    package_data={
-        'noel.builder': ['resources/*'],
-        'noel.deployer': ['resources/*']},
     packages=find_packages(),
 
-    install_requires=['requests', 'colorlog', 'pyyaml', 'jinja2'],
+    install_requires=['requests', 'colorlog', 'pyyaml'],
+
+    extras_require={
+        'async': ['aiohttp'],
+        'speedups': ['orjson', 'ijson>=3.1'],
+    },
 
     entry_points={
         'console_scripts': [
@@ -25,5 +25,16 @@ chown root:docker /var/run/docker.sock
 # service load balances to multiple instances, users do not get a warning.
 noel-ssh-host-keys-manager
 
+# SSH sessions don't inherit the container's environment. Pass on the API
+# server's address, so that the post-receive hook can reach it with the pod's
+# service account, and the node name from the downward API, so it knows
+# which node builds the images.
+cat > $GITHOME/.ssh/environment <<EOF
+KUBERNETES_SERVICE_HOST=${KUBERNETES_SERVICE_HOST}
+KUBERNETES_SERVICE_PORT=${KUBERNETES_SERVICE_PORT}
+NODE_NAME=${NODE_NAME}
+EOF
+chown git:git $GITHOME/.ssh/environment
+
 # Launch processes
 honcho -f /src/Procfile start
@@ -23,6 +23,7 @@ import argparse
 import os
 import sys
 
+from noel.deployer.rollout import DEFAULT_TIMEOUT
 from noel.utils import call
 from noel.logger import logger, setup_logging
 from noel.main import build_and_deploy_command
@@ -51,7 +52,13 @@ def post_receive_hook_command():
         dir=staging_dir,
         app=repo_name,
         version=sha[:6],
-        kubernetes_url='http://localhost:8001')
+        kubernetes_url=None,
+        # The builder builds with the node's docker daemon, so the image is
+        # on this node once it's built.
+        build_node=os.environ.get('NODE_NAME'),
+        # Wait for the pods, to report how long the first one took.
+        wait=True,
+        wait_timeout=DEFAULT_TIMEOUT)
 
     return build_and_deploy_command(args)
 
@@ -35,8 +35,7 @@ setup(
 
     include_package_data=True,
     package_data={
-        'noel_git': ['resources/*'],
-        'ssh_host_keys_manager': ['resources/*']},
+        'noel_git': ['resources/*']},
     packages=find_packages(),
 
     install_requires=['requests'],
@@ -29,12 +29,9 @@ import sys
 from subprocess import check_call
 import time
 
-from jinja2 import Template
-from noel.kubernetes import Kubernetes, KubernetesError
+from noel.kubernetes import connect, KubernetesError
 from noel.logger import logger, setup_logging
 import requests
-from pkg_resources import resource_string
-import yaml
 
 
 def wait_for_kubernetes(k8s):
@@ -61,12 +58,17 @@ def get_host_keys(k8s):
         return None
 
 
-SSH_HOST_KEY_SECRET_TMPL = Template(
-    resource_string(__name__, 'resources/ssh-host-key-secret.tmpl.yaml'))
-
-
 def ssh_host_key_secret_template(name='ssh-host-keys'):
-    return yaml.load(SSH_HOST_KEY_SECRET_TMPL.render(name=name))
+    return {
+        'apiVersion': 'v1',
+        'kind': 'Secret',
+        'metadata': {
+            'name': name,
+            'labels': {'type': 'ssh-host-keys'},
+        },
+        'type': 'Opaque',
+        'data': {},
+    }
 
 
 def put_host_keys(k8s, keys):
@@ -122,8 +124,12 @@ def write_ssh_host_keys(destination, keys):
 
 
 def run(args):
-    k8s = Kubernetes(args.kubernetes_url, namespace='noel')
-    wait_for_kubernetes(k8s)
+    k8s = connect(args.kubernetes_url, namespace='noel')
+
+    # Only a kubectl proxy sidecar needs time to start, direct connections to
+    # the API server are retried by the client.
+    if args.kubernetes_url:
+        wait_for_kubernetes(k8s)
 
     keys = get_host_keys(k8s)
 
@@ -154,8 +160,9 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument(
         '--kubernetes-url',
-        default='http://localhost:8001',
-        help='The URL for the Kubernetes API.')
+        default=None,
+        help='The URL for the Kubernetes API, for example a kubectl proxy. '
+             'Defaults to connecting directly with the service account.')
     parser.add_argument('--destination', default='/etc/ssh')
 
     args = parser.parse_args()
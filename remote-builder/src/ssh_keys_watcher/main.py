@@ -24,10 +24,16 @@ remote builder.
 
 
 import argparse
+import threading
 import time
 
-from noel.kubernetes import Kubernetes, KubernetesError
+from noel import metrics
+from noel.kubernetes import connect, KubernetesError
 from noel.logger import logger, setup_logging
+import requests
+
+# Seconds to wait before reading the keys again after failing to.
+RETRY_SECONDS = 5
 
 
 def write_authorized_keys_file(keys, destination):
@@ -37,55 +43,58 @@ def write_authorized_keys_file(keys, destination):
 
 
 def run(args):
-    k8s = Kubernetes(args.kubernetes_url, namespace='noel')
-    resource_version = None
-
-    try:
-        secret = k8s.get_secret('ssh-keys')
-        keys = secret['data']
-        resource_version = secret['metadata']['resourceVersion']
-
-        write_authorized_keys_file(keys, args.destination)
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+        logger.info('Serving metrics on port {}.'.format(args.metrics_port))
 
-        logger.info('Wrote authorized keys. {} known keys.'.format(
-            len(keys)))
+    k8s = connect(args.kubernetes_url, namespace='noel')
 
-    except KubernetesError as e:
-        if e.httperror.response.status_code == 404:
-            logger.warning('No ssh keys found, will watch for more.')
-        else:
-            logger.exception(
-                'Unexpected error while retrieving initial ssh keys.')
+    # The informer lists the current keys first, then follows changes. It
+    # reconnects and relists on its own, so this loop never has to. Reads of
+    # the secret are served from it while it's fresh, and go to the API
+    # server while its watch can't reconnect.
+    informer = k8s.add_informer('secrets', label_selector='type=ssh-keys')
+    changed = threading.Event()
 
-    while True:
-        try:
-            params = {
-                'labelSelector': 'type=ssh-keys',
-                'resourceVersion': resource_version
-            }
+    def on_change(event_type, secret):
+        if (event_type in ('ADDED', 'MODIFIED') and
+                secret['metadata']['name'] == 'ssh-keys'):
+            changed.set()
 
-            for change in k8s.watch_secrets(params=params):
-                if change['type'] not in ['CREATED', 'ADDED', 'MODIFIED']:
-                    continue
+    informer.add_handler(on_change)
 
-                secret = change['object']
-                if secret['metadata']['name'] != 'ssh-keys':
-                    continue
+    logger.info('Watching for ssh keys.')
 
-                keys = k8s.decode_secret_data(secret['data'])
-                write_authorized_keys_file(keys, args.destination)
+    # Picks up keys listed before the handler was added.
+    informer.wait_for_sync()
+    changed.set()
 
-                logger.info('Updated authorized keys. {} known keys.'.format(
-                    len(keys)))
+    while True:
+        changed.wait()
+        changed.clear()
 
-                # Set the resource version param, so that any exception occurs
-                # we only get the changes since the last one we saw.
-                resource_version = secret['metadata']['resourceVersion']
+        try:
+            keys = k8s.get_secret('ssh-keys')['data']
+        except (KubernetesError, requests.RequestException) as e:
+            if (isinstance(e, KubernetesError) and
+                    e.httperror.response.status_code == 404):
+                logger.info('No ssh keys yet.')
+                continue
+
+            logger.warning('Couldn\'t read ssh keys: {}'.format(e))
+            time.sleep(RETRY_SECONDS)
+            changed.set()
+            continue
 
+        try:
+            write_authorized_keys_file(keys, args.destination)
         except Exception:
-            logger.exception(
-                'Error while refreshing ssh keys, waiting 30 seconds.')
-            time.sleep(30)
+            logger.exception('Error while writing authorized keys.')
+            continue
+
+        logger.info(
+            'Updated authorized keys. {} known keys. Watch stats: {}'.format(
+                len(keys), informer.stats()))
 
 
 def main():
@@ -94,8 +103,14 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument(
         '--kubernetes-url',
-        default='http://localhost:8001',
-        help="The URL for the Kubernetes API.")
+        default=None,
+        help='The URL for the Kubernetes API, for example a kubectl proxy. '
+             'Defaults to connecting directly with the service account.')
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        default=None,
+        help='Serve Prometheus metrics at :port/metrics.')
     parser.add_argument('destination')
 
     args = parser.parse_args()